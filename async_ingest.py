@@ -0,0 +1,257 @@
+"""
+Asyncio based play-by-play ingestion for pull_data.py.
+
+Schedule walkers for several seasons feed a shared queue of game IDs that a bounded pool
+of workers drains. Every request goes through a single pooled HTTP client and a token-bucket
+rate limiter, so throughput is set by the API's rate limit instead of fixed sleeps.
+Point NHL_API_BASE_URL at nhl_api_stub.py to replay recorded responses locally.
+"""
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+import httpx
+
+from pull_data import (
+    API_BASE_URL,
+    GoalWriter,
+    get_season_date_range,
+    is_game_final,
+    is_legacy_processed,
+    parse_goals_from_play_by_play,
+    parse_schedule,
+)
+
+
+class TokenBucket:
+    """Token-bucket rate limiter shared by all coroutines of one event loop"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate  # tokens added per second
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a token is available and consume it"""
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def retry_after_seconds(value, default):
+    """Seconds to wait from a Retry-After header given in seconds (e.g. "2" or "1.5"), else default"""
+    try:
+        delay = float(value)
+    except (TypeError, ValueError):
+        # Missing, or an HTTP date, which the NHL API does not send
+        return default
+    return delay if 0 <= delay < float('inf') else default
+
+
+class AsyncNHLClient:
+    """Pooled HTTP client for the NHL web API with rate limiting and retries"""
+
+    def __init__(self, base_url=API_BASE_URL, rate=5.0, burst=None, max_connections=16,
+                 retries=4, timeout=30, record_dir=None):
+        self.base_url = base_url.rstrip('/')
+        self.limiter = TokenBucket(rate, burst)
+        self.retries = retries
+        self.record_dir = record_dir
+        self.client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections),
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.client.aclose()
+
+    async def get_json(self, path):
+        """GET a path below the base URL, returning parsed JSON or None on failure"""
+        url = f"{self.base_url}/{path}"
+        for attempt in range(self.retries):
+            await self.limiter.acquire()
+            try:
+                response = await self.client.get(url)
+            except httpx.TimeoutException:
+                print(f"Timeout fetching {url} (attempt {attempt + 1}/{self.retries})")
+                await asyncio.sleep(2 ** attempt)
+                continue
+            except httpx.HTTPError as e:
+                print(f"Request error for {url}: {e} (attempt {attempt + 1}/{self.retries})")
+                await asyncio.sleep(2 ** attempt)
+                continue
+
+            if response.status_code == 200:
+                data = response.json()
+                if self.record_dir:
+                    self.record(path, data)
+                return data
+            if response.status_code == 429 or response.status_code >= 500:
+                # Back off harder when the API tells us we are going too fast
+                delay = retry_after_seconds(response.headers.get("Retry-After"), 2 ** attempt)
+                print(f"Status {response.status_code} for {url}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            print(f"Failed to fetch {url} with status code {response.status_code}")
+            return None
+        print(f"Giving up on {url} after {self.retries} attempts")
+        return None
+
+    def record(self, path, data):
+        """Save a response under record_dir so nhl_api_stub.py can replay it"""
+        file_path = os.path.join(self.record_dir, f"{path}.json")
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'w') as f:
+            json.dump(data, f)
+
+    async def get_schedule(self, date):
+        """Return (games, next_start_date) for the week starting at date; games is None on failure"""
+        data = await self.get_json(f"schedule/{date}")
+        if data is None:
+            return None, ""
+        return parse_schedule(data)
+
+    async def get_goals_for_game(self, game_id):
+        """Fetch the goals for a game, returning None if the request failed"""
+        data = await self.get_json(f"gamecenter/{game_id}/play-by-play")
+        if data is None:
+            return None
+        return parse_goals_from_play_by_play(game_id, data)
+
+
+def next_day(date_str):
+    return (datetime.strptime(date_str, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+async def walk_season_schedule(client, season, manifest, legacy_processed, game_queue):
+    """
+    Walk a season's schedule week by week and enqueue games that still need pulling.
+
+    Returns:
+        int: Number of games (or schedule weeks) left outstanding to retry on a later run
+    """
+    season_start, end_date = get_season_date_range(season)
+    current_date = manifest.resume_date(season, season_start)
+    queued = 0
+    outstanding = 0
+    seen = set()
+    while current_date <= end_date:
+        schedule, next_start_date = await client.get_schedule(current_date)
+        if schedule is None:
+            outstanding += 1
+            schedule = []
+        for game in schedule:
+            game_id = game.get("id")
+            if not game_id or game_id in seen:
+                continue
+            seen.add(game_id)
+
+            if manifest.is_completed(game_id):
+                continue
+            if is_legacy_processed(game, legacy_processed, current_date):
+                # Record it so the watermark and resume date account for it
+                manifest.mark_completed(game_id, game.get("gameDate", current_date))
+                continue
+            if not is_game_final(game):
+                manifest.mark_outstanding(game_id, game.get("gameDate", current_date))
+                outstanding += 1
+                continue
+
+            await game_queue.put((season, game_id, game.get("gameDate", current_date)))
+            queued += 1
+
+        # The schedule endpoint returns a whole week, so jump straight to the next one
+        current_date = next_start_date if next_start_date else next_day(current_date)
+    print(f"Season {season}: queued {queued} games")
+    return outstanding
+
+
+async def game_worker(client, game_queue, writer, failed_seasons):
+    while True:
+        season, game_id, game_date = await game_queue.get()
+        try:
+            game_goals = await client.get_goals_for_game(game_id)
+            if game_goals is None:
+                writer.manifest.mark_outstanding(game_id, game_date)
+                failed_seasons.add(season)
+            else:
+                if game_goals:
+                    print(f"Found {len(game_goals)} goals for game {game_id} ({season})")
+                writer.add(game_id, game_date, game_goals)
+        except Exception as e:
+            print(f"Error processing game {game_id}: {e}")
+            writer.manifest.mark_outstanding(game_id, game_date)
+            failed_seasons.add(season)
+        finally:
+            game_queue.task_done()
+
+
+async def run_async_ingestion(seasons, manifest, legacy_processed=frozenset(), concurrency=8,
+                              season_concurrency=4, rate=None, base_url=None, record_dir=None):
+    """
+    Pull every season concurrently and return the number of new goals written.
+
+    Args:
+        seasons: Season IDs such as 20232024
+        manifest: IngestManifest of completed games, updated as batches are saved
+        legacy_processed: Date/score identifiers for goals pulled before game_id existed
+        concurrency: Number of play-by-play workers
+        season_concurrency: Number of season schedules walked at the same time
+        rate: Requests per second across all workers (NHL_API_RATE, default 5)
+        base_url: API root, e.g. a local nhl_api_stub.py server
+        record_dir: Optional directory to record responses for later replay
+    """
+    rate = rate or float(os.environ.get("NHL_API_RATE", 5))
+    base_url = base_url or API_BASE_URL
+    game_queue = asyncio.Queue(maxsize=concurrency * 4)
+    writer = GoalWriter(manifest)
+    season_slots = asyncio.Semaphore(season_concurrency)
+    failed_seasons = set()
+    walked_seasons = []
+
+    async with AsyncNHLClient(base_url, rate=rate, max_connections=concurrency + season_concurrency,
+                              record_dir=record_dir) as client:
+        async def walk(season):
+            if manifest.is_season_complete(season):
+                return
+            async with season_slots:
+                print(f"\n--- Processing season {season} ---")
+                try:
+                    outstanding = await walk_season_schedule(client, season, manifest,
+                                                             legacy_processed, game_queue)
+                    if outstanding == 0:
+                        walked_seasons.append(season)
+                except Exception as e:
+                    print(f"Error processing season {season}: {e}")
+
+        workers = [asyncio.create_task(game_worker(client, game_queue, writer, failed_seasons))
+                   for _ in range(concurrency)]
+        await asyncio.gather(*(walk(season) for season in seasons))
+        await game_queue.join()
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    writer.flush()
+
+    # Past seasons with nothing outstanding never need to be walked again
+    today = datetime.now().strftime("%Y-%m-%d")
+    for season in walked_seasons:
+        if season not in failed_seasons and get_season_date_range(season)[1] < today:
+            manifest.mark_season_complete(season)
+    manifest.save()
+    return writer.total
@@ -0,0 +1,211 @@
+"""
+Placement of clusters within a galaxy for the free-roam constellation map.
+
+create_cluster_positions describes each cluster of a galaxy by a handful of scaled features
+(goal count, mean period, mean scores, solar system count) and needs a 2D layout of them.
+t-SNE on a few points spends far longer starting up than laying out, so galaxies with fewer
+than PLACEMENT_TSNE_MIN_CLUSTERS clusters are placed with PCA followed by a short
+force-relaxation pass that spreads out points PCA put on top of each other; bigger galaxies
+still use t-SNE. PLACEMENT_BACKEND=pca|mds|tsne forces one backend for every galaxy.
+
+Positions are cached in cache/cluster_positions.json, keyed by the backend and the feature
+matrix, so re-running the mapping on an unchanged hierarchy skips the layout entirely. Set
+PLACEMENT_CACHE=0 to disable the cache.
+
+resolve_overlaps pushes clusters apart that ended up closer than a minimum separation,
+looking only at clusters in neighbouring cells of a grid instead of every placed cluster.
+"""
+import hashlib
+import json
+import logging
+import os
+import warnings
+
+import numpy as np
+from sklearn.manifold import MDS, TSNE
+
+logger = logging.getLogger(__name__)
+
+PLACEMENT_BACKEND = os.environ.get('PLACEMENT_BACKEND', 'auto')
+TSNE_MIN_CLUSTERS = int(os.environ.get('PLACEMENT_TSNE_MIN_CLUSTERS', 50))
+CACHE_FILE = os.path.join('cache', 'cluster_positions.json')
+CACHE_ENABLED = os.environ.get('PLACEMENT_CACHE', '1') != '0'
+
+# Bump to invalidate cached positions when a backend changes
+CACHE_VERSION = 1
+
+_cache = None
+_cache_dirty = False
+
+
+def pca_positions(features):
+    """First two principal components of the features (deterministic, signs fixed)"""
+    centered = features - features.mean(axis=0)
+    u, s, _ = np.linalg.svd(centered, full_matrices=False)
+    positions = np.zeros((len(features), 2))
+    n_components = min(2, len(s))
+    positions[:, :n_components] = u[:, :n_components] * s[:n_components]
+    # Make the largest coordinate of each axis positive so the layout does not flip between runs
+    signs = np.sign(positions[np.abs(positions).argmax(axis=0), [0, 1]])
+    return positions * np.where(signs == 0, 1, signs)
+
+
+def relax(positions, iterations=50):
+    """
+    Spread points apart until no two are closer than an even spacing for their extent.
+
+    Each iteration moves every overlapping pair apart by half their overlap; points that
+    coincide are separated along a fixed angle per point, so the result is deterministic.
+    """
+    positions = np.array(positions, dtype=float)
+    n = len(positions)
+    if n < 2:
+        return positions
+    extent = np.max(np.abs(positions))
+    if extent == 0:
+        extent = 1.0
+    spacing = extent * 1.5 / np.sqrt(n)
+    fallback = np.column_stack([np.cos(np.arange(n)), np.sin(np.arange(n))])
+    for _ in range(iterations):
+        diff = positions[:, None, :] - positions[None, :, :]
+        distance = np.sqrt((diff ** 2).sum(axis=2))
+        np.fill_diagonal(distance, np.inf)
+        overlap = np.maximum(0.0, spacing - distance)
+        if overlap.max() < spacing * 1e-3:
+            break
+        with np.errstate(invalid='ignore', divide='ignore'):
+            direction = diff / distance[:, :, None]
+        coincident = distance == 0
+        direction[coincident] = (fallback[:, None, :] - fallback[None, :, :])[coincident]
+        positions += (direction * (overlap / 2)[:, :, None]).sum(axis=1)
+    return positions
+
+
+def mds_positions(features, random_state=42):
+    """Metric MDS of the features' euclidean distances"""
+    with warnings.catch_warnings():
+        # Default-change and square-input notices differ between scikit-learn versions
+        warnings.simplefilter('ignore', category=FutureWarning)
+        warnings.simplefilter('ignore', category=UserWarning)
+        return MDS(n_components=2, n_init=1, random_state=random_state).fit_transform(features)
+
+
+def tsne_positions(features, random_state=42):
+    """t-SNE with the perplexity create_cluster_positions has always used"""
+    perplexity = min(5, len(features) - 1)
+    return TSNE(n_components=2, perplexity=perplexity, random_state=random_state).fit_transform(features)
+
+
+BACKENDS = {
+    'pca': lambda features: relax(pca_positions(features)),
+    'mds': lambda features: relax(mds_positions(features)),
+    'tsne': tsne_positions,
+}
+
+
+def choose_backend(n_clusters, backend=PLACEMENT_BACKEND):
+    """Backend used for a galaxy with n_clusters clusters"""
+    if backend == 'auto':
+        return 'tsne' if n_clusters >= TSNE_MIN_CLUSTERS else 'pca'
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown placement backend: {backend} (expected auto, {', '.join(BACKENDS)})")
+    return backend
+
+
+def _load_cache():
+    global _cache
+    if _cache is None:
+        _cache = {}
+        if CACHE_ENABLED and os.path.exists(CACHE_FILE):
+            try:
+                with open(CACHE_FILE, 'r') as f:
+                    _cache = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable placement cache {CACHE_FILE}: {e}")
+    return _cache
+
+
+def save_cache():
+    """Write new cached positions to disk (atomically)"""
+    global _cache_dirty
+    if not (CACHE_ENABLED and _cache_dirty):
+        return
+    os.makedirs(os.path.dirname(CACHE_FILE), exist_ok=True)
+    tmp_path = f"{CACHE_FILE}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(_cache, f)
+    os.replace(tmp_path, CACHE_FILE)
+    _cache_dirty = False
+
+
+def _cache_key(backend, features):
+    digest = hashlib.sha256(json.dumps([CACHE_VERSION, backend, features.shape]).encode())
+    # Rounded so that float noise in the feature means does not defeat the cache
+    digest.update(np.ascontiguousarray(np.round(features, 9)).tobytes())
+    return digest.hexdigest()
+
+
+def place_clusters(features, backend=PLACEMENT_BACKEND):
+    """
+    2D positions for the clusters of one galaxy.
+
+    Args:
+        features: Scaled cluster features, one row per cluster
+        backend: 'auto', 'pca', 'mds' or 'tsne'
+
+    Returns:
+        tuple: (positions array of shape (n_clusters, 2), backend used)
+    """
+    features = np.asarray(features, dtype=float)
+    backend = choose_backend(len(features), backend)
+    if not CACHE_ENABLED:
+        return BACKENDS[backend](features), backend
+
+    global _cache_dirty
+    cache = _load_cache()
+    key = _cache_key(backend, features)
+    if key not in cache:
+        cache[key] = BACKENDS[backend](features).tolist()
+        _cache_dirty = True
+    return np.array(cache[key], dtype=float).reshape(-1, 2), backend
+
+
+def _cell(x, y, size):
+    return int(np.floor(x / size)), int(np.floor(y / size))
+
+
+def resolve_overlaps(positions, min_separation, max_passes=10):
+    """
+    Push each cluster that is closer than min_separation to an earlier cluster out to
+    exactly min_separation from it.
+
+    Earlier clusters are found through a grid of min_separation-sized cells, so a cluster is
+    only compared with the clusters in the 3x3 cells around it. A push can land a cluster
+    next to another one, so the check is repeated (up to max_passes) until it is clear.
+
+    Returns:
+        np.ndarray: Adjusted positions
+    """
+    positions = np.array(positions, dtype=float)
+    grid = {}
+    for i in range(len(positions)):
+        x, y = positions[i]
+        for _ in range(max_passes):
+            cell_x, cell_y = _cell(x, y, min_separation)
+            neighbours = sorted(j for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                                for j in grid.get((cell_x + dx, cell_y + dy), ()))
+            moved = False
+            for j in neighbours:
+                other_x, other_y = positions[j]
+                distance = np.sqrt((x - other_x)**2 + (y - other_y)**2)
+                if distance < min_separation:
+                    # Push this cluster away from the existing one
+                    angle = np.arctan2(y - other_y, x - other_x)
+                    x = other_x + min_separation * np.cos(angle)
+                    y = other_y + min_separation * np.sin(angle)
+                    moved = True
+            if not moved:
+                break
+        positions[i] = x, y
+        grid.setdefault(_cell(x, y, min_separation), []).append(i)
+    return positions
@@ -0,0 +1,130 @@
+"""
+Clustering-quality metrics that stay cheap on large embeddings.
+
+The exact silhouette score is O(n²) in time and memory. sampled_silhouette instead scores
+several stratified samples (every cluster keeps its share of points, and at least two
+where it can) and reports the mean with a confidence interval across the repeats, so the
+cost is bounded by the sample size rather than the dataset. Calinski-Harabasz and
+Davies-Bouldin are linear in n and are always computed on the full embedding.
+"""
+import logging
+import os
+
+import numpy as np
+from scipy import stats
+from sklearn.metrics import calinski_harabasz_score, davies_bouldin_score, silhouette_score
+
+logger = logging.getLogger(__name__)
+
+SILHOUETTE_SAMPLE_SIZE = int(os.environ.get('SILHOUETTE_SAMPLE_SIZE', 10000))
+SILHOUETTE_REPEATS = int(os.environ.get('SILHOUETTE_REPEATS', 5))
+SILHOUETTE_EXACT = os.environ.get('SILHOUETTE_EXACT', '0') == '1'
+
+
+def stratified_sample(labels, sample_size, rng):
+    """Indices of a sample with each label represented in proportion to its size"""
+    unique_labels, inverse, counts = np.unique(labels, return_inverse=True, return_counts=True)
+    quotas = np.round(sample_size * counts / len(labels)).astype(int)
+    # Silhouette needs two points in a cluster to measure its cohesion
+    quotas = np.minimum(np.maximum(quotas, 2), counts)
+    order = np.argsort(inverse, kind='stable')
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    sample = [rng.choice(order[start:start + count], size=quota, replace=False)
+              for start, count, quota in zip(starts, counts, quotas)]
+    return np.sort(np.concatenate(sample))
+
+
+def sampled_silhouette(features, labels, sample_size=SILHOUETTE_SAMPLE_SIZE, n_repeats=SILHOUETTE_REPEATS,
+                       confidence=0.95, random_state=42, exact=SILHOUETTE_EXACT):
+    """
+    Silhouette score from repeated stratified samples.
+
+    Args:
+        features: Embedding (e.g. galaxy_umap / cluster_umap), one row per goal
+        labels: Cluster label per goal
+        sample_size: Approximate points per sample
+        n_repeats: Number of independent samples
+        confidence: Confidence level of the interval across repeats
+        random_state: Seed for the samples
+        exact: Score every point once instead of sampling
+
+    Returns:
+        dict: score, ci_low, ci_high, sample_size, n_repeats, exact
+    """
+    features = np.asarray(features)
+    labels = np.asarray(labels)
+    if exact or len(labels) <= sample_size:
+        score = silhouette_score(features, labels)
+        return {'score': score, 'ci_low': score, 'ci_high': score,
+                'sample_size': len(labels), 'n_repeats': 1, 'exact': True}
+
+    rng = np.random.default_rng(random_state)
+    scores = []
+    sizes = []
+    for _ in range(n_repeats):
+        sample = stratified_sample(labels, sample_size, rng)
+        if len(np.unique(labels[sample])) < 2:
+            continue
+        scores.append(silhouette_score(features[sample], labels[sample]))
+        sizes.append(len(sample))
+    if not scores:
+        raise ValueError("Samples did not contain at least two clusters")
+
+    scores = np.array(scores)
+    score = scores.mean()
+    if len(scores) > 1:
+        half_width = stats.t.ppf((1 + confidence) / 2, len(scores) - 1) * scores.std(ddof=1) / np.sqrt(len(scores))
+    else:
+        half_width = 0.0
+    return {'score': score, 'ci_low': score - half_width, 'ci_high': score + half_width,
+            'sample_size': int(np.mean(sizes)), 'n_repeats': len(scores), 'exact': False}
+
+
+def evaluate_clustering_quality(cluster_labels, features, sample_size=SILHOUETTE_SAMPLE_SIZE,
+                                n_repeats=SILHOUETTE_REPEATS, exact=SILHOUETTE_EXACT):
+    """Evaluate clustering quality using various metrics"""
+    unique_labels = np.unique(cluster_labels)
+    n_clusters = len(unique_labels)
+    invalid = {
+        'n_clusters': n_clusters,
+        'silhouette_score': -1,
+        'silhouette_ci_low': -1,
+        'silhouette_ci_high': -1,
+        'calinski_harabasz_score': -1,
+        'davies_bouldin_score': float('inf')
+    }
+
+    # Skip evaluation if we have only one cluster or too few samples
+    if n_clusters < 2 or len(features) < 10:
+        return invalid
+
+    try:
+        silhouette = sampled_silhouette(features, cluster_labels, sample_size, n_repeats, exact=exact)
+        return {
+            'n_clusters': n_clusters,
+            'silhouette_score': silhouette['score'],
+            'silhouette_ci_low': silhouette['ci_low'],
+            'silhouette_ci_high': silhouette['ci_high'],
+            'calinski_harabasz_score': calinski_harabasz_score(features, cluster_labels),
+            'davies_bouldin_score': davies_bouldin_score(features, cluster_labels)
+        }
+    except Exception as e:
+        logger.warning(f"Error calculating clustering metrics: {e}")
+        return invalid
+
+
+if __name__ == "__main__":
+    import time
+
+    from sklearn.datasets import make_blobs
+
+    # Compare the sampled estimate with the exact score on synthetic clusters
+    features, labels = make_blobs(n_samples=20000, centers=8, n_features=10, cluster_std=3.0, random_state=0)
+    start = time.perf_counter()
+    exact = sampled_silhouette(features, labels, exact=True)
+    exact_time = time.perf_counter() - start
+    start = time.perf_counter()
+    sampled = sampled_silhouette(features, labels, sample_size=2000)
+    sampled_time = time.perf_counter() - start
+    print(f"exact   {exact['score']:.4f} in {exact_time:.2f}s")
+    print(f"sampled {sampled['score']:.4f} [{sampled['ci_low']:.4f}, {sampled['ci_high']:.4f}] in {sampled_time:.2f}s")
@@ -11,17 +11,30 @@ import matplotlib.patches as patches
 import matplotlib.patheffects as path_effects
 import matplotlib.font_manager as fm
 from matplotlib.colors import LinearSegmentedColormap
+import io
 import os
 import json
 from scipy.spatial import ConvexHull
 from sklearn.preprocessing import MinMaxScaler
 import logging
 from datetime import datetime
+from PIL import Image
+
+import goal_store
+from star_layout import LayoutParams, layout_stars
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Resolution the web version corresponds to, and the thumbnail width in pixels
+WEB_DPI = 150
+THUMBNAIL_WIDTH = 480
+
+# Optional extra formats (file extension -> Pillow format) and their quality settings
+EXTRA_FORMATS = {'webp': 'WEBP', 'avif': 'AVIF'}
+EXTRA_FORMAT_QUALITY = {'webp': 90, 'avif': 75}
+
 class StarChartGenerator:
     """Generates high-resolution star charts from NHL goal clustering data"""
     
@@ -80,8 +93,8 @@ class StarChartGenerator:
                 file_path = f"sequential_clustering/{specific_file}"
             else:
                 # Find the most recent clustering file
-                clustering_files = [f for f in os.listdir("sequential_clustering") 
-                                  if f.startswith("goal_hierarchy_mapping_multiple_rounds_")]
+                clustering_files = goal_store.find_tables("sequential_clustering",
+                                                          "goal_hierarchy_mapping_multiple_rounds_")
                 if not clustering_files:
                     raise FileNotFoundError("No clustering files found")
                 
@@ -89,7 +102,7 @@ class StarChartGenerator:
                 file_path = f"sequential_clustering/{clustering_files[-1]}"
             
             logger.info(f"Loading clustering data from: {file_path}")
-            df = pd.read_csv(file_path)
+            df = goal_store.read_table(file_path)
             logger.info(f"Loaded {len(df)} clustered goals")
             return df
             
@@ -241,6 +254,18 @@ class StarChartGenerator:
         
         return positions
     
+    def layout_params(self):
+        """Pattern sizes used by star_layout (same as create_constellation_positions / create_star_positions)"""
+        return LayoutParams(
+            constellation_radius=15,
+            constellation_inner_radius=3,
+            solar_system_offset=(-3, 3),
+            star_step=2,
+            star_ring_radius=min(5, 8 // 2),
+            star_spiral_radius=8,
+            star_jitter=(-0.5, 0.5),
+        )
+    
     def create_galaxy_boundary(self, galaxy_points, alpha=0.3):
         """Create convex hull boundary for galaxy shading"""
         if len(galaxy_points) < 3:
@@ -271,25 +296,216 @@ class StarChartGenerator:
         return result
     
     def calculate_star_brightness(self, star_density, max_density):
-        """Calculate star brightness based on local density"""
+        """Calculate star brightness based on local density (scalar or array)"""
         # Normalize density to 0-1 range
-        normalized = star_density / max_density if max_density > 0 else 0
+        star_density = np.asarray(star_density, dtype=float)
+        normalized = star_density / max_density if max_density > 0 else np.zeros_like(star_density)
         
         # Apply power curve for more dramatic brightness differences
         brightness = np.power(normalized, 0.5)  # Square root for gentler curve
         
         # Ensure minimum brightness
-        return max(0.3, brightness)
+        return np.maximum(0.3, brightness)
+    
+    def layout_chart(self, df):
+        """
+        Star positions (fisheye-projected), sizes and galaxy outlines of the chart.
+        
+        Returns:
+            dict: 'x', 'y' and 'sizes' arrays (one entry per goal), 'galaxies' in layout order
+            and 'galaxy_info' (galaxy -> boundary, color, size and label position)
+        """
+        # Set random seed for reproducibility
+        np.random.seed(42)
+        
+        # Get galaxy layout
+        galaxies = df['level_0_cluster'].unique().tolist()
+        galaxy_positions = self.create_galaxy_layout(galaxies)
+        
+        # Position every star at once (galaxy -> constellation -> solar system -> star)
+        layout = layout_stars(df, galaxy_positions, self.layout_params())
+        x_coords, y_coords = self.apply_fisheye_projection(layout.x, layout.y)
+        n_stars = len(layout.order)
+        
+        # Stars come out grouped by galaxy, numbered in the order of galaxies
+        galaxy_starts = np.flatnonzero(np.r_[True, layout.galaxy[1:] != layout.galaxy[:-1]]) if n_stars else np.array([], dtype=int)
+        galaxy_ends = np.r_[galaxy_starts[1:], n_stars]
+        
+        # Calculate star densities for brightness
+        logger.info("Calculating star densities...")
+        
+        # Use galaxy-based density instead of distance-based for performance
+        galaxy_counts = galaxy_ends - galaxy_starts
+        max_galaxy_size = galaxy_counts.max() if len(galaxy_counts) else 1
+        star_densities = (galaxy_counts / max_galaxy_size)[layout.galaxy]
+        max_density = star_densities.max() if n_stars else 1
+        
+        # Calculate brightness and sizes
+        brightnesses = self.calculate_star_brightness(star_densities, max_density)
+        sizes = 1.0 + brightnesses * 3.0
+        
+        # Galaxy boundaries from the already fisheye-projected points
+        galaxy_info = {}
+        for number, (start, end) in enumerate(zip(galaxy_starts, galaxy_ends)):
+            points_array = np.column_stack([x_coords[start:end], y_coords[start:end]])
+            boundary = self.create_galaxy_boundary(points_array)
+            if boundary is None:
+                continue
+            
+            # Calculate galaxy properties for name placement
+            centroid_x = np.mean(points_array[:, 0])
+            centroid_y = np.mean(points_array[:, 1])
+            
+            # Calculate galaxy size (bounding box)
+            min_x, max_x = np.min(points_array[:, 0]), np.max(points_array[:, 0])
+            min_y, max_y = np.min(points_array[:, 1]), np.max(points_array[:, 1])
+            width = max_x - min_x
+            height = max_y - min_y
+            galaxy_size = min(width, height)  # Use smaller dimension
+            
+            galaxy_info[galaxies[number]] = {
+                'centroid': (centroid_x, centroid_y),
+                'color': self.galaxy_colors[number % len(self.galaxy_colors)],
+                'size': galaxy_size,
+                'bounds': (min_x, max_x, min_y, max_y),
+                'boundary': boundary,
+                'bounding_center': ((min_x + max_x) / 2, (min_y + max_y) / 2)
+            }
+        
+        return {'x': x_coords, 'y': y_coords, 'sizes': sizes, 'galaxies': galaxies, 'galaxy_info': galaxy_info}
+    
+    def draw_chart(self, ax, chart, stars=slice(None), star_scale=1.0, line_scale=1.0, label_scale=1.0):
+        """
+        Draw galaxy areas, stars, labels and the chart grid onto ax.
+        
+        Args:
+            ax: Axes in chart coordinates
+            chart: Result of layout_chart
+            stars: Index of the stars to draw (default all)
+            star_scale, line_scale, label_scale: Size multipliers for tiles rendered at
+                another resolution than the 4K chart
+        """
+        # Draw galaxy boundaries (shaded regions) using fisheye-projected points
+        logger.debug("Drawing galaxy boundaries...")
+        for info in chart['galaxy_info'].values():
+            polygon = patches.Polygon(info['boundary'], 
+                                    facecolor=info['color'], 
+                                    alpha=0.15, 
+                                    edgecolor=info['color'], 
+                                    linewidth=1 * line_scale, 
+                                    linestyle='--')
+            ax.add_patch(polygon)
+        
+        # Draw all stars at once for better performance
+        x_coords, y_coords, sizes = chart['x'][stars], chart['y'][stars], chart['sizes'][stars]
+        logger.debug(f"Drawing {len(x_coords)} stars...")
+        ax.scatter(x_coords, y_coords, s=sizes * star_scale**2, c=self.star_color, 
+                  alpha=0.8, marker='*', edgecolors='none')
+        
+        # Add galaxy labels using custom font
+        logger.debug("Adding galaxy labels...")
+        for galaxy, info in chart['galaxy_info'].items():
+            center_x, center_y = info['bounding_center']
+            galaxy_size = info['size']
+            
+            # Scale font size based on galaxy size (smaller range for labels)
+            font_size = max(8, min(14, int(galaxy_size * 0.3)))
+            
+            # Create clean galaxy name (remove cluster prefix if present)
+            galaxy_name = str(galaxy).replace('cluster_', '').upper()
+            
+            # Add text with custom font
+            ax.text(center_x, center_y, galaxy_name,
+                   fontsize=font_size * label_scale,
+                   color='white',
+                   fontweight='bold',
+                   fontfamily=self.custom_font,
+                   ha='center',
+                   va='center',
+                   alpha=0.9,
+                   path_effects=[
+                       path_effects.withStroke(linewidth=2 * label_scale, foreground='black', alpha=0.8)
+                   ])
+        
+        # Add circular boundary for fisheye effect
+        circle = patches.Circle((0, 0), self.radius * 0.9, 
+                              fill=False, edgecolor='white', 
+                              alpha=0.3, linewidth=2 * line_scale)
+        ax.add_patch(circle)
+        
+        # Add coordinate grid lines like real star charts
+        for angle in np.linspace(0, 2*np.pi, 12, endpoint=False):  # 12 radial lines
+            x_line = [0, self.radius * 0.9 * np.cos(angle)]
+            y_line = [0, self.radius * 0.9 * np.sin(angle)]
+            ax.plot(x_line, y_line, color='white', alpha=0.1, linewidth=0.5 * line_scale)
+        
+        # Add concentric circles
+        for r in np.linspace(0.3, 0.9, 4):  # 4 circles at different radii
+            circle_grid = patches.Circle((0, 0), self.radius * r, 
+                                       fill=False, edgecolor='white', 
+                                       alpha=0.1, linewidth=0.5 * line_scale)
+            ax.add_patch(circle_grid)
     
-    def create_4k_star_chart(self, specific_file=None):
-        """Create the main 4K star chart"""
+    def export_chart(self, fig, extra_formats=()):
+        """
+        Save the chart at full resolution plus web and thumbnail sizes from a single render.
+        
+        The figure is rasterized once (at self.dpi, tight bounding box) into memory; that PNG is
+        written as the 4K version and downsampled with Lanczos for the smaller sizes, instead of
+        re-rendering every scatter point and text effect per size.
+        
+        Args:
+            fig: The finished chart figure
+            extra_formats: Also write each size as 'webp' and/or 'avif' (if Pillow supports it)
+        
+        Returns:
+            dict: Size name ('4k', 'web', 'thumbnail', and e.g. 'web_webp') -> file path
+        """
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png', dpi=self.dpi, bbox_inches='tight', pad_inches=0.1,
+                    facecolor=self.bg_color, edgecolor='none')
+        
+        outputs = {'4k': f'nhl_star_chart_4k_{timestamp}.png'}
+        with open(outputs['4k'], 'wb') as f:
+            f.write(buffer.getvalue())
+        logger.info(f"4K star chart saved to: {outputs['4k']}")
+        
+        buffer.seek(0)
+        images = {'4k': Image.open(buffer).convert('RGB')}
+        width, height = images['4k'].size
+        # Same pixel size the 150 dpi web render used to have
+        web_scale = WEB_DPI / self.dpi
+        images['web'] = images['4k'].resize((round(width * web_scale), round(height * web_scale)), Image.LANCZOS)
+        thumbnail_scale = THUMBNAIL_WIDTH / width
+        images['thumbnail'] = images['4k'].resize((THUMBNAIL_WIDTH, round(height * thumbnail_scale)), Image.LANCZOS)
+        
+        for size in ('web', 'thumbnail'):
+            outputs[size] = f'nhl_star_chart_{size}_{timestamp}.png'
+            images[size].save(outputs[size])
+            logger.info(f"{size.capitalize()} version saved to: {outputs[size]} {images[size].size}")
+        
+        Image.init()
+        for extension in extra_formats:
+            pil_format = EXTRA_FORMATS[extension]
+            if pil_format not in Image.SAVE:
+                logger.warning(f"Pillow cannot write {pil_format} here, skipping .{extension} copies")
+                continue
+            for size, image in images.items():
+                key = f'{size}_{extension}'
+                outputs[key] = f'nhl_star_chart_{size}_{timestamp}.{extension}'
+                image.save(outputs[key], pil_format, quality=EXTRA_FORMAT_QUALITY[extension])
+                logger.info(f"{pil_format} {size} version saved to: {outputs[key]}")
+        
+        return outputs
+    
+    def create_4k_star_chart(self, specific_file=None, extra_formats=()):
+        """Create the main 4K star chart (extra_formats: also write 'webp' and/or 'avif' copies)"""
         try:
             # Load data
             df = self.load_clustering_data(specific_file)
             
-            # Set random seed for reproducibility
-            np.random.seed(42)
-            
             logger.info("Creating 4K star chart...")
             
             # Create figure with high DPI and proper centering
@@ -308,194 +524,11 @@ class StarChartGenerator:
             ax.set_aspect('equal')
             ax.axis('off')
             
-            # Get galaxy layout
-            galaxies = df['level_0_cluster'].unique().tolist()
-            galaxy_positions = self.create_galaxy_layout(galaxies)
-            
-            # Store all star positions and data
-            all_stars = []
-            galaxy_star_groups = {}
-            
-            # Process each galaxy
-            for i, galaxy in enumerate(galaxies):
-                galaxy_data = df[df['level_0_cluster'] == galaxy]
-                galaxy_center = galaxy_positions[galaxy]
-                galaxy_color = self.galaxy_colors[i % len(self.galaxy_colors)]
-                
-                # Get constellations in this galaxy
-                constellations = galaxy_data['level_1_cluster'].unique()
-                constellation_positions = self.create_constellation_positions(galaxy_center, constellations)
-                
-                galaxy_points = []
-                
-                # Process each constellation
-                for constellation in constellations:
-                    constellation_data = galaxy_data[galaxy_data['level_1_cluster'] == constellation]
-                    constellation_center = constellation_positions[constellation]
-                    
-                    # Get solar systems
-                    solar_systems = constellation_data['level_2_cluster'].unique()
-                    
-                    for solar_system in solar_systems:
-                        solar_system_data = constellation_data[constellation_data['level_2_cluster'] == solar_system]
-                        
-                        # Position solar system near constellation center
-                        ss_offset_x = np.random.uniform(-3, 3)
-                        ss_offset_y = np.random.uniform(-3, 3)
-                        ss_center = (
-                            constellation_center[0] + ss_offset_x,
-                            constellation_center[1] + ss_offset_y
-                        )
-                        
-                        # Create star positions
-                        stars_in_system = solar_system_data.index.tolist()
-                        star_positions = self.create_star_positions(ss_center, stars_in_system)
-                        
-                        # Store star data
-                        for star_idx in stars_in_system:
-                            star_pos = star_positions[star_idx]
-                            goal_data = solar_system_data.loc[star_idx]
-                            
-                            # Apply fisheye projection
-                            x_fisheye, y_fisheye = self.apply_fisheye_projection(star_pos[0], star_pos[1])
-                            
-                            star_info = {
-                                'x': x_fisheye,
-                                'y': y_fisheye,
-                                'galaxy': galaxy,
-                                'galaxy_color': galaxy_color,
-                                'player_name': goal_data.get('player_name', 'Unknown'),
-                                'team_name': goal_data.get('team_name', 'Unknown')
-                            }
-                            
-                            all_stars.append(star_info)
-                            galaxy_points.append((x_fisheye, y_fisheye))
-                
-                # Store galaxy points for boundary creation
-                if galaxy_points:
-                    galaxy_star_groups[galaxy] = {
-                        'points': galaxy_points,
-                        'color': galaxy_color
-                    }
-            
-            # Calculate star densities for brightness (optimized)
-            logger.info("Calculating star densities...")
-            
-            # Use galaxy-based density instead of distance-based for performance
-            galaxy_counts = {}
-            for star in all_stars:
-                galaxy = star['galaxy']
-                galaxy_counts[galaxy] = galaxy_counts.get(galaxy, 0) + 1
-            
-            max_galaxy_size = max(galaxy_counts.values()) if galaxy_counts else 1
-            
-            star_densities = []
-            for star in all_stars:
-                galaxy_size = galaxy_counts[star['galaxy']]
-                # Normalize by galaxy size
-                density = galaxy_size / max_galaxy_size
-                star_densities.append(density)
-            
-            max_density = max(star_densities) if star_densities else 1
-            
-            # Draw galaxy boundaries (shaded regions) using fisheye-projected points
-            logger.info("Drawing galaxy boundaries...")
-            galaxy_info = {}
-            for galaxy, data in galaxy_star_groups.items():
-                # Use the already fisheye-projected points for boundary calculation
-                boundary = self.create_galaxy_boundary(data['points'])
-                if boundary is not None:
-                    # Points are already fisheye-projected, so use them directly
-                    polygon = patches.Polygon(boundary, 
-                                            facecolor=data['color'], 
-                                            alpha=0.15, 
-                                            edgecolor=data['color'], 
-                                            linewidth=1, 
-                                            linestyle='--')
-                    ax.add_patch(polygon)
-                    
-                    # Calculate galaxy properties for name placement
-                    points_array = np.array(data['points'])
-                    centroid_x = np.mean(points_array[:, 0])
-                    centroid_y = np.mean(points_array[:, 1])
-                    
-                    # Calculate galaxy size (bounding box)
-                    min_x, max_x = np.min(points_array[:, 0]), np.max(points_array[:, 0])
-                    min_y, max_y = np.min(points_array[:, 1]), np.max(points_array[:, 1])
-                    width = max_x - min_x
-                    height = max_y - min_y
-                    galaxy_size = min(width, height)  # Use smaller dimension
-                    
-                    galaxy_info[galaxy] = {
-                        'centroid': (centroid_x, centroid_y),
-                        'color': data['color'],
-                        'size': galaxy_size,
-                        'bounds': (min_x, max_x, min_y, max_y),
-                        'boundary': boundary,
-                        'bounding_center': ((min_x + max_x) / 2, (min_y + max_y) / 2)
-                    }
-            
-            # Draw stars efficiently
-            logger.info(f"Drawing {len(all_stars)} stars...")
-            
-            # Prepare data for vectorized plotting
-            x_coords = [star['x'] for star in all_stars]
-            y_coords = [star['y'] for star in all_stars]
-            
-            # Calculate brightness and sizes
-            brightnesses = [self.calculate_star_brightness(star_densities[i], max_density) 
-                          for i in range(len(all_stars))]
-            sizes = [1.0 + brightness * 3.0 for brightness in brightnesses]
-            alphas = [0.6 + brightness * 0.4 for brightness in brightnesses]
-            
-            # Draw all stars at once for better performance
-            ax.scatter(x_coords, y_coords, s=sizes, c=self.star_color, 
-                      alpha=0.8, marker='*', edgecolors='none')
-            
-            # Add galaxy labels using custom font
-            logger.info("Adding galaxy labels...")
-            for galaxy, info in galaxy_info.items():
-                center_x, center_y = info['bounding_center']
-                galaxy_color = info['color']
-                galaxy_size = info['size']
-                
-                # Scale font size based on galaxy size (smaller range for labels)
-                font_size = max(8, min(14, int(galaxy_size * 0.3)))
-                
-                # Create clean galaxy name (remove cluster prefix if present)
-                galaxy_name = str(galaxy).replace('cluster_', '').upper()
-                
-                # Add text with custom font
-                ax.text(center_x, center_y, galaxy_name,
-                       fontsize=font_size,
-                       color='white',
-                       fontweight='bold',
-                       fontfamily=self.custom_font,
-                       ha='center',
-                       va='center',
-                       alpha=0.9,
-                       path_effects=[
-                           path_effects.withStroke(linewidth=2, foreground='black', alpha=0.8)
-                       ])
-            
-            # Add circular boundary for fisheye effect
-            circle = patches.Circle((0, 0), self.radius * 0.9, 
-                                  fill=False, edgecolor='white', 
-                                  alpha=0.3, linewidth=2)
-            ax.add_patch(circle)
-            
-            # Add coordinate grid lines like real star charts
-            for angle in np.linspace(0, 2*np.pi, 12, endpoint=False):  # 12 radial lines
-                x_line = [0, self.radius * 0.9 * np.cos(angle)]
-                y_line = [0, self.radius * 0.9 * np.sin(angle)]
-                ax.plot(x_line, y_line, color='white', alpha=0.1, linewidth=0.5)
-            
-            # Add concentric circles
-            for r in np.linspace(0.3, 0.9, 4):  # 4 circles at different radii
-                circle_grid = patches.Circle((0, 0), self.radius * r, 
-                                           fill=False, edgecolor='white', 
-                                           alpha=0.1, linewidth=0.5)
-                ax.add_patch(circle_grid)
+            chart = self.layout_chart(df)
+            n_stars = len(chart['x'])
+            galaxies = chart['galaxies']
+            logger.info(f"Drawing {n_stars} stars and {len(galaxies)} galaxies...")
+            self.draw_chart(ax, chart)
             
             # Classical old world map style title
             title_text = 'NHL STAR CHART'
@@ -510,7 +543,7 @@ class StarChartGenerator:
                        ])
             
             # Classical subtitle in English
-            subtitle_text = f'{len(all_stars)} Goals From 2023+ Seasons • {len(galaxies)} Galaxies'
+            subtitle_text = f'{n_stars} Goals From 2023+ Seasons • {len(galaxies)} Galaxies'
             
             # Subtitle with aged manuscript styling - positioned lower
             plt.figtext(0.5, 0.88, subtitle_text, 
@@ -521,22 +554,11 @@ class StarChartGenerator:
                            path_effects.withStroke(linewidth=1, foreground='#2f1b14', alpha=0.6)
                        ])
             
-            # Save the chart with tight bounding box to prevent cutoff
-            output_path = f'nhl_star_chart_4k_{datetime.now().strftime("%Y%m%d_%H%M%S")}.png'
-            plt.savefig(output_path, dpi=self.dpi, bbox_inches='tight', pad_inches=0.1,
-                       facecolor=self.bg_color, edgecolor='none')
-            
-            logger.info(f"4K star chart saved to: {output_path}")
-            
-            # Also save a web-friendly version
-            web_output_path = f'nhl_star_chart_web_{datetime.now().strftime("%Y%m%d_%H%M%S")}.png'
-            plt.savefig(web_output_path, dpi=150, bbox_inches='tight', pad_inches=0.1,
-                       facecolor=self.bg_color, edgecolor='none')
-            
-            logger.info(f"Web version saved to: {web_output_path}")
-            
+            # Rasterize once and derive the web and thumbnail sizes from that render
+            outputs = self.export_chart(fig, extra_formats)
             plt.close()
             
+            output_path, web_output_path = outputs['4k'], outputs['web']
             return output_path, web_output_path
             
         except Exception as e:
@@ -550,6 +572,9 @@ def main():
     # Check for high-quality flag
     high_quality = '--high-quality' in sys.argv or '--hq' in sys.argv
     
+    # Optional WebP/AVIF copies of every size
+    extra_formats = [extension for extension in EXTRA_FORMATS if f'--{extension}' in sys.argv]
+    
     if high_quality:
         print("🎨 Generating HIGH QUALITY version (300 DPI)...")
         generator = StarChartGenerator(dpi=300)
@@ -558,7 +583,7 @@ def main():
         generator = StarChartGenerator(dpi=200)
     
     try:
-        output_4k, output_web = generator.create_4k_star_chart()
+        output_4k, output_web = generator.create_4k_star_chart(extra_formats=extra_formats)
         print(f"✅ 4K Star Chart created successfully!")
         print(f"🌌 4K Version: {output_4k}")
         print(f"🌐 Web Version: {output_web}")
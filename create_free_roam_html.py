@@ -1,19 +1,27 @@
-import json
 import os
 
+import hierarchy_stats
+import star_map_data
+from geojson_writer import load_geojson
+
 def create_embedded_constellation_html():
     """Create an HTML file with embedded GeoJSON data in the root directory"""
     
     # Read the GeoJSON data
     geojson_path = 'visualizations/nhl_constellation_map.geojson'
-    if not os.path.exists(geojson_path):
+    try:
+        geojson_data = load_geojson(geojson_path)
+    except FileNotFoundError:
         print(f"Error: {geojson_path} not found. Run mapping.py first.")
         return
     
-    with open(geojson_path, 'r') as f:
-        geojson_data = json.load(f)
+    # Write the map data next to the page (or embed it, see star_map_data)
+    output_path = 'free_roam.html'
+    data_script, sidecar_path = star_map_data.page_data_script(geojson_data, output_path, 'free-roam-main')
+    # Galaxy/cluster/solar system stats are rolled up here rather than in the browser
+    stats_script = hierarchy_stats.stats_script(hierarchy_stats.hierarchy_stats(geojson_data))
     
-    # HTML template with embedded data
+    # HTML template; the page script runs once the data has been decoded
     html_content = f'''<!DOCTYPE html>
 <html lang="en">
 <head>
@@ -1103,9 +1111,12 @@ def create_embedded_constellation_html():
     <!-- Leaflet JavaScript -->
     <script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
     
-    <script>
-        // Embedded GeoJSON data
-        const geojsonData = {json.dumps(geojson_data, indent=8)};
+    {stats_script}
+    {data_script}
+    
+    <script type="text/plain" id="free-roam-main">
+        // GeoJSON data decoded by the star map data loader
+        const geojsonData = window.starMapData;
         
         // Hide loading screen once data is loaded
         document.getElementById('loading').style.display = 'none';
@@ -1132,7 +1143,7 @@ def create_embedded_constellation_html():
         }}
         
         // Set up modal event listeners after DOM is ready
-        document.addEventListener('DOMContentLoaded', function() {{
+        onDomReady(function() {{
             const modal = document.getElementById('welcome-modal');
             const closeBtn = document.querySelector('.welcome-close');
             
@@ -1513,10 +1524,10 @@ def create_embedded_constellation_html():
         console.log('Loaded', geojsonData.features.length, 'celestial objects');
         
         // Separate features by type
-        const galaxies = geojsonData.features.filter(f => f.properties.type === 'galaxy');
-        const clusters = geojsonData.features.filter(f => f.properties.type === 'cluster');
-        const solarSystems = geojsonData.features.filter(f => f.properties.type === 'solar_system');
-        const stars = geojsonData.features.filter(f => f.properties.type === 'star');
+        const galaxies = geojsonData.featuresOfType('galaxy');
+        const clusters = geojsonData.featuresOfType('cluster');
+        const solarSystems = geojsonData.featuresOfType('solar_system');
+        const stars = geojsonData.featuresOfType('star');
         
         console.log('Processing:', galaxies.length, 'galaxies,', clusters.length, 'clusters,', solarSystems.length, 'solar systems,', stars.length, 'stars');
         
@@ -1564,6 +1575,10 @@ def create_embedded_constellation_html():
             }}
         }});
         
+        // Statistics for every galaxy, cluster and solar system, computed when the page was generated
+        const HIERARCHY_STATS = JSON.parse(document.getElementById('hierarchy-stats').textContent);
+        const hierarchicalStatsCache = new Map();
+        
         // Index galaxies, clusters, and solar systems
         galaxies.forEach(galaxy => {{
             const stats = getHierarchicalStats(galaxy.properties.name, 'galaxy');
@@ -1660,7 +1675,23 @@ def create_embedded_constellation_html():
         
         // Function to get hierarchical statistics for celestial objects
         function getHierarchicalStats(objectName, level) {{
-            let stats = {{
+            const cacheKey = `${{level}}/${{objectName}}`;
+            if (hierarchicalStatsCache.has(cacheKey)) {{
+                return hierarchicalStatsCache.get(cacheKey);
+            }}
+            
+            const precomputed = (HIERARCHY_STATS[level] || {{}})[objectName];
+            const stats = precomputed ? {{
+                ...precomputed,
+                topPlayers: new Map(precomputed.topPlayers),
+                topGoalies: new Map(precomputed.topGoalies),
+                teams: new Set(precomputed.teams),
+                shotTypes: new Map(precomputed.shotTypes),
+                periods: new Map(precomputed.periods),
+                shotZones: new Map(precomputed.shotZones),
+                situations: new Map(precomputed.situations),
+                avgScoreDiff: precomputed.avgScoreDiff === null ? NaN : precomputed.avgScoreDiff
+            }} : {{
                 name: objectName,
                 level: level,
                 clusters: 0,
@@ -1674,7 +1705,6 @@ def create_embedded_constellation_html():
                 periods: new Map(),
                 shotZones: new Map(),
                 situations: new Map(),
-                // New stats for different hierarchy levels
                 avgX: 0,
                 avgY: 0,
                 avgPeriod: 0,
@@ -1686,203 +1716,7 @@ def create_embedded_constellation_html():
                 validScoreData: 0,
                 validSeasonData: 0
             }};
-            
-            if (level === 'galaxy') {{
-                // Count clusters, solar systems, and stars within this galaxy
-                clusters.forEach(cluster => {{
-                    if (cluster.properties.name.startsWith(objectName + '.')) {{
-                        stats.clusters++;
-                    }}
-                }});
-                
-                solarSystems.forEach(system => {{
-                    if (system.properties.name.startsWith(objectName + '.')) {{
-                        stats.solarSystems++;
-                    }}
-                }});
-                
-                stars.forEach(star => {{
-                    if (star.properties.galaxy === objectName) {{
-                        stats.stars++;
-                        stats.totalGoals++;
-                        
-                        // Collect player stats
-                        const playerName = star.properties.player_name;
-                        if (playerName && playerName !== 'unknown') {{
-                            stats.topPlayers.set(playerName, (stats.topPlayers.get(playerName) || 0) + 1);
-                        }}
-                        
-                        // Collect goalie stats
-                        const goalieName = star.properties.goalie_name;
-                        if (goalieName && goalieName !== 'Empty Net') {{
-                            stats.topGoalies.set(goalieName, (stats.topGoalies.get(goalieName) || 0) + 1);
-                        }}
-                        
-                        // Collect team stats
-                        if (star.properties.team_name) {{
-                            stats.teams.add(star.properties.team_name);
-                        }}
-                        
-                        // Collect shot type stats
-                        if (star.properties.shot_type) {{
-                            stats.shotTypes.set(star.properties.shot_type, (stats.shotTypes.get(star.properties.shot_type) || 0) + 1);
-                        }}
-                        
-                        // Collect period stats
-                        if (star.properties.period) {{
-                            stats.periods.set(star.properties.period, (stats.periods.get(star.properties.period) || 0) + 1);
-                        }}
-                        
-                        
-                        // Collect shot zone stats
-                        if (star.properties.shot_zone && star.properties.shot_zone.trim() !== '') {{
-                            stats.shotZones.set(star.properties.shot_zone, (stats.shotZones.get(star.properties.shot_zone) || 0) + 1);
-                        }}
-                        
-                        // Collect situation stats
-                        if (star.properties.situation && star.properties.situation.trim() !== '') {{
-                            stats.situations.set(star.properties.situation, (stats.situations.get(star.properties.situation) || 0) + 1);
-                        }}
-                        
-                        // Galaxy-specific stats: average coordinates for zone information
-                        if (star.properties.x && star.properties.y && !isNaN(star.properties.x) && !isNaN(star.properties.y)) {{
-                            stats.avgX += parseFloat(star.properties.x);
-                            stats.avgY += parseFloat(star.properties.y);
-                            stats.validCoords++;
-                        }}
-                    }}
-                }});
-            }} else if (level === 'cluster') {{
-                // Count solar systems and stars within this cluster
-                solarSystems.forEach(system => {{
-                    if (system.properties.name.startsWith(objectName + '.')) {{
-                        stats.solarSystems++;
-                    }}
-                }});
-                
-                stars.forEach(star => {{
-                    if (star.properties.cluster === objectName) {{
-                        stats.stars++;
-                        stats.totalGoals++;
-                        
-                        // Collect same stats as galaxy level
-                        const playerName = star.properties.player_name;
-                        if (playerName && playerName !== 'unknown') {{
-                            stats.topPlayers.set(playerName, (stats.topPlayers.get(playerName) || 0) + 1);
-                        }}
-                        
-                        const goalieName = star.properties.goalie_name;
-                        if (goalieName && goalieName !== 'Empty Net') {{
-                            stats.topGoalies.set(goalieName, (stats.topGoalies.get(goalieName) || 0) + 1);
-                        }}
-                        
-                        if (star.properties.team_name) {{
-                            stats.teams.add(star.properties.team_name);
-                        }}
-                        
-                        if (star.properties.shot_type) {{
-                            stats.shotTypes.set(star.properties.shot_type, (stats.shotTypes.get(star.properties.shot_type) || 0) + 1);
-                        }}
-                        
-                        if (star.properties.period) {{
-                            stats.periods.set(star.properties.period, (stats.periods.get(star.properties.period) || 0) + 1);
-                        }}
-                        
-                        
-                        // Collect shot zone stats
-                        if (star.properties.shot_zone && star.properties.shot_zone.trim() !== '') {{
-                            stats.shotZones.set(star.properties.shot_zone, (stats.shotZones.get(star.properties.shot_zone) || 0) + 1);
-                        }}
-                        
-                        // Collect situation stats
-                        if (star.properties.situation && star.properties.situation.trim() !== '') {{
-                            stats.situations.set(star.properties.situation, (stats.situations.get(star.properties.situation) || 0) + 1);
-                        }}
-                        
-                        // Cluster-specific stats: period, time, score, and date averages
-                        if (star.properties.period && !isNaN(star.properties.period)) {{
-                            stats.avgPeriod += parseFloat(star.properties.period);
-                            stats.validPeriodData++;
-                        }}
-                        
-                        if (star.properties.period_time && !isNaN(star.properties.period_time)) {{
-                            stats.avgPeriodTime += parseFloat(star.properties.period_time);
-                        }}
-                        
-                        if (star.properties.score_diff !== undefined && !isNaN(star.properties.score_diff)) {{
-                            stats.avgScoreDiff += parseFloat(star.properties.score_diff);
-                            stats.validScoreData++;
-                        }}
-                        
-                        if (star.properties.season_day && !isNaN(star.properties.season_day)) {{
-                            stats.avgSeasonDay += parseFloat(star.properties.season_day);
-                            stats.validSeasonData++;
-                        }}
-                    }}
-                }});
-            }} else if (level === 'solar system') {{
-                // Count stars within this solar system
-                stars.forEach(star => {{
-                    if (star.properties.solar_system === objectName) {{
-                        stats.stars++;
-                        stats.totalGoals++;
-                        
-                        // Collect same stats
-                        const playerName = star.properties.player_name;
-                        if (playerName && playerName !== 'unknown') {{
-                            stats.topPlayers.set(playerName, (stats.topPlayers.get(playerName) || 0) + 1);
-                        }}
-                        
-                        const goalieName = star.properties.goalie_name;
-                        if (goalieName && goalieName !== 'Empty Net') {{
-                            stats.topGoalies.set(goalieName, (stats.topGoalies.get(goalieName) || 0) + 1);
-                        }}
-                        
-                        if (star.properties.team_name) {{
-                            stats.teams.add(star.properties.team_name);
-                        }}
-                        
-                        if (star.properties.shot_type) {{
-                            stats.shotTypes.set(star.properties.shot_type, (stats.shotTypes.get(star.properties.shot_type) || 0) + 1);
-                        }}
-                        
-                        if (star.properties.period) {{
-                            stats.periods.set(star.properties.period, (stats.periods.get(star.properties.period) || 0) + 1);
-                        }}
-                        
-                        
-                        // Collect shot zone stats
-                        if (star.properties.shot_zone && star.properties.shot_zone.trim() !== '') {{
-                            stats.shotZones.set(star.properties.shot_zone, (stats.shotZones.get(star.properties.shot_zone) || 0) + 1);
-                        }}
-                        
-                        // Collect situation stats
-                        if (star.properties.situation && star.properties.situation.trim() !== '') {{
-                            stats.situations.set(star.properties.situation, (stats.situations.get(star.properties.situation) || 0) + 1);
-                        }}
-                    }}
-                }});
-            }}
-            
-            // Calculate averages
-            if (stats.validCoords > 0) {{
-                stats.avgX = stats.avgX / stats.validCoords;
-                stats.avgY = stats.avgY / stats.validCoords;
-            }}
-            
-            if (stats.validPeriodData > 0) {{
-                stats.avgPeriod = stats.avgPeriod / stats.validPeriodData;
-                stats.avgPeriodTime = stats.avgPeriodTime / stats.validPeriodData;
-            }}
-            
-            if (stats.validScoreData > 0) {{
-                stats.avgScoreDiff = stats.avgScoreDiff / stats.validScoreData;
-            }}
-            
-            if (stats.validSeasonData > 0) {{
-                stats.avgSeasonDay = stats.avgSeasonDay / stats.validSeasonData;
-            }}
-            
+            hierarchicalStatsCache.set(cacheKey, stats);
             return stats;
         }}
         
@@ -3513,17 +3347,21 @@ def create_embedded_constellation_html():
 </html>'''
     
     # Write the HTML file to root directory
-    output_path = 'free_roam.html'
     with open(output_path, 'w', encoding='utf-8') as f:
         f.write(html_content)
     
     print(f"✅ Created interactive constellation map: {output_path}")
+    if sidecar_path:
+        print(f"📦 Map data: {sidecar_path} ({os.path.getsize(sidecar_path) / 1024 / 1024:.1f} MB)")
     print(f"📊 Embedded {len(geojson_data['features'])} celestial objects")
     print(f"🌌 {len([f for f in geojson_data['features'] if f['properties']['type'] == 'galaxy'])} galaxies")
     print(f"⭐ {len([f for f in geojson_data['features'] if f['properties']['type'] == 'cluster'])} clusters") 
     print(f"🪐 {len([f for f in geojson_data['features'] if f['properties']['type'] == 'solar_system'])} solar systems")
     print(f"🌟 {len([f for f in geojson_data['features'] if f['properties']['type'] == 'star'])} stars")
-    print(f"🚀 Open {output_path} in Chrome to explore!")
+    if sidecar_path:
+        print(f"🚀 Serve this directory (e.g. python -m http.server) and open {output_path} in Chrome to explore!")
+    else:
+        print(f"🚀 Open {output_path} in Chrome to explore!")
 
 if __name__ == "__main__":
     create_embedded_constellation_html()
\ No newline at end of file
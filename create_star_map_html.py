@@ -1,20 +1,31 @@
-import json
 import os
 
+import hierarchy_stats
+import star_map_data
+from geojson_writer import load_geojson
+
+# canvas (default) draws all stars on one canvas layer; markers is one SVG marker per goal
+STAR_MAP_RENDERER = os.environ.get('STAR_MAP_RENDERER', 'canvas')
+
 def create_embedded_constellation_html():
     """Create an HTML file with embedded GeoJSON data in the root directory"""
     
     # Read static GeoJSON file for star map
     static_path = 'visualizations/nhl_constellation_map_static.geojson'
     
-    if not os.path.exists(static_path):
+    try:
+        static_geojson_data = load_geojson(static_path)
+    except FileNotFoundError:
         print(f"Error: {static_path} not found. Run mapping_static.py first.")
         return
     
-    with open(static_path, 'r') as f:
-        static_geojson_data = json.load(f)
+    # Write the star data next to the page (or embed it, see star_map_data)
+    output_path = 'index.html'
+    data_script, sidecar_path = star_map_data.page_data_script(static_geojson_data, output_path, 'star-map-main')
+    # Galaxy/cluster/solar system stats are rolled up here rather than in the browser
+    stats_script = hierarchy_stats.stats_script(hierarchy_stats.hierarchy_stats(static_geojson_data))
     
-    # HTML template with embedded data
+    # HTML template; the page script runs once the data has been decoded
     html_content = f'''<!DOCTYPE html>
 <html lang="en">
 <head>
@@ -1738,9 +1749,10 @@ def create_embedded_constellation_html():
     <!-- Leaflet JavaScript -->
     <script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
     
-    <script>
-        // Embedded GeoJSON data
-        
+    {stats_script}
+    {data_script}
+    
+    <script type="text/plain" id="star-map-main">
         // Hide loading screen once data is loaded
         document.getElementById('loading').style.display = 'none';
         
@@ -1766,7 +1778,7 @@ def create_embedded_constellation_html():
         }}
         
         // Set up modal event listeners after DOM is ready
-        document.addEventListener('DOMContentLoaded', function() {{
+        onDomReady(function() {{
             // Detect Chrome mobile and add class for specific positioning
             const isChrome = /Chrome/.test(navigator.userAgent) && /Google Inc/.test(navigator.vendor);
             const isMobile = /Mobi|Android/i.test(navigator.userAgent);
@@ -1804,14 +1816,15 @@ def create_embedded_constellation_html():
             transformation: new L.Transformation(1, 0, -1, 0)
         }});
         
-        // Embedded GeoJSON data
-        const STAR_MAP_DATA = {json.dumps(static_geojson_data)};
+        // GeoJSON data decoded by the star map data loader
+        const STAR_MAP_DATA = window.starMapData;
+        const STAR_RENDERER = '{STAR_MAP_RENDERER}';
         
         // Extract different feature types
-        const stars = STAR_MAP_DATA.features.filter(f => f.properties.type === 'star');
-        const galaxies = STAR_MAP_DATA.features.filter(f => f.properties.type === 'galaxy');
-        const clusters = STAR_MAP_DATA.features.filter(f => f.properties.type === 'cluster');
-        const solarSystems = STAR_MAP_DATA.features.filter(f => f.properties.type === 'solar_system');
+        const stars = STAR_MAP_DATA.featuresOfType('star');
+        const galaxies = STAR_MAP_DATA.featuresOfType('galaxy');
+        const clusters = STAR_MAP_DATA.featuresOfType('cluster');
+        const solarSystems = STAR_MAP_DATA.featuresOfType('solar_system');
         
         
         console.log('Data loaded:', {{
@@ -1857,26 +1870,30 @@ def create_embedded_constellation_html():
             
             // Add click handler to manually center view when popup opens
             marker.on('popupopen', function(e) {{
-                const popupLatLng = e.popup.getLatLng();
-                const currentCenter = map.getCenter();
-                const distance = currentCenter.distanceTo(popupLatLng);
-                
-                // If popup is not close to center, pan to it
-                if (distance > 100) {{ // 100 meters threshold
-                    isCenteringForPopup = true;
-                    map.panTo(popupLatLng, {{
-                        animate: true,
-                        duration: 0.5
-                    }});
-                    
-                    // Reset flag after panning completes
-                    setTimeout(() => {{
-                        isCenteringForPopup = false;
-                    }}, 600); // Slightly longer than animation duration
-                }}
+                centerMapOnPopup(e.popup.getLatLng());
             }});
         }}
         
+        // Pan to a popup that opened away from the center of the view
+        function centerMapOnPopup(popupLatLng) {{
+            const currentCenter = map.getCenter();
+            const distance = currentCenter.distanceTo(popupLatLng);
+            
+            // If popup is not close to center, pan to it
+            if (distance > 100) {{ // 100 meters threshold
+                isCenteringForPopup = true;
+                map.panTo(popupLatLng, {{
+                    animate: true,
+                    duration: 0.5
+                }});
+                
+                // Reset flag after panning completes
+                setTimeout(() => {{
+                    isCenteringForPopup = false;
+                }}, 600); // Slightly longer than animation duration
+            }}
+        }}
+        
         // Home button removed for static star map mode
         
         // URL parameter handling for sharing locations
@@ -1962,6 +1979,18 @@ def create_embedded_constellation_html():
             const targetLatLng = L.latLng(lat, lng);
             const tolerance = 0.001; // Small tolerance for coordinate matching
             
+            // Canvas star layer: look the star up in its grid index
+            if (starMapLayer && starMapLayer.findNearest && map.hasLayer(starMapLayer)) {{
+                const index = starMapLayer.findNearest(targetLatLng, tolerance);
+                if (index >= 0) {{
+                    starMapLayer.openStarPopup(index);
+                    console.log(`Opened popup for shared location: ${{name}}`);
+                }} else {{
+                    console.log(`Could not find marker for shared location: ${{name}} at [${{lat}}, ${{lng}}]`);
+                }}
+                return;
+            }}
+            
             // Find the closest marker to the shared coordinates
             let closestMarker = null;
             let minDistance = Infinity;
@@ -2229,6 +2258,10 @@ def create_embedded_constellation_html():
             }}
         }});
         
+        // Statistics for every galaxy, cluster and solar system, computed when the page was generated
+        const HIERARCHY_STATS = JSON.parse(document.getElementById('hierarchy-stats').textContent);
+        const hierarchicalStatsCache = new Map();
+        
         // Index galaxies, clusters, and solar systems
         galaxies.forEach(galaxy => {{
             const stats = getHierarchicalStats(galaxy.properties.name, 'galaxy');
@@ -2325,7 +2358,23 @@ def create_embedded_constellation_html():
         
         // Function to get hierarchical statistics for celestial objects
         function getHierarchicalStats(objectName, level) {{
-            let stats = {{
+            const cacheKey = `${{level}}/${{objectName}}`;
+            if (hierarchicalStatsCache.has(cacheKey)) {{
+                return hierarchicalStatsCache.get(cacheKey);
+            }}
+            
+            const precomputed = (HIERARCHY_STATS[level] || {{}})[objectName];
+            const stats = precomputed ? {{
+                ...precomputed,
+                topPlayers: new Map(precomputed.topPlayers),
+                topGoalies: new Map(precomputed.topGoalies),
+                teams: new Set(precomputed.teams),
+                shotTypes: new Map(precomputed.shotTypes),
+                periods: new Map(precomputed.periods),
+                shotZones: new Map(precomputed.shotZones),
+                situations: new Map(precomputed.situations),
+                avgScoreDiff: precomputed.avgScoreDiff === null ? NaN : precomputed.avgScoreDiff
+            }} : {{
                 name: objectName,
                 level: level,
                 clusters: 0,
@@ -2339,7 +2388,6 @@ def create_embedded_constellation_html():
                 periods: new Map(),
                 shotZones: new Map(),
                 situations: new Map(),
-                // New stats for different hierarchy levels
                 avgX: 0,
                 avgY: 0,
                 avgPeriod: 0,
@@ -2351,203 +2399,7 @@ def create_embedded_constellation_html():
                 validScoreData: 0,
                 validSeasonData: 0
             }};
-            
-            if (level === 'galaxy') {{
-                // Count clusters, solar systems, and stars within this galaxy
-                clusters.forEach(cluster => {{
-                    if (cluster.properties.name.startsWith(objectName + '.')) {{
-                        stats.clusters++;
-                    }}
-                }});
-                
-                solarSystems.forEach(system => {{
-                    if (system.properties.name.startsWith(objectName + '.')) {{
-                        stats.solarSystems++;
-                    }}
-                }});
-                
-                stars.forEach(star => {{
-                    if (star.properties.galaxy === objectName) {{
-                        stats.stars++;
-                        stats.totalGoals++;
-                        
-                        // Collect player stats
-                        const playerName = star.properties.player_name;
-                        if (playerName && playerName !== 'unknown') {{
-                            stats.topPlayers.set(playerName, (stats.topPlayers.get(playerName) || 0) + 1);
-                        }}
-                        
-                        // Collect goalie stats
-                        const goalieName = star.properties.goalie_name;
-                        if (goalieName && goalieName !== 'Empty Net') {{
-                            stats.topGoalies.set(goalieName, (stats.topGoalies.get(goalieName) || 0) + 1);
-                        }}
-                        
-                        // Collect team stats
-                        if (star.properties.team_name) {{
-                            stats.teams.add(star.properties.team_name);
-                        }}
-                        
-                        // Collect shot type stats
-                        if (star.properties.shot_type) {{
-                            stats.shotTypes.set(star.properties.shot_type, (stats.shotTypes.get(star.properties.shot_type) || 0) + 1);
-                        }}
-                        
-                        // Collect period stats
-                        if (star.properties.period) {{
-                            stats.periods.set(star.properties.period, (stats.periods.get(star.properties.period) || 0) + 1);
-                        }}
-                        
-                        
-                        // Collect shot zone stats
-                        if (star.properties.shot_zone && star.properties.shot_zone.trim() !== '') {{
-                            stats.shotZones.set(star.properties.shot_zone, (stats.shotZones.get(star.properties.shot_zone) || 0) + 1);
-                        }}
-                        
-                        // Collect situation stats
-                        if (star.properties.situation && star.properties.situation.trim() !== '') {{
-                            stats.situations.set(star.properties.situation, (stats.situations.get(star.properties.situation) || 0) + 1);
-                        }}
-                        
-                        // Galaxy-specific stats: average coordinates for zone information
-                        if (star.properties.x && star.properties.y && !isNaN(star.properties.x) && !isNaN(star.properties.y)) {{
-                            stats.avgX += parseFloat(star.properties.x);
-                            stats.avgY += parseFloat(star.properties.y);
-                            stats.validCoords++;
-                        }}
-                    }}
-                }});
-            }} else if (level === 'cluster') {{
-                // Count solar systems and stars within this cluster
-                solarSystems.forEach(system => {{
-                    if (system.properties.name.startsWith(objectName + '.')) {{
-                        stats.solarSystems++;
-                    }}
-                }});
-                
-                stars.forEach(star => {{
-                    if (star.properties.cluster === objectName) {{
-                        stats.stars++;
-                        stats.totalGoals++;
-                        
-                        // Collect same stats as galaxy level
-                        const playerName = star.properties.player_name;
-                        if (playerName && playerName !== 'unknown') {{
-                            stats.topPlayers.set(playerName, (stats.topPlayers.get(playerName) || 0) + 1);
-                        }}
-                        
-                        const goalieName = star.properties.goalie_name;
-                        if (goalieName && goalieName !== 'Empty Net') {{
-                            stats.topGoalies.set(goalieName, (stats.topGoalies.get(goalieName) || 0) + 1);
-                        }}
-                        
-                        if (star.properties.team_name) {{
-                            stats.teams.add(star.properties.team_name);
-                        }}
-                        
-                        if (star.properties.shot_type) {{
-                            stats.shotTypes.set(star.properties.shot_type, (stats.shotTypes.get(star.properties.shot_type) || 0) + 1);
-                        }}
-                        
-                        if (star.properties.period) {{
-                            stats.periods.set(star.properties.period, (stats.periods.get(star.properties.period) || 0) + 1);
-                        }}
-                        
-                        
-                        // Collect shot zone stats
-                        if (star.properties.shot_zone && star.properties.shot_zone.trim() !== '') {{
-                            stats.shotZones.set(star.properties.shot_zone, (stats.shotZones.get(star.properties.shot_zone) || 0) + 1);
-                        }}
-                        
-                        // Collect situation stats
-                        if (star.properties.situation && star.properties.situation.trim() !== '') {{
-                            stats.situations.set(star.properties.situation, (stats.situations.get(star.properties.situation) || 0) + 1);
-                        }}
-                        
-                        // Cluster-specific stats: period, time, score, and date averages
-                        if (star.properties.period && !isNaN(star.properties.period)) {{
-                            stats.avgPeriod += parseFloat(star.properties.period);
-                            stats.validPeriodData++;
-                        }}
-                        
-                        if (star.properties.period_time && !isNaN(star.properties.period_time)) {{
-                            stats.avgPeriodTime += parseFloat(star.properties.period_time);
-                        }}
-                        
-                        if (star.properties.score_diff !== undefined && !isNaN(star.properties.score_diff)) {{
-                            stats.avgScoreDiff += parseFloat(star.properties.score_diff);
-                            stats.validScoreData++;
-                        }}
-                        
-                        if (star.properties.season_day && !isNaN(star.properties.season_day)) {{
-                            stats.avgSeasonDay += parseFloat(star.properties.season_day);
-                            stats.validSeasonData++;
-                        }}
-                    }}
-                }});
-            }} else if (level === 'solar system') {{
-                // Count stars within this solar system
-                stars.forEach(star => {{
-                    if (star.properties.solar_system === objectName) {{
-                        stats.stars++;
-                        stats.totalGoals++;
-                        
-                        // Collect same stats
-                        const playerName = star.properties.player_name;
-                        if (playerName && playerName !== 'unknown') {{
-                            stats.topPlayers.set(playerName, (stats.topPlayers.get(playerName) || 0) + 1);
-                        }}
-                        
-                        const goalieName = star.properties.goalie_name;
-                        if (goalieName && goalieName !== 'Empty Net') {{
-                            stats.topGoalies.set(goalieName, (stats.topGoalies.get(goalieName) || 0) + 1);
-                        }}
-                        
-                        if (star.properties.team_name) {{
-                            stats.teams.add(star.properties.team_name);
-                        }}
-                        
-                        if (star.properties.shot_type) {{
-                            stats.shotTypes.set(star.properties.shot_type, (stats.shotTypes.get(star.properties.shot_type) || 0) + 1);
-                        }}
-                        
-                        if (star.properties.period) {{
-                            stats.periods.set(star.properties.period, (stats.periods.get(star.properties.period) || 0) + 1);
-                        }}
-                        
-                        
-                        // Collect shot zone stats
-                        if (star.properties.shot_zone && star.properties.shot_zone.trim() !== '') {{
-                            stats.shotZones.set(star.properties.shot_zone, (stats.shotZones.get(star.properties.shot_zone) || 0) + 1);
-                        }}
-                        
-                        // Collect situation stats
-                        if (star.properties.situation && star.properties.situation.trim() !== '') {{
-                            stats.situations.set(star.properties.situation, (stats.situations.get(star.properties.situation) || 0) + 1);
-                        }}
-                    }}
-                }});
-            }}
-            
-            // Calculate averages
-            if (stats.validCoords > 0) {{
-                stats.avgX = stats.avgX / stats.validCoords;
-                stats.avgY = stats.avgY / stats.validCoords;
-            }}
-            
-            if (stats.validPeriodData > 0) {{
-                stats.avgPeriod = stats.avgPeriod / stats.validPeriodData;
-                stats.avgPeriodTime = stats.avgPeriodTime / stats.validPeriodData;
-            }}
-            
-            if (stats.validScoreData > 0) {{
-                stats.avgScoreDiff = stats.avgScoreDiff / stats.validScoreData;
-            }}
-            
-            if (stats.validSeasonData > 0) {{
-                stats.avgSeasonDay = stats.avgSeasonDay / stats.validSeasonData;
-            }}
-            
+            hierarchicalStatsCache.set(cacheKey, stats);
             return stats;
         }}
         
@@ -4285,8 +4137,6 @@ def create_embedded_constellation_html():
         function initStarMapMode() {{
             console.log('Initializing Star Map mode');
             
-            // Create star map layer group
-            starMapLayer = L.layerGroup();
             galaxyShadeLayer = L.layerGroup();
             constellationLayer = L.layerGroup();
             
@@ -4313,37 +4163,225 @@ def create_embedded_constellation_html():
             console.log(`Star Map initialized with ${{stars.length}} stars`);
         }}
         
-        function renderAllStars() {{
-            console.log('Rendering all stars for static map');
-            
-            stars.forEach(star => {{
-                const coord = [star.geometry.coordinates[1], star.geometry.coordinates[0]];
+        // Popup content for one goal, built when the star is clicked
+        function starPopupContent(star) {{
+            return `
+                <div class="custom-popup">
+                    <h3>${{star.properties.player_name}}</h3>
+                    <p><strong>Team:</strong> ${{star.properties.team_name}}</p>
+                    <p><strong>Shot Type:</strong> ${{star.properties.shot_type}}</p>
+                    <p><strong>Period:</strong> ${{star.properties.period}}</p>
+                    <p><strong>Time:</strong> ${{star.properties.time}}</p>
+                    <p><strong>Date:</strong> ${{star.properties.game_date}}</p>
+                    ${{star.properties.url ? `<p><a href="${{star.properties.url}}" target="_blank">🎥 Watch Goal</a></p>` : ''}}
+                </div>
+            `;
+        }}
+        
+        // Counting sort of 0..nKeys-1 keys: order lists indices grouped by key, key k owns order[starts[k]..starts[k + 1])
+        function groupByKey(keys, nKeys) {{
+            const starts = new Uint32Array(nKeys + 1);
+            for (let i = 0; i < keys.length; i++) starts[keys[i] + 1]++;
+            for (let k = 0; k < nKeys; k++) starts[k + 1] += starts[k];
+            const next = starts.slice(0, nKeys);
+            const order = new Uint32Array(keys.length);
+            for (let i = 0; i < keys.length; i++) order[next[keys[i]]++] = i;
+            return {{ starts, order }};
+        }}
+        
+        // Canvas layer that draws every star in one pass per color instead of one SVG marker per goal.
+        // Leaflet's canvas renderer handles positioning, padding and zoom animation; panning moves the
+        // canvas with the map and stars are only redrawn when the view settles. Clicks are hit-tested
+        // against a uniform grid over the stars and popups are built only for the star clicked.
+        const StarPointLayer = L.Canvas.extend({{
+            options: {{
+                padding: 0.3,
+                radius: 2,
+                fillOpacity: 0.8,
+                defaultColor: '#64c8ff',
+                clickTolerance: 3 // Extra pixels around a star that still count as a hit
+            }},
+            
+            initialize(features, popupContent, options) {{
+                L.Canvas.prototype.initialize.call(this, options);
+                this._features = features;
+                this._popupContent = popupContent;
                 
-                // Create star marker
-                const marker = L.circleMarker(coord, {{
-                    radius: 2,
-                    fillColor: star.properties.cluster_color || '#64c8ff',
-                    color: 'none',
-                    fillOpacity: 0.8,
-                    weight: 0
+                const n = features.length;
+                this._lat = new Float64Array(n);
+                this._lng = new Float64Array(n);
+                const colorIndex = new Uint32Array(n);
+                const colorIds = new Map();
+                this._colors = [];
+                features.forEach((feature, i) => {{
+                    this._lng[i] = feature.geometry.coordinates[0];
+                    this._lat[i] = feature.geometry.coordinates[1];
+                    const color = feature.properties.cluster_color || this.options.defaultColor;
+                    if (!colorIds.has(color)) {{
+                        colorIds.set(color, this._colors.length);
+                        this._colors.push(color);
+                    }}
+                    colorIndex[i] = colorIds.get(color);
                 }});
+                this._byColor = groupByKey(colorIndex, this._colors.length);
+                this._buildGrid();
+            }},
+            
+            // Uniform grid with about four stars per cell
+            _buildGrid() {{
+                const n = this._lat.length;
+                let minLat = Infinity, maxLat = -Infinity, minLng = Infinity, maxLng = -Infinity;
+                for (let i = 0; i < n; i++) {{
+                    minLat = Math.min(minLat, this._lat[i]);
+                    maxLat = Math.max(maxLat, this._lat[i]);
+                    minLng = Math.min(minLng, this._lng[i]);
+                    maxLng = Math.max(maxLng, this._lng[i]);
+                }}
+                const side = Math.max(1, Math.ceil(Math.sqrt(n / 4)));
+                this._grid = {{
+                    side,
+                    minLat: n ? minLat : 0,
+                    minLng: n ? minLng : 0,
+                    cellLat: (maxLat - minLat) / side || 1,
+                    cellLng: (maxLng - minLng) / side || 1
+                }};
+                const cells = new Uint32Array(n);
+                for (let i = 0; i < n; i++) {{
+                    cells[i] = this._cellRow(this._lat[i]) * side + this._cellCol(this._lng[i]);
+                }}
+                this._cells = groupByKey(cells, side * side);
+            }},
+            
+            _cellRow(lat) {{
+                const g = this._grid;
+                return Math.min(g.side - 1, Math.max(0, Math.floor((lat - g.minLat) / g.cellLat)));
+            }},
+            
+            _cellCol(lng) {{
+                const g = this._grid;
+                return Math.min(g.side - 1, Math.max(0, Math.floor((lng - g.minLng) / g.cellLng)));
+            }},
+            
+            onAdd(map) {{
+                L.Canvas.prototype.onAdd.call(this, map);
+                map.on('click', this._onMapClick, this);
+            }},
+            
+            onRemove(map) {{
+                map.off('click', this._onMapClick, this);
+                L.Canvas.prototype.onRemove.call(this, map);
+            }},
+            
+            // The map CRS is linear, so layer pixels are an offset plus a scale of lng/lat
+            _pixelTransform() {{
+                const origin = this._map.latLngToLayerPoint([0, 0]);
+                const unit = this._map.latLngToLayerPoint([1, 1]);
+                return {{ x0: origin.x, y0: origin.y, sx: unit.x - origin.x, sy: unit.y - origin.y }};
+            }},
+            
+            _draw() {{
+                if (!this._map || !this._bounds) return;
+                const ctx = this._ctx;
+                const t = this._pixelTransform();
+                const r = this.options.radius;
+                const minX = this._bounds.min.x - r, maxX = this._bounds.max.x + r;
+                const minY = this._bounds.min.y - r, maxY = this._bounds.max.y + r;
+                const {{ starts, order }} = this._byColor;
                 
-                // Add popup with goal details
-                const popupContent = `
-                    <div class="custom-popup">
-                        <h3>${{star.properties.player_name}}</h3>
-                        <p><strong>Team:</strong> ${{star.properties.team_name}}</p>
-                        <p><strong>Shot Type:</strong> ${{star.properties.shot_type}}</p>
-                        <p><strong>Period:</strong> ${{star.properties.period}}</p>
-                        <p><strong>Time:</strong> ${{star.properties.time}}</p>
-                        <p><strong>Date:</strong> ${{star.properties.game_date}}</p>
-                        ${{star.properties.url ? `<p><a href="${{star.properties.url}}" target="_blank">🎥 Watch Goal</a></p>` : ''}}
-                    </div>
-                `;
-                
-                bindPopupWithCentering(marker, popupContent);
-                starMapLayer.addLayer(marker);
-            }});
+                ctx.save();
+                ctx.globalAlpha = this.options.fillOpacity;
+                for (let c = 0; c < this._colors.length; c++) {{
+                    let visible = false;
+                    ctx.beginPath();
+                    for (let k = starts[c]; k < starts[c + 1]; k++) {{
+                        const i = order[k];
+                        const x = t.x0 + t.sx * this._lng[i];
+                        const y = t.y0 + t.sy * this._lat[i];
+                        if (x < minX || x > maxX || y < minY || y > maxY) continue;
+                        ctx.moveTo(x + r, y);
+                        ctx.arc(x, y, r, 0, 2 * Math.PI);
+                        visible = true;
+                    }}
+                    if (visible) {{
+                        ctx.fillStyle = this._colors[c];
+                        ctx.fill();
+                    }}
+                }}
+                ctx.restore();
+            }},
+            
+            // Index of the star nearest to latlng within maxDistance (map units), or -1
+            findNearest(latlng, maxDistance) {{
+                const {{ starts, order }} = this._cells;
+                const side = this._grid.side;
+                const row0 = this._cellRow(latlng.lat - maxDistance), row1 = this._cellRow(latlng.lat + maxDistance);
+                const col0 = this._cellCol(latlng.lng - maxDistance), col1 = this._cellCol(latlng.lng + maxDistance);
+                let best = -1;
+                let bestDistance = maxDistance * maxDistance;
+                for (let row = row0; row <= row1; row++) {{
+                    for (let col = col0; col <= col1; col++) {{
+                        const cell = row * side + col;
+                        for (let k = starts[cell]; k < starts[cell + 1]; k++) {{
+                            const i = order[k];
+                            const dLat = this._lat[i] - latlng.lat;
+                            const dLng = this._lng[i] - latlng.lng;
+                            const distance = dLat * dLat + dLng * dLng;
+                            if (distance <= bestDistance) {{
+                                bestDistance = distance;
+                                best = i;
+                            }}
+                        }}
+                    }}
+                }}
+                return best;
+            }},
+            
+            openStarPopup(index) {{
+                const latlng = L.latLng(this._lat[index], this._lng[index]);
+                L.popup({{ autoPan: false, closeOnEscapeKey: true }})
+                    .setLatLng(latlng)
+                    .setContent(this._popupContent(this._features[index]))
+                    .openOn(this._map);
+                centerMapOnPopup(latlng);
+            }},
+            
+            _onMapClick(e) {{
+                const pixels = Math.abs(this._pixelTransform().sx);
+                const tolerance = (this.options.radius + this.options.clickTolerance) / pixels;
+                const index = this.findNearest(e.latlng, tolerance);
+                if (index >= 0) {{
+                    this.openStarPopup(index);
+                }}
+            }}
+        }});
+        
+        function renderAllStars() {{
+            console.log(`Rendering all stars for static map (${{STAR_RENDERER}} renderer)`);
+            
+            if (STAR_RENDERER === 'markers') {{
+                // One SVG circle marker per goal (slow beyond a few thousand goals)
+                starMapLayer = L.layerGroup();
+                stars.forEach(star => {{
+                    const coord = [star.geometry.coordinates[1], star.geometry.coordinates[0]];
+                    const marker = L.circleMarker(coord, {{
+                        radius: 2,
+                        fillColor: star.properties.cluster_color || '#64c8ff',
+                        color: 'none',
+                        fillOpacity: 0.8,
+                        weight: 0
+                    }});
+                    bindPopupWithCentering(marker, starPopupContent(star));
+                    starMapLayer.addLayer(marker);
+                }});
+                return;
+            }}
+            
+            // Below the galaxy shading and ignoring the pointer, so area tooltips keep working;
+            // star clicks arrive through the map's click event
+            const pane = map.createPane('starPointPane');
+            pane.style.zIndex = 350;
+            pane.style.pointerEvents = 'none';
+            starMapLayer = new StarPointLayer(stars, starPopupContent, {{ pane: 'starPointPane' }});
         }}
         
         // Helper function to generate unique color per galaxy
@@ -5263,17 +5301,21 @@ def create_embedded_constellation_html():
 </html>'''
     
     # Write the HTML file to root directory
-    output_path = 'index.html'
     with open(output_path, 'w', encoding='utf-8') as f:
         f.write(html_content)
     
     print(f"✅ Created interactive constellation map: {output_path}")
+    if sidecar_path:
+        print(f"📦 Star data: {sidecar_path} ({os.path.getsize(sidecar_path) / 1024 / 1024:.1f} MB)")
     print(f"📊 Embedded {len(static_geojson_data['features'])} celestial objects")
     print(f"🌌 {len([f for f in static_geojson_data['features'] if f['properties']['type'] == 'galaxy'])} galaxies")
     print(f"⭐ {len([f for f in static_geojson_data['features'] if f['properties']['type'] == 'cluster'])} clusters") 
     print(f"🪐 {len([f for f in static_geojson_data['features'] if f['properties']['type'] == 'solar_system'])} solar systems")
     print(f"🌟 {len([f for f in static_geojson_data['features'] if f['properties']['type'] == 'star'])} stars")
-    print(f"🚀 Open {output_path} in Chrome to explore!")
+    if sidecar_path:
+        print(f"🚀 Serve this directory (e.g. python -m http.server) and open {output_path} in Chrome to explore!")
+    else:
+        print(f"🚀 Open {output_path} in Chrome to explore!")
 
 if __name__ == "__main__":
     create_embedded_constellation_html()
\ No newline at end of file
@@ -8,6 +8,8 @@ from google import genai
 from google.genai import types
 import os
 
+import goal_store
+
 
 class EmbeddingWrapper:
     def __init__(self, embedding_model="models/embedding-001"):
@@ -98,7 +100,8 @@ def get_embeddings_for_teams(embedding_client: EmbeddingWrapper, teams: pd.DataF
     return embeddings
 
 if __name__ == "__main__":
-    data = pd.read_csv('data/nhl_goals_with_names.csv')
+    data = goal_store.read_goals('goals_with_names',
+                                 columns=['player_id', 'player_name', 'goalie', 'goalie_name', 'team_id', 'team_name'])
     players = data[['player_id', 'player_name']].drop_duplicates()
     goalies = data[['goalie', 'goalie_name']].drop_duplicates()
     teams = data[['team_id', 'team_name']].drop_duplicates()
@@ -0,0 +1,216 @@
+"""
+Content-addressed on-disk cache for the clustering pipeline.
+
+Scaled feature matrices and UMAP embeddings are stored as .npy files under cache/features/,
+named by a hash of the input data, the feature columns and the UMAP parameters, and loaded
+back memory-mapped. The fitted scaler and UMAP reducer that clustering.py saves in its model
+bundle are pickled next to the embedding as .joblib files under the same key. Re-running
+clustering.py or the hyperparameter exploration with unchanged inputs skips StandardScaler
+and UMAP and goes straight to HDBSCAN.
+
+The cache is capped at FEATURE_CACHE_MAX_BYTES (default 2 GB); the least recently used
+files are evicted first. Set FEATURE_CACHE=0 to disable it.
+"""
+import hashlib
+import json
+import logging
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+import umap
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.path.join('cache', 'features')
+CACHE_ENABLED = os.environ.get('FEATURE_CACHE', '1') != '0'
+MAX_CACHE_BYTES = int(os.environ.get('FEATURE_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+
+# Bump to invalidate every entry when the way matrices are built changes
+CACHE_VERSION = 1
+
+# Cache entry files: arrays and pickled fitted models
+ENTRY_SUFFIXES = ('.npy', '.joblib')
+
+
+def frame_digest(df):
+    """Hash of a DataFrame's column names, dtypes and values"""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([list(map(str, df.columns)), list(map(str, df.dtypes))]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def cache_key(kind, *parts):
+    """Stable key for a cache entry built from JSON-serialisable parts"""
+    payload = json.dumps([CACHE_VERSION, kind, *parts], sort_keys=True, default=str)
+    return f"{kind}-{hashlib.sha256(payload.encode()).hexdigest()[:32]}"
+
+
+def _entry_path(key, suffix='.npy'):
+    return os.path.join(CACHE_DIR, f"{key}{suffix}")
+
+
+def _touch(path):
+    """Mark an entry as recently used (it may have been evicted by another process meanwhile)"""
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+
+
+def load_array(key):
+    """Return the cached array memory-mapped read-only, or None on a miss"""
+    path = _entry_path(key)
+    if not os.path.exists(path):
+        return None
+    try:
+        array = np.load(path, mmap_mode='r')
+    except (OSError, ValueError) as e:
+        logger.warning(f"Discarding unreadable cache entry {path}: {e}")
+        os.remove(path)
+        return None
+    # Touch the file so eviction treats it as recently used
+    _touch(path)
+    return array
+
+
+def save_array(key, array):
+    """Store an array atomically and evict old entries if the cache is over its cap"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _entry_path(key)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, np.ascontiguousarray(array))
+    os.replace(tmp_path, path)
+    evict(MAX_CACHE_BYTES)
+
+
+def load_model(key):
+    """Return the fitted objects pickled under key, or None on a miss"""
+    path = _entry_path(key, '.joblib')
+    if not os.path.exists(path):
+        return None
+    try:
+        model = joblib.load(path)
+    except Exception as e:
+        logger.warning(f"Discarding unreadable cache entry {path}: {e}")
+        os.remove(path)
+        return None
+    _touch(path)
+    return model
+
+
+def save_model(key, model):
+    """Pickle fitted objects atomically and evict old entries if the cache is over its cap"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _entry_path(key, '.joblib')
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    joblib.dump(model, tmp_path)
+    os.replace(tmp_path, path)
+    evict(MAX_CACHE_BYTES)
+
+
+def evict(max_bytes=MAX_CACHE_BYTES):
+    """Remove least recently used entries until the cache fits in max_bytes"""
+    if not os.path.isdir(CACHE_DIR):
+        return
+    entries = []
+    for name in os.listdir(CACHE_DIR):
+        if name.endswith(ENTRY_SUFFIXES):
+            # Another worker process may evict the same entries concurrently
+            try:
+                stat = os.stat(os.path.join(CACHE_DIR, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(CACHE_DIR, name))
+            logger.info(f"Evicted {name} from feature cache")
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def cached_array(key, compute):
+    """Return the array stored under key, computing and storing it on a miss"""
+    if not CACHE_ENABLED:
+        return compute()
+    array = load_array(key)
+    if array is not None:
+        logger.info(f"Feature cache hit: {key}")
+        return array
+    array = compute()
+    save_array(key, array)
+    return array
+
+
+def scaled_features(df_encoded):
+    """
+    Standardize an encoded feature frame, using the cache when possible.
+
+    Returns:
+        tuple: (cache key of the scaled matrix, scaled matrix)
+    """
+    key = cache_key('scaled', frame_digest(df_encoded))
+    scaled = cached_array(key, lambda: StandardScaler().fit_transform(df_encoded.values))
+    return key, scaled
+
+
+def umap_embedding(df_encoded, umap_params, random_state=42):
+    """
+    Scale an encoded feature frame and embed it with UMAP, using the cache when possible.
+
+    Args:
+        df_encoded: Output of encode_categorical_features
+        umap_params: Keyword arguments for umap.UMAP
+        random_state: UMAP random state (part of the cache key)
+
+    Returns:
+        np.ndarray: UMAP embedding, one row per goal
+    """
+    scaled_key, features_scaled = scaled_features(df_encoded)
+    print(f"Clustering {len(features_scaled)} goals with {features_scaled.shape[1]} features")
+    key = cache_key('umap', scaled_key, umap_params, random_state, umap.__version__)
+
+    def fit():
+        print("Applying UMAP dimensionality reduction...")
+        return umap.UMAP(random_state=random_state, **umap_params).fit_transform(features_scaled)
+
+    return cached_array(key, fit)
+
+
+def umap_model(df_encoded, umap_params, random_state=42):
+    """
+    Fit the scaler and UMAP reducer themselves, for callers that need to transform new goals.
+
+    The fitted objects are cached under the same key as umap_embedding's embedding (which
+    is stored too), so later runs on the same data skip UMAP either way.
+
+    Returns:
+        tuple: (StandardScaler, fitted umap.UMAP, embedding)
+    """
+    scaled_key = cache_key('scaled', frame_digest(df_encoded))
+    key = cache_key('umap', scaled_key, umap_params, random_state, umap.__version__)
+    if CACHE_ENABLED:
+        cached = load_model(key)
+        if cached is not None:
+            logger.info(f"Feature cache hit: {key}")
+            scaler, reducer = cached
+            return scaler, reducer, reducer.embedding_
+
+    scaler = StandardScaler().fit(df_encoded.values)
+    features_scaled = scaler.transform(df_encoded.values)
+    print(f"Clustering {len(features_scaled)} goals with {features_scaled.shape[1]} features")
+    print("Applying UMAP dimensionality reduction...")
+    reducer = umap.UMAP(random_state=random_state, **umap_params).fit(features_scaled)
+    if CACHE_ENABLED:
+        save_model(key, (scaler, reducer))
+        save_array(key, reducer.embedding_)
+    return scaler, reducer, reducer.embedding_
@@ -0,0 +1,301 @@
+"""
+Feature engineering shared by clustering.py and umap_hdbscan_exploration.py.
+
+The per-goal helpers (get_zones, determine_situation_code, parse_time_to_minutes,
+calculate_season_day) are kept as the reference definitions. load_and_prepare_data uses
+the vectorized versions, which produce identical columns; run this file to check parity
+against the reference helpers and time both on the stored goals.
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+import goal_store
+
+SHOT_TYPE_CLEANUP = {
+    "backhand": "Backhand",
+    "tip-in": "Tip-In",
+    "slap": "Slap Shot",
+    "wrist": "Wrist Shot",
+    "snap": "Snap Shot",
+    "wrap-around": "Wrap Around",
+    "deflected": "Deflected",
+    "bat": "Bat",
+    "poke": "Poke",
+    "between-legs": "Between Legs",
+    "cradle": "Cradle",
+}
+
+# flatten situation code
+SITUATION_CODE_MAP = {
+    1551: 1551,
+    1451: 1451,
+    1541: 1541,
+    1441: 1441,
+    431: 1431,
+    651: 1651,
+    1560: 1561,
+    1331: 1331,
+    1351: 1351,
+    1531: 1531,
+    1431: 1431,
+    1341: 1341,
+    641: 1641,
+    1460: 1461,
+    1010: 1011,
+
+    551: 1551,
+    1450: 1451,
+    101: 1011,
+    541: 1541,
+    1550: 1551,
+    1340: 1341,
+    1350: 1351
+}
+
+FEATURE_COLUMNS = ['shot_zone', 'shot_type', 'game_time', 'team_score', 'opponent_score',
+                   'score_diff', 'situation', 'month', 'day', 'season_day']
+
+FIRST_CLUSTERED_DATE = '2023-10-09'
+
+
+def get_zones(x, y):
+    x = float(x)
+    y = float(y)
+
+    if 25 < x <= 54 and  -42.5 < y < -22:
+        return "Right Point"
+    elif 25 < x <= 54 and 22 < y < 42.5:
+        return "Left Point"
+    elif 25 < x <= 54 and -22 <= y <= 22:
+        return "Point"
+    elif 54 < x < 89 and 7 < y < 42.5:
+        return 'Left Faceoff Circle'
+    elif 54 < x < 89 and -42.5 < y < -7:
+        return 'Right Faceoff Circle'
+    elif 54 < x < 89 and -7 <= y <= 7:
+        return 'Slot'
+    elif x >= 89:
+        return 'Behind Net'
+    return "Not In OZ"
+
+
+def determine_situation_code(code, player_team, home_team):
+    is_home = player_team == home_team
+
+    # grab middle 2 characters
+    code_string = str(code)
+    if len(code_string) == 4:
+        code_string = code_string[1:3]
+    else:
+        code_string = code_string[0:2]
+
+    situation = ""
+    if is_home:
+        situation = f"{code_string[1]}v{code_string[0]}"
+    else:
+        situation = f"{code_string[0]}v{code_string[1]}"
+
+    # small check for 0v1
+    if situation == "0v1":
+        return "1v0"
+
+    return situation
+
+
+def parse_time_to_minutes(time_str):
+    """Parse time string (MM:SS) to minutes as float"""
+    try:
+        if pd.isna(time_str):
+            return 0.0
+        minutes, seconds = map(int, str(time_str).split(':'))
+        return minutes + seconds / 60.0
+    except (ValueError, AttributeError):
+        return 0.0
+
+
+def calculate_season_day(game_date):
+    """Calculate days into the NHL season from October 1st start date"""
+    if pd.isna(game_date):
+        return None
+
+    # Determine which season this game belongs to
+    if game_date.month >= 10:  # October or later = current season year
+        season_start = pd.Timestamp(year=game_date.year, month=10, day=1)
+    else:  # Before October = previous season year
+        season_start = pd.Timestamp(year=game_date.year - 1, month=10, day=1)
+
+    # Calculate days into season
+    days_into_season = (game_date - season_start).days + 1  # +1 to make it 1-based
+    return max(1, days_into_season)  # Ensure minimum of 1
+
+
+def compute_shot_zones(x, y):
+    """Vectorized get_zones for arrays of (already normalized) coordinates"""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    point = (25 < x) & (x <= 54)
+    circle = (54 < x) & (x < 89)
+    conditions = [
+        point & (-42.5 < y) & (y < -22),
+        point & (22 < y) & (y < 42.5),
+        point & (-22 <= y) & (y <= 22),
+        circle & (7 < y) & (y < 42.5),
+        circle & (-42.5 < y) & (y < -7),
+        circle & (-7 <= y) & (y <= 7),
+        x >= 89,
+    ]
+    choices = ["Right Point", "Left Point", "Point", 'Left Faceoff Circle',
+               'Right Faceoff Circle', 'Slot', 'Behind Net']
+    return np.select(conditions, choices, default="Not In OZ").astype(object)
+
+
+def compute_situations(codes, player_teams, home_teams):
+    """Vectorized determine_situation_code, returning e.g. '5v4' from the scorer's side"""
+    # Only a handful of distinct codes exist, so decode each once and broadcast
+    code_index, unique_codes = pd.factorize(pd.Series(codes), use_na_sentinel=False)
+    away = np.array([determine_situation_code(code, 0, 1) for code in unique_codes], dtype=object)
+    home = np.array([determine_situation_code(code, 1, 1) for code in unique_codes], dtype=object)
+    is_home = pd.Series(player_teams).to_numpy() == pd.Series(home_teams).to_numpy()
+    return np.where(is_home, home[code_index], away[code_index])
+
+
+def parse_times_to_minutes(times):
+    """Vectorized parse_time_to_minutes; missing or malformed times become 0.0"""
+    # Game clock strings repeat heavily, so parse each distinct value once
+    time_index, unique_times = pd.factorize(pd.Series(times))
+    # Missing times get index -1, which picks the trailing 0.0
+    minutes = np.array([parse_time_to_minutes(t) for t in unique_times] + [0.0])
+    return minutes[time_index]
+
+
+def compute_season_days(game_dates):
+    """Vectorized calculate_season_day for a datetime Series"""
+    start_year = game_dates.dt.year.where(game_dates.dt.month >= 10, game_dates.dt.year - 1)
+    season_start = pd.to_datetime(pd.DataFrame({'year': start_year, 'month': 10, 'day': 1}))
+    return ((game_dates - season_start).dt.days + 1).clip(lower=1)
+
+
+def map_strict(series, mapping, name):
+    """Map values through a dict, failing like dict indexing would on unknown values"""
+    unknown = ~series.isin(list(mapping.keys()))
+    if unknown.any():
+        raise KeyError(f"Unknown {name} values: {sorted(series[unknown].astype(str).unique())}")
+    return series.map(mapping)
+
+
+def prepare_features(df):
+    """
+    Clean raw goals and add the clustering features.
+
+    Args:
+        df: Goals from the goals_with_full_data stage
+
+    Returns:
+        tuple: (feature subset, full prepared DataFrame)
+    """
+    df = df.dropna(subset=["shot_type"])
+    df['shot_type'] = map_strict(df['shot_type'], SHOT_TYPE_CLEANUP, 'shot_type')
+    df['game_date'] = pd.to_datetime(df['game_date'])
+    df = df[df['game_date'] >= FIRST_CLUSTERED_DATE].copy()
+
+    df['month'] = df['game_date'].dt.month
+    df['day'] = df['game_date'].dt.day
+    df['season_day'] = compute_season_days(df['game_date'])
+
+    print(f"Goals from 2023 onwards: {len(df):,}")
+
+    # Normalize coordinates to same side of ice
+    df['x'] = pd.to_numeric(df['x'], errors='coerce')
+    df['y'] = pd.to_numeric(df['y'], errors='coerce')
+    df['y'] = np.where(df['x'] < 0, df['y'] * -1, df['y'])
+    df['x'] = np.where(df['x'] < 0, df['x'] * -1, df['x'])
+
+    df['shot_zone'] = compute_shot_zones(df['x'], df['y'])
+
+    print(f"Dataset shape: {df.shape}")
+
+    # Parse time to get period_time in minutes
+    df['period_time'] = parse_times_to_minutes(df['time'])
+    df['game_time'] = (df['period_time'] + (df['period'] * 20)) // 60
+
+    df['score_diff'] = (df['team_score']-1) - df['opponent_score']
+
+    # subtract 1 from team score since the nhl api counts the goal in the event
+    df['team_score'] = df['team_score']-1
+    df['situation_code'] = pd.to_numeric(df['situation_code'], errors='coerce')
+
+    df['goalie'] = df['goalie'].fillna("Empty")
+    df['situation_code'] = map_strict(df['situation_code'], SITUATION_CODE_MAP, 'situation_code')
+    df['situation'] = compute_situations(df['situation_code'], df['team_id'], df['home_team'])
+
+    # Select the specified features (excluding player_id and goalie integer IDs)
+    df_subset = df[FEATURE_COLUMNS].copy()
+
+    print(f"Shape after removing missing critical values: {df_subset.shape}")
+    print(f"subset columns: {df_subset.columns}")
+
+    return df_subset, df
+
+
+def load_and_prepare_data():
+    """Load the NHL goals dataset and prepare features for clustering"""
+    print("Loading NHL goals dataset...")
+    # Only the 2023-24 season onwards is clustered, so skip older partitions entirely
+    df = goal_store.read_goals('goals_with_full_data', min_season=20232024)
+    return prepare_features(df)
+
+
+def check_parity(df):
+    """
+    Compare each vectorized feature against its per-goal reference helper.
+
+    Returns:
+        dict: Feature name -> (reference seconds, vectorized seconds)
+    """
+    df = df.dropna(subset=["shot_type"]).reset_index(drop=True)
+    x = pd.to_numeric(df['x'], errors='coerce')
+    y = pd.to_numeric(df['y'], errors='coerce')
+    y = pd.Series(np.where(x < 0, y * -1, y))
+    x = pd.Series(np.where(x < 0, x * -1, x))
+    dates = pd.to_datetime(df['game_date'])
+    codes = map_strict(pd.to_numeric(df['situation_code'], errors='coerce'), SITUATION_CODE_MAP, 'situation_code')
+
+    checks = {
+        'shot_zone': (lambda: [get_zones(a, b) for a, b in zip(x, y)],
+                      lambda: compute_shot_zones(x, y)),
+        # Categorical apply skips missing values, so run the reference on plain objects
+        'period_time': (lambda: df['time'].astype(object).apply(parse_time_to_minutes).to_numpy(),
+                        lambda: parse_times_to_minutes(df['time'])),
+        'season_day': (lambda: dates.apply(calculate_season_day).to_numpy(),
+                       lambda: compute_season_days(dates).to_numpy()),
+        'situation': (lambda: [determine_situation_code(c, t, h)
+                               for c, t, h in zip(codes.astype(object), df['team_id'].astype(object),
+                                                  df['home_team'].astype(object))],
+                      lambda: compute_situations(codes, df['team_id'], df['home_team'])),
+    }
+    timings = {}
+    for name, (reference, vectorized) in checks.items():
+        start = time.perf_counter()
+        expected = np.asarray(reference())
+        reference_time = time.perf_counter() - start
+        start = time.perf_counter()
+        actual = np.asarray(vectorized())
+        vectorized_time = time.perf_counter() - start
+        if not np.array_equal(expected, actual):
+            mismatches = np.flatnonzero(expected != actual)[:5]
+            raise AssertionError(f"{name} differs at rows {mismatches.tolist()}: "
+                                 f"{expected[mismatches].tolist()} vs {actual[mismatches].tolist()}")
+        timings[name] = (reference_time, vectorized_time)
+    return timings
+
+
+if __name__ == "__main__":
+    goals = goal_store.read_goals('goals_with_full_data')
+    print(f"Checking feature parity on {len(goals):,} goals")
+    for feature, (reference_time, vectorized_time) in check_parity(goals).items():
+        print(f"  {feature:12s} reference {reference_time:.3f}s  vectorized {vectorized_time:.3f}s")
+    start = time.perf_counter()
+    prepare_features(goals)
+    print(f"prepare_features: {time.perf_counter() - start:.3f}s")
@@ -0,0 +1,151 @@
+"""
+Streaming GeoJSON FeatureCollection writer for the constellation maps.
+
+Features are encoded and written one at a time, so memory stays flat however many goals
+the map has. With the default settings the file is byte-for-byte what
+json.dump({"type": "FeatureCollection", "features": [...]}, f, indent=2) would write, so
+existing consumers are unaffected. Set GEOJSON_COMPACT=1 for compact separators and
+GEOJSON_COMPRESSION=gzip (or brotli, if the brotli package is installed) to compress the
+output; compressed files get a .gz / .br suffix and load_geojson reads any of them.
+"""
+import gzip
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+GEOJSON_COMPACT = os.environ.get('GEOJSON_COMPACT', '0') == '1'
+GEOJSON_COMPRESSION = os.environ.get('GEOJSON_COMPRESSION') or None
+
+COMPRESSION_SUFFIXES = {'gzip': '.gz', 'brotli': '.br'}
+
+
+class _BrotliFile:
+    """Minimal binary file wrapper that brotli-compresses everything written to it"""
+
+    def __init__(self, path, quality=9):
+        self.file = open(path, 'wb')
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def write(self, data):
+        self.file.write(self.compressor.process(data))
+
+    def close(self):
+        self.file.write(self.compressor.finish())
+        self.file.close()
+
+
+def output_path(path, compression=None):
+    """Path the collection is written to, with the compression suffix if any"""
+    return path + COMPRESSION_SUFFIXES[compression] if compression else path
+
+
+def _open_binary(path, compression):
+    if compression is None:
+        return open(path, 'wb')
+    if compression == 'gzip':
+        # Fixed mtime so unchanged maps produce identical files
+        return gzip.GzipFile(path, 'wb', mtime=0)
+    if compression == 'brotli':
+        if not BROTLI_AVAILABLE:
+            raise ImportError("brotli is required for GEOJSON_COMPRESSION=brotli")
+        return _BrotliFile(path)
+    raise ValueError(f"Unknown GeoJSON compression: {compression}")
+
+
+class FeatureCollectionWriter:
+    """
+    Write a FeatureCollection one feature at a time.
+
+    Use as a context manager; the file is written to a temporary path and moved into place
+    only when the collection is complete.
+
+    Attributes:
+        path: Final output path (including any compression suffix)
+        count: Features written so far
+        type_counts: Features written per properties['type']
+    """
+
+    def __init__(self, path, compact=GEOJSON_COMPACT, compression=GEOJSON_COMPRESSION):
+        self.path = output_path(path, compression)
+        self.compact = compact
+        self.compression = compression
+        self.count = 0
+        self.type_counts = {}
+        self._file = None
+
+    def __enter__(self):
+        self._tmp_path = f"{self.path}.tmp"
+        self._file = _open_binary(self._tmp_path, self.compression)
+        if self.compact:
+            self._write('{"type":"FeatureCollection","features":[')
+        else:
+            self._write('{\n  "type": "FeatureCollection",\n  "features": [')
+        return self
+
+    def _write(self, text):
+        self._file.write(text.encode('utf-8'))
+
+    def write(self, feature):
+        """Append one feature to the collection"""
+        separator = ',' if self.count else ''
+        if self.compact:
+            self._write(separator + json.dumps(feature, separators=(',', ':')))
+        else:
+            # Same layout json.dump(indent=2) gives a list item two levels deep
+            self._write(separator + '\n    ' + json.dumps(feature, indent=2).replace('\n', '\n    '))
+        self.count += 1
+        feature_type = feature.get('properties', {}).get('type')
+        self.type_counts[feature_type] = self.type_counts.get(feature_type, 0) + 1
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            if self.compact:
+                self._write(']}')
+            else:
+                self._write('\n  ]\n}' if self.count else ']\n}')
+        self._file.close()
+        if exc_type is None:
+            os.replace(self._tmp_path, self.path)
+        else:
+            os.remove(self._tmp_path)
+        return False
+
+
+def write_feature_collection(path, features, compact=GEOJSON_COMPACT, compression=GEOJSON_COMPRESSION):
+    """
+    Stream features (any iterable, typically a generator) into a FeatureCollection file.
+
+    Returns:
+        FeatureCollectionWriter: The finished writer (path, count, type_counts)
+    """
+    with FeatureCollectionWriter(path, compact, compression) as writer:
+        for feature in features:
+            writer.write(feature)
+    return writer
+
+
+def load_geojson(path):
+    """Load a GeoJSON file written by this module, trying the compressed variants if path is missing"""
+    candidates = [path] + [path + suffix for suffix in COMPRESSION_SUFFIXES.values()]
+    existing = [candidate for candidate in candidates if os.path.exists(candidate)]
+    if not existing:
+        raise FileNotFoundError(path)
+    path = existing[0]
+    if path.endswith('.gz'):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return json.load(f)
+    if path.endswith('.br'):
+        if not BROTLI_AVAILABLE:
+            raise ImportError(f"brotli is required to read {path}")
+        with open(path, 'rb') as f:
+            return json.loads(brotli.decompress(f.read()))
+    with open(path, 'r') as f:
+        return json.load(f)
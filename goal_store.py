@@ -0,0 +1,372 @@
+"""
+Columnar storage for the goal pipeline.
+
+Every stage of the pipeline (raw goals, goals with names, goals with full data) is kept as a
+Parquet dataset under data/store/<stage>/, partitioned by season, with names, shot types,
+situations and other low-cardinality strings dictionary-encoded. Stages can read just the
+columns and seasons they need. The store needs pyarrow; set GOAL_STORE_FORMAT=csv to read
+and write the legacy CSV files instead. Existing CSVs are still read when a stage has not
+been written to the store yet (the first append_goals migrates them into the store).
+
+Each season partition lists its live part files in _parts.json, which is replaced atomically.
+Appends and compactions write new part files first and only then switch the list, so an
+interrupted write never leaves rows visible twice; files that are not listed are ignored by
+readers and removed by the next compaction.
+"""
+import glob
+import json
+import os
+import logging
+import shutil
+
+import pandas as pd
+
+from journal import atomic_write
+
+logger = logging.getLogger(__name__)
+
+# parquet (default) or csv for the legacy CSV files
+GOAL_STORE_FORMAT = os.environ.get('GOAL_STORE_FORMAT', 'parquet')
+if GOAL_STORE_FORMAT not in ('parquet', 'csv'):
+    raise ValueError(f"Unknown GOAL_STORE_FORMAT: {GOAL_STORE_FORMAT} (expected parquet or csv)")
+
+USE_PARQUET = GOAL_STORE_FORMAT == 'parquet'
+if USE_PARQUET:
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("pyarrow is required for the goal store (pip install pyarrow); "
+                          "set GOAL_STORE_FORMAT=csv to use the legacy CSV files instead") from e
+
+STORE_DIR = os.path.join('data', 'store')
+
+# Legacy CSV locations for each stage, in lookup order
+STAGES = {
+    'goals': ['nhl_goals.csv', 'data/nhl_goals.csv'],
+    'goals_with_names': ['data/nhl_goals_with_names.csv', 'nhl_goals_with_names.csv'],
+    'goals_with_full_data': ['data/nhl_goals_with_full_data.csv'],
+}
+
+# Low-cardinality string columns stored as dictionary-encoded categoricals
+CATEGORICAL_COLUMNS = [
+    'team_name', 'player_name', 'goalie_name', 'shot_type', 'situation', 'shot_zone',
+    'home_team_defending_side', 'game_date', 'time',
+    'level_0_cluster', 'level_1_cluster', 'level_2_cluster', 'level_3_cluster',
+    'deepest_cluster', 'hierarchy_path',
+]
+
+# Categorical columns that readers compare and parse as values; they are decoded to strings on read
+VALUE_COLUMNS = ['game_date', 'time']
+
+PARQUET_COMPRESSION = 'zstd'
+
+# List of a partition's live part files
+PARTS_FILE = '_parts.json'
+
+
+def stage_dir(stage):
+    return os.path.join(STORE_DIR, stage)
+
+
+def legacy_csv_path(stage):
+    """Return the first existing legacy CSV for a stage (or the default location)"""
+    for path in STAGES[stage]:
+        if os.path.exists(path):
+            return path
+    return STAGES[stage][0]
+
+
+def season_of(df):
+    """Season (e.g. 20232024) for every goal, from game_id when present, else game_date"""
+    if 'game_id' in df.columns and df['game_id'].notna().all():
+        start_year = pd.to_numeric(df['game_id']).astype('int64') // 1000000
+    else:
+        dates = pd.to_datetime(df['game_date'])
+        # August onwards belongs to the season starting that year
+        start_year = dates.dt.year.where(dates.dt.month >= 8, dates.dt.year - 1)
+    return (start_year * 10000 + start_year + 1).astype('int64')
+
+
+def _partition_files(stage, seasons=None):
+    files = []
+    for partition in sorted(glob.glob(os.path.join(stage_dir(stage), 'season=*'))):
+        season = partition.rsplit('=', 1)[1]
+        if not season.isdigit():
+            continue
+        season = int(season)
+        if seasons is not None and season not in seasons:
+            continue
+        files.extend(_live_parts(partition))
+    return files
+
+
+def _live_parts(partition):
+    """Part files of a partition: those in its parts list (every part file for older stores)"""
+    parts_path = os.path.join(partition, PARTS_FILE)
+    if os.path.exists(parts_path):
+        with open(parts_path, 'r') as f:
+            return [os.path.join(partition, name) for name in json.load(f)]
+    return sorted(glob.glob(os.path.join(partition, 'part-*.parquet')))
+
+
+def _set_live_parts(partition, parts):
+    """Switch a partition to a new set of part files in one atomic step"""
+    atomic_write(os.path.join(partition, PARTS_FILE),
+                 lambda f: json.dump([os.path.basename(part) for part in parts], f))
+
+
+def _new_part_path(partition):
+    """Path for a part file numbered after every part file present, live or not"""
+    numbers = [int(os.path.basename(path)[len('part-'):-len('.parquet')])
+               for path in glob.glob(os.path.join(partition, 'part-*.parquet'))]
+    return os.path.join(partition, f"part-{max(numbers, default=-1) + 1:05d}.parquet")
+
+
+def stage_exists(stage):
+    """Whether a stage has data in the columnar store or as a legacy CSV"""
+    if USE_PARQUET and _partition_files(stage):
+        return True
+    return os.path.exists(legacy_csv_path(stage))
+
+
+def _to_arrow_frame(df):
+    """Normalize a frame so it round-trips through Parquet like it would through CSV"""
+    df = df.copy()
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            # Dates are written as plain YYYY-MM-DD strings, matching the CSV files
+            if (series.dropna().dt.normalize() == series.dropna()).all():
+                df[col] = series.dt.strftime('%Y-%m-%d')
+        elif series.dtype == object:
+            kind = pd.api.types.infer_dtype(series, skipna=True)
+            if kind not in ('string', 'empty', 'floating', 'integer', 'boolean'):
+                df[col] = series.where(series.isna(), series.astype(str))
+        if col in CATEGORICAL_COLUMNS and df[col].dtype == object:
+            df[col] = df[col].astype('category')
+    return df
+
+
+def _from_arrow_table(table):
+    """
+    Prepare dictionary columns for pandas: they load as categoricals (VALUE_COLUMNS as strings).
+
+    Dictionary columns get one index type so tables from different part files concatenate.
+    """
+    for i, field in enumerate(table.schema):
+        if not pa.types.is_dictionary(field.type):
+            continue
+        if field.name in VALUE_COLUMNS:
+            table = table.set_column(i, field.name, table.column(i).cast(field.type.value_type))
+        elif field.type.index_type != pa.int32():
+            dictionary_type = pa.dictionary(pa.int32(), field.type.value_type)
+            table = table.set_column(i, field.name, table.column(i).cast(dictionary_type))
+    return table
+
+
+def _write_parquet(df, path):
+    table = pa.Table.from_pandas(_to_arrow_frame(df), preserve_index=False)
+    tmp_path = f"{path}.tmp"
+    pq.write_table(table, tmp_path, compression=PARQUET_COMPRESSION)
+    os.replace(tmp_path, path)
+
+
+def _read_parquet(path, columns=None):
+    if columns is not None:
+        available = pq.read_schema(path).names
+        columns = [col for col in columns if col in available]
+    return _from_arrow_table(pq.read_table(path, columns=columns))
+
+
+def _read_csv(path, columns=None):
+    usecols = None
+    if columns is not None:
+        header = pd.read_csv(path, nrows=0).columns
+        usecols = [col for col in columns if col in header]
+    return pd.read_csv(path, usecols=usecols, low_memory=False)
+
+
+def read_goals(stage, columns=None, seasons=None, min_season=None):
+    """
+    Load a pipeline stage.
+
+    Args:
+        stage: One of STAGES ('goals', 'goals_with_names', 'goals_with_full_data')
+        columns: Optional list of columns to load; missing columns are skipped
+        seasons: Optional iterable of seasons (e.g. 20232024) to load
+        min_season: Optional first season to load
+
+    Returns:
+        DataFrame with a fresh RangeIndex, in season then write order
+    """
+    files = _partition_files(stage) if USE_PARQUET else []
+    if files:
+        partition_seasons = {int(os.path.basename(os.path.dirname(f)).split('=')[1]) for f in files}
+        wanted = set(seasons) if seasons is not None else partition_seasons
+        if min_season is not None:
+            wanted = {season for season in wanted if season >= min_season}
+        tables = [_read_parquet(f, columns) for f in _partition_files(stage, wanted)]
+        if not tables:
+            return pd.DataFrame(columns=columns or [])
+        table = pa.concat_tables(tables, promote_options='permissive')
+        df = table.to_pandas()
+        logger.info(f"Loaded {len(df):,} goals from {stage_dir(stage)}")
+        return df
+
+    csv_path = legacy_csv_path(stage)
+    if not os.path.exists(csv_path):
+        raise FileNotFoundError(f"No data found for stage '{stage}'")
+    df = _read_csv(csv_path, columns)
+    if seasons is not None or min_season is not None:
+        season = season_of(pd.read_csv(csv_path, usecols=lambda c: c in ('game_id', 'game_date'),
+                                       low_memory=False))
+        mask = pd.Series(True, index=df.index)
+        if seasons is not None:
+            mask &= season.isin(list(seasons))
+        if min_season is not None:
+            mask &= season >= min_season
+        df = df[mask].reset_index(drop=True)
+    logger.info(f"Loaded {len(df):,} goals from {csv_path}")
+    return df
+
+
+def fill_missing(values, fill_value):
+    """fillna that also works on categorical columns read from the store"""
+    if isinstance(values.dtype, pd.CategoricalDtype) and fill_value not in values.cat.categories:
+        values = values.cat.add_categories([fill_value])
+    return values.fillna(fill_value)
+
+
+def count_goals(stage):
+    """Number of goals in a stage, read from Parquet metadata when possible"""
+    files = _partition_files(stage) if USE_PARQUET else []
+    if files:
+        return sum(pq.read_metadata(f).num_rows for f in files)
+    csv_path = legacy_csv_path(stage)
+    if not os.path.exists(csv_path):
+        return 0
+    return len(pd.read_csv(csv_path, usecols=[0]))
+
+
+def _csv_append(df, csv_path):
+    if os.path.exists(csv_path):
+        header = list(pd.read_csv(csv_path, nrows=0).columns)
+        if header != list(df.columns):
+            # Add any missing columns so appended rows line up with the header
+            print(f"Migrating {csv_path} to columns {list(df.columns)}")
+            existing = pd.read_csv(csv_path, low_memory=False)
+            existing.reindex(columns=list(dict.fromkeys(header + list(df.columns)))).to_csv(csv_path, index=False)
+            header = list(pd.read_csv(csv_path, nrows=0).columns)
+        df.reindex(columns=header).to_csv(csv_path, mode='a', header=False, index=False)
+    else:
+        df.to_csv(csv_path, index=False)
+
+
+def write_goals(df, stage):
+    """Replace a stage with df, partitioned by season"""
+    if not USE_PARQUET:
+        csv_path = STAGES[stage][0]
+        df.to_csv(csv_path, index=False)
+        return csv_path
+
+    seasons = season_of(df)
+    root = stage_dir(stage)
+    tmp_root = f"{root}.tmp"
+    if os.path.exists(tmp_root):
+        shutil.rmtree(tmp_root)
+    for season, season_df in df.groupby(seasons.values, sort=True):
+        partition = os.path.join(tmp_root, f"season={season}")
+        os.makedirs(partition, exist_ok=True)
+        part = os.path.join(partition, "part-00000.parquet")
+        _write_parquet(season_df, part)
+        _set_live_parts(partition, [part])
+    # Swap the new dataset in only once it has been fully written
+    old_root = f"{root}.old"
+    if os.path.exists(root):
+        os.replace(root, old_root)
+    os.makedirs(tmp_root, exist_ok=True)
+    os.replace(tmp_root, root)
+    if os.path.exists(old_root):
+        shutil.rmtree(old_root)
+    return root
+
+
+def _migrate_legacy_csv(stage):
+    """Move a stage's legacy CSV into the store so appended parts do not hide its history"""
+    if _partition_files(stage):
+        return
+    csv_path = legacy_csv_path(stage)
+    if not os.path.exists(csv_path):
+        return
+    logger.info(f"Migrating {csv_path} into {stage_dir(stage)} before appending")
+    write_goals(_read_csv(csv_path), stage)
+
+
+def append_goals(df, stage):
+    """Append goals to a stage as new part files in their season partitions"""
+    if df.empty:
+        return
+    if not USE_PARQUET:
+        _csv_append(df, STAGES[stage][0])
+        return
+
+    # Once a stage has parts, readers ignore its legacy CSV
+    _migrate_legacy_csv(stage)
+    seasons = season_of(df)
+    for season, season_df in df.groupby(seasons.values, sort=True):
+        partition = os.path.join(stage_dir(stage), f"season={season}")
+        os.makedirs(partition, exist_ok=True)
+        parts = _live_parts(partition)
+        part = _new_part_path(partition)
+        _write_parquet(season_df, part)
+        _set_live_parts(partition, parts + [part])
+
+
+def compact_stage(stage):
+    """Merge the small part files written by append_goals into one file per season"""
+    if not USE_PARQUET:
+        return
+    for partition in sorted(glob.glob(os.path.join(stage_dir(stage), 'season=*'))):
+        parts = _live_parts(partition)
+        if len(parts) > 1:
+            tables = [_read_parquet(part) for part in parts]
+            merged = pa.concat_tables(tables, promote_options='permissive').to_pandas()
+            # Write the merged data to a new part and switch to it before removing anything
+            merged_part = _new_part_path(partition)
+            _write_parquet(merged, merged_part)
+            _set_live_parts(partition, [merged_part])
+            parts = [merged_part]
+        # Drop replaced parts and any left behind by an interrupted write
+        for path in glob.glob(os.path.join(partition, 'part-*.parquet*')):
+            if path not in parts:
+                os.remove(path)
+
+
+def table_extension():
+    return '.parquet' if USE_PARQUET else '.csv'
+
+
+def write_table(df, path_stem):
+    """Write a single (unpartitioned) table such as a hierarchy mapping; returns the path"""
+    path = f"{path_stem}{table_extension()}"
+    if USE_PARQUET:
+        _write_parquet(df, path)
+    else:
+        df.to_csv(path, index=False)
+    return path
+
+
+def read_table(path, columns=None):
+    """Read a table written by write_table (Parquet) or a legacy CSV"""
+    if path.endswith('.parquet'):
+        if not USE_PARQUET:
+            raise ImportError(f"{path} is a Parquet table; unset GOAL_STORE_FORMAT=csv to read it")
+        return _read_parquet(path, columns).to_pandas()
+    return _read_csv(path, columns)
+
+
+def find_tables(directory, prefix):
+    """All CSV/Parquet tables in a directory whose names start with prefix"""
+    return [f for f in os.listdir(directory)
+            if f.startswith(prefix) and f.endswith(('.csv', '.parquet'))]
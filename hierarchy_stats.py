@@ -0,0 +1,186 @@
+"""
+Per-object statistics for the galaxies, clusters and solar systems of a constellation map.
+
+The map pages used to build these in the browser: getHierarchicalStats rescanned every star
+for every galaxy, cluster and solar system, so startup cost objects x stars on the user's
+device. hierarchy_stats computes the same rollups with a few pandas groupbys when the page is
+generated, and stats_script embeds them in the page for getHierarchicalStats to look up.
+
+Values follow the browser implementation exactly: the same JavaScript truthiness tests
+decide what is counted, and count lists keep first-appearance order so ties sort the same
+way. Count maps are emitted as [key, count] pairs and teams as a list; the page turns them
+back into Maps and Sets.
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+# Hierarchy level -> star property holding the star's object at that level
+LEVELS = {
+    'galaxy': 'galaxy',
+    'cluster': 'cluster',
+    'solar system': 'solar_system',
+}
+
+# Level -> feature type of its objects
+FEATURE_TYPES = {
+    'galaxy': 'galaxy',
+    'cluster': 'cluster',
+    'solar system': 'solar_system',
+}
+
+STAR_FIELDS = ['galaxy', 'cluster', 'solar_system', 'player_name', 'goalie_name', 'team_name', 'shot_type',
+               'period', 'shot_zone', 'situation', 'x', 'y', 'period_time', 'score_diff', 'season_day']
+
+
+def _truthy(values):
+    """JavaScript truthiness of JSON values (null, NaN, '', 0 and false are falsy)"""
+    return values.notna() & ~values.isin(['', 0])
+
+
+def _numeric(values):
+    """parseFloat of values that pass !isNaN (non-numeric strings become NaN)"""
+    return pd.to_numeric(values, errors='coerce')
+
+
+def _non_blank(values):
+    """Truthy values whose trim() is not empty"""
+    return _truthy(values) & (values.astype(str).str.strip() != '')
+
+
+def _count_pairs(stars, key, field, mask):
+    """{object: [[value, count], ...]} in order of first appearance, like a Map filled star by star"""
+    counts = stars.loc[mask].groupby([key, field], sort=False).size()
+    pairs = {}
+    for (name, value), count in zip(counts.index.tolist(), counts.tolist()):
+        pairs.setdefault(name, []).append([value, count])
+    return pairs
+
+
+def _descendant_counts(names):
+    """Number of names starting with each 'prefix.' (what name.startsWith(prefix + '.') counts)"""
+    counts = {}
+    for name in names:
+        for i, char in enumerate(name):
+            if char == '.':
+                counts[name[:i]] = counts.get(name[:i], 0) + 1
+    return counts
+
+
+def _star_frame(features):
+    properties = [feature['properties'] for feature in features if feature['properties'].get('type') == 'star']
+    stars = pd.DataFrame({field: [p.get(field) for p in properties] for field in STAR_FIELDS}, dtype=object)
+    # An absent score_diff is skipped, but a null one is averaged in (as NaN) by the page
+    stars['has_score_diff'] = np.array(['score_diff' in p for p in properties], dtype=bool)
+    return stars
+
+
+def _level_stats(stars, level, names, child_counts):
+    key = LEVELS[level]
+    stars = stars[stars[key].notna()]
+    star_counts = stars.groupby(key, sort=False).size().to_dict()
+
+    count_fields = {
+        'topPlayers': ('player_name', _truthy(stars['player_name']) & (stars['player_name'] != 'unknown')),
+        'topGoalies': ('goalie_name', _truthy(stars['goalie_name']) & (stars['goalie_name'] != 'Empty Net')),
+        'teams': ('team_name', _truthy(stars['team_name'])),
+        'shotTypes': ('shot_type', _truthy(stars['shot_type'])),
+        'periods': ('period', _truthy(stars['period'])),
+        'shotZones': ('shot_zone', _non_blank(stars['shot_zone'])),
+        'situations': ('situation', _non_blank(stars['situation'])),
+    }
+    counts = {stat: _count_pairs(stars, key, field, mask) for stat, (field, mask) in count_fields.items()}
+
+    sums = {}
+    groups = stars[key]
+    if level == 'galaxy':
+        x, y = _numeric(stars['x']), _numeric(stars['y'])
+        valid = _truthy(stars['x']) & _truthy(stars['y']) & x.notna() & y.notna()
+        sums['validCoords'] = valid.groupby(groups).sum()
+        sums['avgX'] = x.where(valid, 0).groupby(groups).sum()
+        sums['avgY'] = y.where(valid, 0).groupby(groups).sum()
+    elif level == 'cluster':
+        period = _numeric(stars['period'])
+        valid = _truthy(stars['period']) & period.notna()
+        sums['validPeriodData'] = valid.groupby(groups).sum()
+        sums['avgPeriod'] = period.where(valid, 0).groupby(groups).sum()
+        period_time = _numeric(stars['period_time'])
+        sums['avgPeriodTime'] = period_time.where(_truthy(stars['period_time']) & period_time.notna(), 0).groupby(groups).sum()
+        raw_score = stars['score_diff']
+        score = _numeric(raw_score)
+        nulls = stars['has_score_diff'] & raw_score.isna()
+        valid = stars['has_score_diff'] & (score.notna() | nulls)
+        sums['validScoreData'] = valid.groupby(groups).sum()
+        sums['avgScoreDiff'] = score.where(valid & ~nulls, 0).groupby(groups).sum()
+        sums['scoreNulls'] = nulls.groupby(groups).sum()
+        season_day = _numeric(stars['season_day'])
+        valid = _truthy(stars['season_day']) & season_day.notna()
+        sums['validSeasonData'] = valid.groupby(groups).sum()
+        sums['avgSeasonDay'] = season_day.where(valid, 0).groupby(groups).sum()
+    sums = {stat: values.to_dict() for stat, values in sums.items()}
+
+    def total(stat, name):
+        return sums[stat].get(name, 0) if stat in sums else 0
+
+    def average(stat, count_stat, name):
+        count = total(count_stat, name)
+        return float(total(stat, name) / count) if count > 0 else float(total(stat, name))
+
+    level_stats = {}
+    for name in names:
+        star_count = int(star_counts.get(name, 0))
+        stats = {
+            'name': name,
+            'level': level,
+            'clusters': child_counts['cluster'].get(name, 0) if level == 'galaxy' else 0,
+            'solarSystems': child_counts['solar_system'].get(name, 0) if level != 'solar system' else 0,
+            'stars': star_count,
+            'totalGoals': star_count,
+            'topPlayers': counts['topPlayers'].get(name, []),
+            'topGoalies': counts['topGoalies'].get(name, []),
+            'teams': [team for team, _ in counts['teams'].get(name, [])],
+            'shotTypes': counts['shotTypes'].get(name, []),
+            'periods': counts['periods'].get(name, []),
+            'shotZones': counts['shotZones'].get(name, []),
+            'situations': counts['situations'].get(name, []),
+            'avgX': average('avgX', 'validCoords', name),
+            'avgY': average('avgY', 'validCoords', name),
+            'avgPeriod': average('avgPeriod', 'validPeriodData', name),
+            'avgPeriodTime': average('avgPeriodTime', 'validPeriodData', name),
+            # null stands for NaN (a null score_diff poisons the average)
+            'avgScoreDiff': None if total('scoreNulls', name) else average('avgScoreDiff', 'validScoreData', name),
+            'avgSeasonDay': average('avgSeasonDay', 'validSeasonData', name),
+            'validCoords': int(total('validCoords', name)),
+            'validPeriodData': int(total('validPeriodData', name)),
+            'validScoreData': int(total('validScoreData', name)),
+            'validSeasonData': int(total('validSeasonData', name)),
+        }
+        level_stats[name] = stats
+    return level_stats
+
+
+def hierarchy_stats(geojson):
+    """
+    Statistics for every galaxy, cluster and solar system feature of a map.
+
+    Returns:
+        dict: level ('galaxy', 'cluster', 'solar system') -> object name -> stats, with the
+        fields getHierarchicalStats used to compute in the page
+    """
+    features = geojson['features']
+    stars = _star_frame(features)
+    names = {feature_type: [] for feature_type in FEATURE_TYPES.values()}
+    for feature in features:
+        feature_type = feature['properties'].get('type')
+        if feature_type in names:
+            names[feature_type].append(feature['properties']['name'])
+    child_counts = {feature_type: _descendant_counts(names[feature_type]) for feature_type in ('cluster', 'solar_system')}
+    return {level: _level_stats(stars, level, names[feature_type], child_counts)
+            for level, feature_type in FEATURE_TYPES.items()}
+
+
+def stats_script(stats):
+    """Inert <script> element carrying the stats as JSON (read with JSON.parse in the page)"""
+    payload = json.dumps(stats, separators=(',', ':'), allow_nan=False).replace('</', '<\\/')
+    return f'<script type="application/json" id="hierarchy-stats">{payload}</script>'
@@ -5,28 +5,37 @@ import time
 import random
 import os
 
-def load_player_cache(cache_file='data/player_cache.csv'):
-    """Load existing player name cache from CSV file"""
+import goal_store
+from journal import Journal, atomic_write
+
+def player_cache_journal(cache_file='data/player_cache.csv'):
+    """Journal of players fetched since the CSV cache was last written"""
+    return Journal(f"{cache_file}.journal")
+
+def load_player_cache(cache_file='data/player_cache.csv', journal=None):
+    """Load existing player name cache from CSV file plus its journal"""
+    player_cache = {}
     if os.path.exists(cache_file):
         try:
             cache_df = pd.read_csv(cache_file)
             # Convert to dictionary for fast lookup
             player_cache = dict(zip(cache_df['player_id'], cache_df['full_name']))
             print(f"Loaded {len(player_cache)} players from cache: {cache_file}")
-            return player_cache
         except Exception as e:
             print(f"Error loading player cache: {e}")
-            return {}
     else:
         print(f"No player cache found at {cache_file}, starting fresh")
-        return {}
+    journal = journal or player_cache_journal(cache_file)
+    journal.snapshot_size = len(player_cache)
+    journaled = journal.replay()
+    if journaled:
+        player_cache.update((record['player_id'], record['full_name']) for record in journaled)
+        print(f"Replayed {len(journaled)} players from the cache journal")
+    return player_cache
 
 def save_player_cache(player_names, cache_file='data/player_cache.csv'):
-    """Save player names to CSV cache file"""
+    """Save player names to CSV cache file (atomically)"""
     try:
-        # Create data directory if it doesn't exist
-        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
-        
         # Convert dictionary to DataFrame
         cache_df = pd.DataFrame([
             {'player_id': player_id, 'full_name': name}
@@ -37,10 +46,11 @@ def save_player_cache(player_names, cache_file='data/player_cache.csv'):
         cache_df = cache_df.sort_values('player_id')
         
         # Save to CSV
-        cache_df.to_csv(cache_file, index=False)
+        atomic_write(cache_file, lambda f: cache_df.to_csv(f, index=False))
         print(f"Saved {len(player_names)} players to cache: {cache_file}")
     except Exception as e:
         print(f"Error saving player cache: {e}")
+        raise  # the journal must not be cleared if the CSV was not written
 
 # curl -X GET "https://api.nhle.com/stats/rest/en/team"
 def get_teams():
@@ -86,7 +96,7 @@ def get_players(player_id):
 if __name__ == "__main__":
     print("Fetching team data...")
     teams = get_teams()
-    df = pd.read_csv('nhl_goals.csv')
+    df = goal_store.read_goals('goals')
     print(f"Loaded {len(df)} goals")
     print(teams.head())
     
@@ -103,7 +113,8 @@ if __name__ == "__main__":
     print(f"Found {len(all_player_ids)} unique players needed")
     
     # Load existing player cache
-    player_names = load_player_cache()
+    journal = player_cache_journal()
+    player_names = load_player_cache(journal=journal)
     
     # Find players we still need to fetch
     cached_players = set(player_names.keys())
@@ -128,6 +139,8 @@ if __name__ == "__main__":
                 if not player_df.empty:
                     player_name = player_df['fullName'].iloc[0]
                     new_player_names[player_id] = player_name
+                    # Journal each player as soon as it is fetched so an interruption loses nothing
+                    journal.append({'player_id': int(player_id), 'full_name': player_name})
                 else:
                     failed_players.append(player_id)
                     
@@ -135,11 +148,12 @@ if __name__ == "__main__":
                 print(f"Error fetching player {player_id}: {e}")
                 failed_players.append(player_id)
 
-            # Save progress every 20 players to avoid losing work
-            if (i + 1) % 20 == 0:
-                # Merge new names with existing cache and save
+            # Fold the journal into the CSV once it is as large as the CSV
+            if journal.should_compact():
                 updated_cache = {**player_names, **new_player_names}
-                save_player_cache(updated_cache)
+                journal.compact(lambda: save_player_cache(updated_cache), len(updated_cache))
+
+            if (i + 1) % 20 == 0:
                 success_rate = ((i + 1 - len(failed_players)) / (i + 1)) * 100
                 print(f"Progress: {i + 1}/{len(players_to_fetch)} new players processed, {success_rate:.1f}% success rate")
         
@@ -147,7 +161,7 @@ if __name__ == "__main__":
         player_names.update(new_player_names)
         
         # Save final cache
-        save_player_cache(player_names)
+        journal.compact(lambda: save_player_cache(player_names), len(player_names))
         
         # Final statistics for new fetches
         success_count = len(new_player_names)
@@ -178,6 +192,6 @@ if __name__ == "__main__":
     print(f"  Player names: {missing_players}/{len(df)} goals ({missing_players/len(df)*100:.1f}%)")
     print(f"  Goalie names: {missing_goalies}/{len(df)} goals ({missing_goalies/len(df)*100:.1f}%)")
     
-    df.to_csv('nhl_goals_with_names.csv', index=False)
-    print("Identifiers updated and saved to nhl_goals_with_names.csv")
+    output_path = goal_store.write_goals(df, 'goals_with_names')
+    print(f"Identifiers updated and saved to {output_path}")
 
@@ -0,0 +1,178 @@
+"""
+Persistent manifest of completed games for incremental ingestion.
+
+NHL game IDs look like 2023020412: season start year, game type (02 = regular season)
+and game number. For every season the manifest keeps a watermark (all games 1..watermark
+are done), the few completed game numbers above it, and the latest completed game date.
+A full season collapses to a couple of integers, so loading the manifest is constant time
+no matter how much goal history has been pulled. Games that were scheduled but could not be
+pulled yet (not final, or the fetch failed) are kept as outstanding with their dates, so the
+next run resumes early enough to retry them. Games completed since the manifest was last
+written are appended to its journal (see journal.py) rather than rewriting the file.
+
+Goals pulled before game_id was stored are identified by date and score instead; those
+legacy identifiers are kept in the manifest too, so every run can skip their games even if
+the run that created the manifest stopped before walking every season.
+"""
+import json
+import os
+
+from journal import Journal, atomic_write
+
+MANIFEST_FILE = "ingest_manifest.json"
+
+
+def split_game_id(game_id):
+    """Return (season, game_number) for a game ID, e.g. 2023020412 -> ("20232024", 412)"""
+    game_id = str(int(game_id))
+    start_year = int(game_id[:4])
+    return f"{start_year}{start_year + 1}", int(game_id[6:])
+
+
+class IngestManifest:
+    """Completed game IDs per season with watermarks"""
+
+    def __init__(self, path=MANIFEST_FILE, seasons=None, legacy=None):
+        self.path = path
+        self.seasons = seasons or {}
+        # Date/score identifiers of legacy goals (None for manifests written before they were kept)
+        self.legacy = legacy
+        self.journal = Journal(f"{path}.journal")
+        self.pending = []
+
+    @classmethod
+    def load(cls, path=MANIFEST_FILE):
+        """Load the manifest and replay its journal, or return None if it has not been created yet"""
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as f:
+            data = json.load(f)
+        seasons = {}
+        for season, entry in data.get("seasons", {}).items():
+            seasons[season] = {
+                "watermark": entry.get("watermark", 0),
+                "completed": set(entry.get("completed", [])),
+                "last_date": entry.get("last_date", ""),
+                "complete": entry.get("complete", False),
+                "outstanding": {int(number): date for number, date in entry.get("outstanding", {}).items()},
+            }
+        legacy = set(data["legacy"]) if "legacy" in data else None
+        manifest = cls(path, seasons, legacy)
+        manifest.journal.snapshot_size = manifest._snapshot_size()
+        for record in manifest.journal.replay():
+            if "season_complete" in record:
+                manifest._season(record["season_complete"])["complete"] = True
+            elif "outstanding" in record:
+                manifest._mark_outstanding(record["outstanding"], record["game_date"])
+            else:
+                manifest._mark(record["game_id"], record["game_date"])
+        return manifest
+
+    @classmethod
+    def from_goals(cls, goals_df, path=MANIFEST_FILE):
+        """Build a manifest from previously pulled goals that carry game_id"""
+        manifest = cls(path, legacy=set())
+        if goals_df.empty or 'game_id' not in goals_df.columns:
+            return manifest
+        games = goals_df.dropna(subset=['game_id']).groupby('game_id')['game_date'].max()
+        for game_id, game_date in games.items():
+            manifest.mark_completed(game_id, str(game_date))
+        return manifest
+
+    def _season(self, season):
+        return self.seasons.setdefault(str(season), {
+            "watermark": 0, "completed": set(), "last_date": "", "complete": False, "outstanding": {}
+        })
+
+    def is_completed(self, game_id):
+        season, number = split_game_id(game_id)
+        entry = self.seasons.get(season)
+        if entry is None:
+            return False
+        return number <= entry["watermark"] or number in entry["completed"]
+
+    def mark_completed(self, game_id, game_date=""):
+        self._mark(game_id, game_date)
+        self.pending.append({"game_id": int(game_id), "game_date": game_date})
+
+    def _mark(self, game_id, game_date):
+        season, number = split_game_id(game_id)
+        entry = self._season(season)
+        entry["outstanding"].pop(number, None)
+        if number > entry["watermark"]:
+            entry["completed"].add(number)
+        # Advance the watermark over any contiguous run of completed games
+        while entry["watermark"] + 1 in entry["completed"]:
+            entry["watermark"] += 1
+            entry["completed"].discard(entry["watermark"])
+        if game_date and game_date > entry["last_date"]:
+            entry["last_date"] = game_date
+
+    def mark_outstanding(self, game_id, game_date):
+        """Record a scheduled game that could not be pulled yet so the next run retries it"""
+        self._mark_outstanding(game_id, game_date)
+        self.pending.append({"outstanding": int(game_id), "game_date": game_date})
+
+    def _mark_outstanding(self, game_id, game_date):
+        if self.is_completed(game_id):
+            return
+        season, number = split_game_id(game_id)
+        self._season(season)["outstanding"][number] = game_date
+
+    def mark_season_complete(self, season):
+        self._season(season)["complete"] = True
+        self.pending.append({"season_complete": str(season)})
+
+    def is_season_complete(self, season):
+        return self.seasons.get(str(season), {}).get("complete", False)
+
+    def resume_date(self, season, default):
+        """
+        Date to restart the schedule walk for a season from.
+
+        That is the latest completed game date, or the date of the earliest outstanding
+        game if one is older. If games above the watermark are missing without a
+        recorded date (e.g. their schedule week failed), the walk restarts at default.
+        """
+        entry = self.seasons.get(str(season))
+        if entry is None or not entry["last_date"]:
+            return default
+        if entry["completed"]:
+            highest = max(entry["completed"])
+            missing = highest - entry["watermark"] - len(entry["completed"])
+            known = sum(entry["watermark"] < number < highest for number in entry["outstanding"])
+            if missing > known:
+                return default
+        resume = min([entry["last_date"], *entry["outstanding"].values()])
+        return max(resume, default)
+
+    def completed_count(self):
+        return sum(entry["watermark"] + len(entry["completed"]) for entry in self.seasons.values())
+
+    def save(self, rewrite=False):
+        """
+        Journal the changes since the last save, writing a new manifest once the journal has
+        grown (or right away with rewrite=True, e.g. after changing the legacy identifiers)
+        """
+        if os.path.exists(self.path):
+            self.journal.append(*self.pending)
+        if rewrite or not os.path.exists(self.path) or self.journal.should_compact():
+            self.journal.compact(self._write, self._snapshot_size())
+        self.pending = []
+
+    def _snapshot_size(self):
+        return sum(1 + len(entry["completed"]) + len(entry["outstanding"]) for entry in self.seasons.values())
+
+    def _write(self):
+        """Write the manifest atomically so an interrupted run cannot corrupt it"""
+        data = {"legacy": sorted(self.legacy or ()), "seasons": {
+            season: {
+                "watermark": entry["watermark"],
+                "completed": sorted(entry["completed"]),
+                "last_date": entry["last_date"],
+                "complete": entry["complete"],
+                "outstanding": {str(number): date for number, date in sorted(entry["outstanding"].items())},
+            }
+            for season, entry in sorted(self.seasons.items())
+        }}
+        atomic_write(self.path, lambda f: json.dump(data, f))
@@ -0,0 +1,117 @@
+"""
+Append-only journals for crash-safe checkpointing of long-running backfills.
+
+A backfill keeps its state as a snapshot file plus a journal of JSON lines recorded since the
+snapshot was written. Each record is appended and fsynced as soon as its item is done, so
+checkpointing costs the same per item however much history has accumulated, and an
+interrupted write can at worst leave a torn last line, which replay drops. Once the journal
+holds as many records as the snapshot (and at least min_records), the owner compacts: it
+writes a new snapshot with atomic_write and the journal is emptied. Records must be safe to
+replay on top of a snapshot that already includes them.
+"""
+import json
+import os
+
+
+def _fsync_dir(path):
+    """Persist a rename in path's directory (not supported on every platform)"""
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path, write, mode='w'):
+    """Write a file through write(f) into a temporary file and rename it over path"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, mode) as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    _fsync_dir(path)
+
+
+class Journal:
+    """
+    JSON lines appended to path, replayed on load and cleared by compaction.
+
+    snapshot_size is the number of records in the owner's snapshot; the owner sets it when it
+    loads the snapshot, and compact() updates it.
+    """
+
+    def __init__(self, path, min_records=1000):
+        self.path = path
+        self.min_records = min_records
+        self.count = 0
+        self.snapshot_size = 0
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def replay(self):
+        """
+        Read the journal's records in the order they were appended.
+
+        A torn or corrupt tail (from a crash mid-append) is dropped and truncated away so that
+        later appends start on a clean line.
+        """
+        self.count = 0
+        if not self.exists():
+            return []
+        records = []
+        good_end = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    break
+                good_end += len(line)
+        if good_end < os.path.getsize(self.path):
+            print(f"Dropping torn records at the end of {self.path}")
+            with open(self.path, 'r+b') as f:
+                f.truncate(good_end)
+                os.fsync(f.fileno())
+        self.count = len(records)
+        return records
+
+    def append(self, *records):
+        """Append records and fsync them before returning"""
+        if not records:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        lines = ''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records)
+        with open(self.path, 'a') as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        self.count += len(records)
+
+    def should_compact(self):
+        """Whether the journal has grown enough to be folded into a new snapshot"""
+        return self.count >= max(self.min_records, self.snapshot_size)
+
+    def compact(self, write_snapshot, snapshot_size):
+        """Write a snapshot of snapshot_size records with write_snapshot(), then empty the journal"""
+        write_snapshot()
+        self.snapshot_size = snapshot_size
+        # A crash before the truncate only means the records are replayed onto the new snapshot
+        if self.exists():
+            with open(self.path, 'r+b') as f:
+                f.truncate(0)
+                os.fsync(f.fileno())
+        self.count = 0
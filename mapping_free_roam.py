@@ -3,11 +3,14 @@ import numpy as np
 import json
 import os
 import matplotlib.pyplot as plt
-from sklearn.manifold import TSNE
 from sklearn.preprocessing import StandardScaler
 import logging
 from datetime import datetime, date
 
+import cluster_placement
+import goal_store
+import geojson_writer
+
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -59,7 +62,7 @@ class ConstellationMapper:
                     mapping_path = os.path.join(data_dir, specific_file)
             else:
                 # Look for the most recent clustering results
-                mapping_files = [f for f in os.listdir(data_dir) if f.startswith("goal_hierarchy_mapping_")]
+                mapping_files = goal_store.find_tables(data_dir, "goal_hierarchy_mapping_")
                 
                 if not mapping_files:
                     raise FileNotFoundError("No clustering results found. Run sequential_clustering.py first.")
@@ -69,11 +72,11 @@ class ConstellationMapper:
                 mapping_path = os.path.join(data_dir, latest_file)
             
             logger.info(f"Loading clustering results from: {mapping_path}")
-            self.df = pd.read_csv(mapping_path)
+            self.df = goal_store.read_table(mapping_path)
             
             # Load original data to get missing score information
             try:
-                original_data = pd.read_csv('data/nhl_goals_with_names.csv', low_memory=False)
+                original_data = goal_store.read_goals('goals_with_names', columns=['team_score', 'opponent_score'])
                 logger.info(f"Loaded original data for score information")
                 
                 # Add missing score columns if they don't exist
@@ -153,18 +156,28 @@ class ConstellationMapper:
         logger.info(f"Positioned {len(galaxies)} galaxies in spiral layout")
         
     def create_cluster_positions(self):
-        """Use t-SNE to position clusters within each galaxy"""
-        logger.info("Creating cluster positions using t-SNE...")
+        """Position clusters within each galaxy (see cluster_placement for the backends)"""
+        logger.info("Creating cluster positions...")
         
         cluster_positions = {}
+        backend_counts = {}
+        cluster_keys = {}
+        
+        # Row positions of each (galaxy, cluster), in row order, from a single groupby
+        levels = ['level_0_cluster', 'level_1_cluster']
+        cluster_rows = self.df.groupby(levels, sort=False, observed=True).indices
+        clusters_by_galaxy = {}
+        for galaxy, cluster_raw in self.df[levels].dropna().drop_duplicates().itertuples(index=False):
+            clusters_by_galaxy.setdefault(galaxy, []).append(cluster_raw)
         
         for galaxy, galaxy_pos in self.galaxy_positions.items():
-            # Get clusters (level 1 clusters) within this galaxy
-            galaxy_data = self.df[self.df['level_0_cluster'] == galaxy]
-            clusters_raw = galaxy_data['level_1_cluster'].unique()
+            # Get clusters (level 1 clusters) within this galaxy, in order of first appearance
+            clusters_raw = clusters_by_galaxy.get(galaxy, [])
             
             # Create unique cluster names by combining galaxy + cluster
             clusters = [f"{galaxy}.{cluster}" for cluster in clusters_raw]
+            for cluster, cluster_raw in zip(clusters, clusters_raw):
+                cluster_keys[cluster] = (galaxy, cluster_raw)
             
             if len(clusters) <= 1:
                 # Single cluster - place at galaxy center
@@ -176,11 +189,10 @@ class ConstellationMapper:
                     }
                 continue
             
-            # Create features for t-SNE based on cluster metadata
+            # Create features for placement based on cluster metadata
             cluster_features = []
             for i, cluster in enumerate(clusters):
-                cluster_raw_name = clusters_raw[i]
-                cluster_data = galaxy_data[galaxy_data['level_1_cluster'] == cluster_raw_name]
+                cluster_data = self.df.iloc[cluster_rows[(galaxy, clusters_raw[i])]]
                 
                 # Features: size, average period, score patterns, etc.
                 features = [
@@ -192,45 +204,33 @@ class ConstellationMapper:
                 ]
                 cluster_features.append(features)
             
-            # Apply t-SNE if we have enough clusters
+            # Place clusters if we have enough of them
             if len(clusters) >= 2:
                 scaler = StandardScaler()
                 features_scaled = scaler.fit_transform(cluster_features)
                 
-                # Use t-SNE for 2D positioning
-                perplexity = min(5, len(clusters) - 1)
-                tsne = TSNE(n_components=2, perplexity=perplexity, random_state=42)
-                positions_2d = tsne.fit_transform(features_scaled)
+                # 2D positioning (PCA + relaxation for small galaxies, t-SNE for large ones; cached)
+                positions_2d, backend = cluster_placement.place_clusters(features_scaled)
+                backend_counts[backend] = backend_counts.get(backend, 0) + 1
                 
                 # Scale positions to fit within galaxy region with minimum separation
                 max_abs = np.max(np.abs(positions_2d))
                 if max_abs > 0:
                     positions_2d = positions_2d * self.constellation_radius / max_abs
                 else:
-                    # Failsafe: if t-SNE produces identical positions, create manual spacing
-                    logger.warning(f"t-SNE produced identical positions for {len(clusters)} clusters in galaxy {galaxy}. Using manual spacing.")
+                    # Failsafe: if placement produces identical positions, create manual spacing
+                    logger.warning(f"{backend} produced identical positions for {len(clusters)} clusters in galaxy {galaxy}. Using manual spacing.")
                     for i, cluster in enumerate(clusters):
                         angle = (2 * np.pi * i) / len(clusters)
                         radius = self.constellation_radius * 0.7
                         positions_2d[i] = [radius * np.cos(angle), radius * np.sin(angle)]
                 
-                # Ensure minimum separation between clusters and offset by galaxy center
+                # Offset by galaxy center and ensure minimum separation between clusters
                 min_separation = 10.0  # Minimum distance between cluster centers
-                for i, cluster in enumerate(clusters):
-                    base_x = galaxy_pos['x'] + positions_2d[i, 0]
-                    base_y = galaxy_pos['y'] + positions_2d[i, 1]
-                    
-                    # Check for conflicts with existing clusters and adjust if necessary
-                    final_x, final_y = base_x, base_y
-                    for existing_cluster, existing_pos in cluster_positions.items():
-                        if existing_pos['galaxy'] == galaxy:
-                            distance = np.sqrt((final_x - existing_pos['x'])**2 + (final_y - existing_pos['y'])**2)
-                            if distance < min_separation:
-                                # Push this cluster away from the existing one
-                                angle = np.arctan2(final_y - existing_pos['y'], final_x - existing_pos['x'])
-                                final_x = existing_pos['x'] + min_separation * np.cos(angle)
-                                final_y = existing_pos['y'] + min_separation * np.sin(angle)
-                    
+                base_positions = np.column_stack([galaxy_pos['x'] + positions_2d[:, 0],
+                                                  galaxy_pos['y'] + positions_2d[:, 1]])
+                final_positions = cluster_placement.resolve_overlaps(base_positions, min_separation)
+                for cluster, (final_x, final_y) in zip(clusters, final_positions.tolist()):
                     cluster_positions[cluster] = {
                         'x': final_x,
                         'y': final_y,
@@ -244,32 +244,36 @@ class ConstellationMapper:
                     'galaxy': galaxy
                 }
         
+        cluster_placement.save_cache()
         self.cluster_positions = cluster_positions
-        logger.info(f"Positioned {len(cluster_positions)} clusters")
+        self.cluster_keys = cluster_keys
+        logger.info(f"Positioned {len(cluster_positions)} clusters (galaxies per placement backend: {backend_counts})")
     
     def create_solar_system_positions(self):
         """Position solar systems within each cluster"""
         logger.info("Creating solar system positions...")
         
         solar_system_positions = {}
+        solar_system_keys = []
+        
+        # Goals per solar system, sorted by galaxy, cluster and solar system name
+        system_sizes = self.df.groupby(['level_0_cluster', 'level_1_cluster', 'level_2_cluster'], observed=True).size()
         
         for cluster, cluster_pos in self.cluster_positions.items():
-            # Parse cluster name to get galaxy and raw cluster name
-            galaxy_name, cluster_raw_name = cluster.split('.', 1)
-            
-            # Get all goals within this cluster
-            cluster_data = self.df[(self.df['level_0_cluster'] == galaxy_name) & 
-                                  (self.df['level_1_cluster'] == cluster_raw_name)]
+            galaxy_name, cluster_raw_name = self.cluster_keys[cluster]
             
-            # Group by solar system (level 2)
-            solar_systems = cluster_data.groupby('level_2_cluster')
+            # Solar systems (level 2) of this cluster, by name
+            try:
+                solar_systems = system_sizes.loc[(galaxy_name, cluster_raw_name)]
+            except KeyError:
+                continue
             
             # Position solar systems around cluster center
             num_solar_systems = len(solar_systems)
             if num_solar_systems == 0:
                 continue
                 
-            for sys_idx, (solar_system_raw_name, system_goals) in enumerate(solar_systems):
+            for sys_idx, (solar_system_raw_name, goal_count) in enumerate(solar_systems.items()):
                 # Position the center of this solar system within cluster area
                 if num_solar_systems == 1:
                     # Single solar system - place at cluster center
@@ -293,22 +297,28 @@ class ConstellationMapper:
                     'y': system_center_y,
                     'cluster': cluster,
                     'galaxy': cluster_pos['galaxy'],
-                    'goal_count': len(system_goals)
+                    'goal_count': int(goal_count)
                 }
+                solar_system_keys.append((galaxy_name, cluster_raw_name, solar_system_raw_name))
         
         self.solar_system_positions = solar_system_positions
+        self.solar_system_keys = solar_system_keys
         logger.info(f"Positioned {len(solar_system_positions)} solar systems")
     
     def create_star_positions(self):
-        """Create tightly clustered star positions around solar system labels"""
+        """
+        Create tightly clustered star positions around solar system labels.
+
+        Goals are sorted once by solar system and star cluster, so each star cluster is a
+        contiguous run of rows. Star clusters are kept in self.star_positions and goals in
+        self.goal_positions, both as DataFrames with one row per star cluster / goal; a
+        goal's 'row' is its position in self.df and 'star' its row in self.star_positions.
+        """
         logger.info("Creating tight star clusters around solar system centers...")
         
-        star_positions = {}
-        goal_positions = {}
-        
         # Generate color palette for clusters with better uniqueness
         import colorsys
-        def generate_cluster_color(cluster_index, total_clusters):
+        def generate_cluster_color(cluster_index):
             # Use prime number spacing and multiple variables for better distribution
             hue = (cluster_index * 47.123 + cluster_index**2 * 13.456) % 360  # More complex hue distribution
             saturation = 0.65 + 0.35 * ((cluster_index * 23) % 7) / 7  # More saturation variation
@@ -316,102 +326,93 @@ class ConstellationMapper:
             rgb = colorsys.hls_to_rgb(hue/360, lightness, saturation)
             return f"#{int(rgb[0]*255):02x}{int(rgb[1]*255):02x}{int(rgb[2]*255):02x}"
         
-        cluster_index = 0
-        
-        for solar_system, system_pos in self.solar_system_positions.items():
-            # Parse solar system name to get hierarchy
-            parts = solar_system.split('.')
-            galaxy_name = parts[0]
-            cluster_raw_name = parts[1]
-            system_raw_name = parts[2]
-            
-            # Get all goals within this solar system
-            system_data = self.df[(self.df['level_0_cluster'] == galaxy_name) & 
-                                 (self.df['level_1_cluster'] == cluster_raw_name) &
-                                 (self.df['level_2_cluster'] == system_raw_name)]
-            
-            # Check if there are level 3 clusters (player clusters)
-            if 'level_3_cluster' in self.df.columns and system_data['level_3_cluster'].notna().any():
-                # Group by star cluster (level 3 - player clusters)
-                star_clusters = system_data.groupby('level_3_cluster')
-            else:
-                # No level 3 clustering - treat the whole solar system as one star cluster
-                star_clusters = [(system_raw_name, system_data)]
-            
-            # Position star clusters very close to solar system center for tight clustering
-            num_star_clusters = len(star_clusters)
-            if num_star_clusters == 0:
-                continue
-                
-            for star_idx, (star_raw_name, star_goals) in enumerate(star_clusters):
-                # Position star clusters in a very tight formation around solar system center
-                if num_star_clusters == 1:
-                    # Single cluster - place exactly at solar system center
-                    cluster_center_x = system_pos['x']
-                    cluster_center_y = system_pos['y']
-                else:
-                    # Multiple clusters - use very small radius to keep them close to solar system label
-                    # Dramatically reduced radius for tight clustering
-                    max_radius = 3.0  # Much smaller than before (was self.star_radius * 0.9 ≈ 40)
-                    
-                    # Simple circular distribution with minimal spread
-                    angle = (2 * np.pi * star_idx) / num_star_clusters
-                    # Use single ring with tight spacing - no dual ring system
-                    radius = max_radius
-                    
-                    cluster_center_x = system_pos['x'] + radius * np.cos(angle)
-                    cluster_center_y = system_pos['y'] + radius * np.sin(angle)
-                
-                # Generate color for this cluster
-                total_possible_clusters = len(self.df['level_2_cluster'].unique()) * 2  # Estimate
-                cluster_color = generate_cluster_color(cluster_index, total_possible_clusters)
-                cluster_index += 1
-                
-                # Create star cluster entry
-                star_name = f"{solar_system}.{star_raw_name}" if star_raw_name != system_raw_name else solar_system
-                star_positions[star_name] = {
-                    'x': cluster_center_x,
-                    'y': cluster_center_y,
-                    'solar_system': solar_system,
-                    'cluster': system_pos['cluster'],
-                    'galaxy': system_pos['galaxy'],
-                    'cluster_color': cluster_color,
-                    'goal_count': len(star_goals)
-                }
-                
-                # Position individual goals with minimal jitter to maintain tight clustering
-                for goal_idx, (_, goal) in enumerate(star_goals.iterrows()):
-                    # Extremely minimal jitter to keep stars visually together
-                    # This ensures stars appear as a tight cluster around the solar system label
-                    jitter_radius = 0.3  # Much smaller jitter (was 0.8)
-                    jitter_angle = np.random.uniform(0, 2 * np.pi)
-                    jitter_distance = np.random.uniform(0, jitter_radius)
-                    
-                    goal_x = cluster_center_x + jitter_distance * np.cos(jitter_angle)
-                    goal_y = cluster_center_y + jitter_distance * np.sin(jitter_angle)
-                    
-                    goal_id = goal['goal_index']
-                    goal_positions[goal_id] = {
-                        'x': goal_x,
-                        'y': goal_y,
-                        'star_cluster': star_name,
-                        'solar_system': solar_system,
-                        'cluster': system_pos['cluster'],
-                        'galaxy': system_pos['galaxy'],
-                        'cluster_color': cluster_color,
-                        'goal_data': goal
-                    }
-        
-        self.star_positions = star_positions
-        self.goal_positions = goal_positions
-        logger.info(f"Positioned {len(star_positions)} tight star clusters with {len(goal_positions)} individual goals")
+        levels = ['level_0_cluster', 'level_1_cluster', 'level_2_cluster']
+        solar_systems = list(self.solar_system_positions)
+        system_keys = pd.MultiIndex.from_tuples(self.solar_system_keys, names=levels) if solar_systems else None
+        
+        # Solar system number of every goal (-1 for goals outside any positioned system)
+        if system_keys is None:
+            goal_system = np.full(len(self.df), -1)
+        else:
+            goal_system = system_keys.get_indexer(pd.MultiIndex.from_frame(self.df[levels]))
+        assigned = goal_system >= 0
+        
+        # Star clusters (level 3 - player clusters) by name; a solar system without level 3
+        # labels is treated as one star cluster
+        if 'level_3_cluster' in self.df.columns:
+            star_codes, star_labels = pd.factorize(self.df['level_3_cluster'], sort=True)
+        else:
+            star_codes, star_labels = np.full(len(self.df), -1), np.array([], dtype=object)
+        has_stars = np.bincount(goal_system[assigned], weights=star_codes[assigned] >= 0,
+                                minlength=len(solar_systems)) > 0
+        uses_stars = assigned & has_stars[np.maximum(goal_system, 0)] if solar_systems else assigned
+        star_rank = np.where(uses_stars, star_codes, 0)
+        keep = np.flatnonzero(assigned & (~uses_stars | (star_codes >= 0)))
+        
+        # Stable sort: star clusters within solar systems, goals in row order
+        order = keep[np.lexsort((star_rank[keep], goal_system[keep]))]
+        goal_system = goal_system[order]
+        star_rank = star_rank[order]
+        new_star = np.r_[True, (goal_system[1:] != goal_system[:-1]) | (star_rank[1:] != star_rank[:-1])] \
+            if len(order) else np.zeros(0, dtype=bool)
+        goal_star = np.cumsum(new_star) - 1
+        star_starts = np.flatnonzero(new_star)
+        star_goal_counts = np.diff(np.r_[star_starts, len(order)])
+        star_system = goal_system[star_starts]
+        
+        # Index of each star cluster within its solar system
+        system_starts = np.flatnonzero(np.r_[True, star_system[1:] != star_system[:-1]]) \
+            if len(star_system) else np.zeros(0, dtype=int)
+        stars_per_system = np.diff(np.r_[system_starts, len(star_system)])
+        star_idx = np.arange(len(star_system)) - np.repeat(system_starts, stars_per_system)
+        num_star_clusters = np.repeat(stars_per_system, stars_per_system)
+        
+        # Single cluster - place exactly at solar system center; multiple clusters - a ring
+        # with a very small radius to keep them close to the solar system label
+        system_x = np.array([pos['x'] for pos in self.solar_system_positions.values()], dtype=float)
+        system_y = np.array([pos['y'] for pos in self.solar_system_positions.values()], dtype=float)
+        max_radius = 3.0  # Much smaller than before (was self.star_radius * 0.9 ≈ 40)
+        angle = (2 * np.pi * star_idx) / num_star_clusters
+        single = num_star_clusters == 1
+        cluster_center_x = np.where(single, system_x[star_system], system_x[star_system] + max_radius * np.cos(angle))
+        cluster_center_y = np.where(single, system_y[star_system], system_y[star_system] + max_radius * np.sin(angle))
+        
+        star_names = []
+        for system, rank, star_uses_stars in zip(star_system.tolist(), star_rank[star_starts].tolist(),
+                                                 uses_stars[order[star_starts]].tolist()):
+            solar_system = solar_systems[system]
+            system_raw_name = self.solar_system_keys[system][2]
+            star_raw_name = star_labels[rank] if star_uses_stars else system_raw_name
+            star_names.append(f"{solar_system}.{star_raw_name}" if star_raw_name != system_raw_name else solar_system)
+        
+        system_positions = list(self.solar_system_positions.values())
+        self.star_positions = pd.DataFrame({
+            'name': star_names,
+            'x': cluster_center_x,
+            'y': cluster_center_y,
+            'solar_system': [solar_systems[system] for system in star_system],
+            'cluster': [system_positions[system]['cluster'] for system in star_system],
+            'galaxy': [system_positions[system]['galaxy'] for system in star_system],
+            'cluster_color': [generate_cluster_color(i) for i in range(len(star_system))],
+            'goal_count': star_goal_counts,
+        })
+        
+        # Extremely minimal jitter to keep stars visually together, drawn per goal as
+        # np.random.uniform(0, 2 * np.pi) then np.random.uniform(0, jitter_radius) would be
+        jitter_radius = 0.3  # Much smaller jitter (was 0.8)
+        uniform = np.random.random_sample(2 * len(order))
+        jitter_angle = 2 * np.pi * uniform[0::2]
+        jitter_distance = jitter_radius * uniform[1::2]
+        self.goal_positions = pd.DataFrame({
+            'row': order,
+            'x': cluster_center_x[goal_star] + jitter_distance * np.cos(jitter_angle),
+            'y': cluster_center_y[goal_star] + jitter_distance * np.sin(jitter_angle),
+            'star': goal_star,
+        })
+        logger.info(f"Positioned {len(self.star_positions)} tight star clusters with {len(self.goal_positions)} individual goals")
     
-    def create_geojson(self):
-        """Convert positions to GeoJSON format"""
-        logger.info("Creating GeoJSON...")
-        
-        features = []
-        
+    def iter_features(self):
+        """Yield GeoJSON features for galaxies, clusters, solar systems and goals, in that order"""
         # Add galaxies
         for galaxy, pos in self.galaxy_positions.items():
             feature = {
@@ -426,7 +427,7 @@ class ConstellationMapper:
                     "arm": pos['arm']
                 }
             }
-            features.append(feature)
+            yield feature
         
         # Add clusters
         for cluster, pos in self.cluster_positions.items():
@@ -442,7 +443,7 @@ class ConstellationMapper:
                     "galaxy": pos['galaxy']
                 }
             }
-            features.append(feature)
+            yield feature
         
         # Add solar systems
         for solar_system, pos in self.solar_system_positions.items():
@@ -460,67 +461,81 @@ class ConstellationMapper:
                     "goal_count": pos['goal_count']
                 }
             }
-            features.append(feature)
-        
-        # Add individual goals (now positioned together by cluster)
-        for goal_id, goal_pos in self.goal_positions.items():
-            goal_data = goal_pos['goal_data']
+            yield feature
+        
+        # Add individual goals (now positioned together by cluster), reading columns as lists
+        goals = self.df.iloc[self.goal_positions['row'].to_numpy()]
+        star = self.goal_positions['star'].to_numpy()
+        goal = {column: goals[column].tolist() for column in goals.columns}
+        stars = {column: self.star_positions[column].to_numpy()[star].tolist() for column in self.star_positions.columns}
+        goal_x = self.goal_positions['x'].tolist()
+        goal_y = self.goal_positions['y'].tolist()
+        
+        def value(column, i, default=None):
+            return goal[column][i] if column in goal else default
+        
+        def as_int(column, i):
+            number = value(column, i)
+            return int(number) if number is not None else 0
+        
+        season_days = {}
+        for i in range(len(goals)):
+            game_date = value('game_date', i)
+            if game_date not in season_days:
+                season_days[game_date] = calculate_season_day(game_date)
             
             feature = {
                 "type": "Feature",
                 "geometry": {
                     "type": "Point",
-                    "coordinates": [goal_pos['x'], goal_pos['y']]
+                    "coordinates": [goal_x[i], goal_y[i]]
                 },
                 "properties": {
-                    "name": f"goal_{goal_id}",
+                    "name": f"goal_{goal['goal_index'][i]}",
                     "type": "star",
-                    "solar_system": goal_pos['solar_system'],
-                    "level_2_cluster": goal_data.get('level_2_cluster', goal_pos['solar_system']),
-                    "cluster": goal_pos['cluster'],
-                    "galaxy": goal_pos['galaxy'],
-                    "star_cluster": goal_pos['star_cluster'],
-                    "cluster_color": goal_pos['cluster_color'],
-                    "goal_count": self.star_positions[goal_pos['star_cluster']]['goal_count'],
-                    "player_name": str(goal_data.get('player_name', 'Unknown')),
-                    "team_name": str(goal_data.get('team_name', 'Unknown')),
-                    "shot_type": str(goal_data.get('shot_type', 'Unknown')),
-                    "situation_code": str(goal_data.get('situation_code', 'Unknown')),
-                    "game_date": str(goal_data.get('game_date', 'Unknown')),
-                    "url": str(goal_data.get('url', '')),
-                    "period": int(goal_data.get('period', 0)) if goal_data.get('period') is not None else 0,
-                    "time": str(goal_data.get('time', 'Unknown')),
-                    "team_score": int(goal_data.get('team_score', 0)) if goal_data.get('team_score') is not None else 0,
-                    "opponent_score": int(goal_data.get('opponent_score', 0)) if goal_data.get('opponent_score') is not None else 0,
-                    "goalie_name": str(goal_data.get('goalie_name', 'Empty Net')),
-                    "goal_x": goal_data.get('x', None),
-                    "goal_y": goal_data.get('y', None),
+                    "solar_system": stars['solar_system'][i],
+                    "level_2_cluster": value('level_2_cluster', i, stars['solar_system'][i]),
+                    "cluster": stars['cluster'][i],
+                    "galaxy": stars['galaxy'][i],
+                    "star_cluster": stars['name'][i],
+                    "cluster_color": stars['cluster_color'][i],
+                    "goal_count": stars['goal_count'][i],
+                    "player_name": str(value('player_name', i, 'Unknown')),
+                    "team_name": str(value('team_name', i, 'Unknown')),
+                    "shot_type": str(value('shot_type', i, 'Unknown')),
+                    "situation_code": str(value('situation_code', i, 'Unknown')),
+                    "game_date": str(value('game_date', i, 'Unknown')),
+                    "url": str(value('url', i, '')),
+                    "period": as_int('period', i),
+                    "time": str(value('time', i, 'Unknown')),
+                    "team_score": as_int('team_score', i),
+                    "opponent_score": as_int('opponent_score', i),
+                    "goalie_name": str(value('goalie_name', i, 'Empty Net')),
+                    "goal_x": value('x', i),
+                    "goal_y": value('y', i),
                     # Add missing fields for UI statistics
-                    "x": goal_data.get('x', None),
-                    "y": goal_data.get('y', None),
-                    "score_diff": goal_data.get('score_diff', None),
-                    "period_time": goal_data.get('period_time', None),
-                    "month": goal_data.get('month', None),
-                    "day": goal_data.get('day', None),
-                    "shot_zone": goal_data.get('shot_zone', None),
-                    "situation": goal_data.get('situation', None),
-                    "season_day": calculate_season_day(goal_data.get('game_date', None))
+                    "x": value('x', i),
+                    "y": value('y', i),
+                    "score_diff": value('score_diff', i),
+                    "period_time": value('period_time', i),
+                    "month": value('month', i),
+                    "day": value('day', i),
+                    "shot_zone": value('shot_zone', i),
+                    "situation": value('situation', i),
+                    "season_day": season_days[game_date]
                 }
             }
-            features.append(feature)
-        
-        geojson = {
-            "type": "FeatureCollection",
-            "features": features
-        }
+            yield feature
+    
+    def create_geojson(self):
+        """Stream positions to a GeoJSON file; returns its path"""
+        logger.info("Creating GeoJSON...")
         
-        # Save GeoJSON
         geojson_path = os.path.join(self.output_dir, "nhl_constellation_map.geojson")
-        with open(geojson_path, 'w') as f:
-            json.dump(geojson, f, indent=2)
+        writer = geojson_writer.write_feature_collection(geojson_path, self.iter_features())
         
-        logger.info(f"GeoJSON saved to: {geojson_path}")
-        return geojson
+        logger.info(f"GeoJSON saved to: {writer.path} ({writer.count} features)")
+        return writer.path
     
     def visualize_constellation_map(self):
         """Create a visualization of the constellation map"""
@@ -560,16 +575,16 @@ class ConstellationMapper:
                       edgecolor='white', linewidth=0.5, label='Solar Systems')
         
         # Plot individual goals (sample for performance if too many)
-        if self.goal_positions:
-            goal_positions_list = list(self.goal_positions.values())
-            if len(goal_positions_list) > 2000:
+        if len(self.goal_positions):
+            goal_positions = self.goal_positions
+            if len(goal_positions) > 2000:
                 # Sample for visualization performance
                 import random
-                goal_positions_list = random.sample(goal_positions_list, 2000)
+                goal_positions = goal_positions.iloc[random.sample(range(len(goal_positions)), 2000)]
                 logger.info(f"Sampling 2000 goals from {len(self.goal_positions)} for visualization")
             
-            goal_x = [pos['x'] for pos in goal_positions_list]
-            goal_y = [pos['y'] for pos in goal_positions_list]
+            goal_x = goal_positions['x'].tolist()
+            goal_y = goal_positions['y'].tolist()
             
             # Debug: Check goal coordinate ranges
             logger.info(f"Goal X range: {min(goal_x):.2f} to {max(goal_x):.2f}")
@@ -639,12 +654,12 @@ class ConstellationMapper:
         self.create_star_positions()
         
         # Generate outputs
-        geojson = self.create_geojson()
+        geojson_path = self.create_geojson()
         self.visualize_constellation_map()
         
         logger.info("Constellation mapping complete!")
         return {
-            'geojson': geojson,
+            'geojson_path': geojson_path,
             'galaxy_count': len(self.galaxy_positions),
             'cluster_count': len(self.cluster_positions),
             'solar_system_count': len(self.solar_system_positions),
@@ -8,6 +8,10 @@ from sklearn.preprocessing import StandardScaler
 import logging
 from datetime import datetime, date
 
+import goal_store
+import geojson_writer
+from star_layout import LayoutParams, layout_stars
+
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -55,8 +59,8 @@ class StaticConstellationMapper:
                 file_path = f"sequential_clustering/{specific_file}"
             else:
                 # Find the most recent clustering file
-                clustering_files = [f for f in os.listdir("sequential_clustering") 
-                                  if f.startswith("goal_hierarchy_mapping_multiple_rounds_")]
+                clustering_files = goal_store.find_tables("sequential_clustering",
+                                                          "goal_hierarchy_mapping_multiple_rounds_")
                 if not clustering_files:
                     raise FileNotFoundError("No clustering files found")
                 
@@ -65,7 +69,7 @@ class StaticConstellationMapper:
                 file_path = f"sequential_clustering/{clustering_files[-1]}"
             
             logger.info(f"Loading clustering results from: {file_path}")
-            df = pd.read_csv(file_path)
+            df = goal_store.read_table(file_path)
             logger.info(f"Loaded {len(df)} clustered goals")
             return df
             
@@ -203,6 +207,103 @@ class StaticConstellationMapper:
         
         return positions
 
+    def layout_params(self):
+        """Pattern sizes used by star_layout for this mapper"""
+        return LayoutParams(
+            constellation_radius=self.constellation_radius,
+            constellation_inner_radius=5,
+            solar_system_offset=(-self.star_radius//4, self.star_radius//4),
+            star_step=3,
+            star_ring_radius=min(8, self.star_radius // 3),
+            star_spiral_radius=self.star_radius,
+            star_jitter=(-1, 1),
+        )
+
+    def iter_star_features(self, df):
+        """Lay out the hierarchy and yield one GeoJSON feature per star (goal), in layout order"""
+        # Get unique hierarchical levels using correct column names
+        galaxies = df['level_0_cluster'].unique().tolist()
+        logger.info(f"Processing {len(galaxies)} galaxies for dense layout")
+        
+        # Create extremely tight galaxy layout
+        galaxy_positions = self.create_dense_galaxy_layout(galaxies)
+        
+        # Position every star at once (galaxy -> constellation -> solar system -> star);
+        # only stars get features, galaxy/cluster/solar system markers are skipped for a
+        # cleaner star map view
+        layout = layout_stars(df, galaxy_positions, self.layout_params())
+        stars = df.iloc[layout.order]
+        
+        # Build each property column-wise
+        def column(name, default):
+            return stars[name].tolist() if name in stars.columns else [default] * len(stars)
+        
+        def as_str(values):
+            return [str(value) for value in values]
+        
+        def as_int(values):
+            return [int(value) if pd.notna(value) else 0 for value in values]
+        
+        def as_float(values):
+            return [float(value) if pd.notna(value) else None for value in values]
+        
+        player_names = as_str(column('player_name', 'Unknown'))
+        properties = zip(
+            player_names,
+            as_str(stars['level_2_cluster']),
+            as_str(stars['level_1_cluster']),
+            as_str(stars['level_0_cluster']),
+            as_str(column('team_name', 'Unknown')),
+            as_str(column('shot_type', 'Unknown')),
+            as_str(column('situation_code', 'Unknown')),
+            as_str(column('game_date', 'Unknown')),
+            as_str(column('url', '')),
+            as_int(column('period', 0)),
+            as_str(column('time', '00:00')),
+            as_int(column('team_score', 0)),
+            as_int(column('opponent_score', 0)),
+            as_str(column('goalie_name', 'Unknown')),
+            column('shot_zone', None),
+            column('situation', None),
+            as_float(column('x', None)),
+            as_float(column('y', None)),
+        )
+        
+        for x, y, (player_name, solar_system, constellation, galaxy, team_name, shot_type, situation_code,
+                   game_date, url, period, time, team_score, opponent_score, goalie_name, shot_zone,
+                   situation, goal_x, goal_y) in zip(layout.x.tolist(), layout.y.tolist(), properties):
+            yield {
+                "type": "Feature",
+                "geometry": {
+                    "type": "Point",
+                    "coordinates": [x, y]
+                },
+                "properties": {
+                    "name": f"Goal by {player_name}",
+                    "type": "star",
+                    "solar_system": solar_system,
+                    "cluster": constellation,
+                    "galaxy": galaxy,
+                    "cluster_color": '#64c8ff',  # Default color for now
+                    "goal_count": 1,
+                    "player_name": player_name,
+                    "team_name": team_name,
+                    "shot_type": shot_type,
+                    "situation_code": situation_code,
+                    "game_date": game_date,
+                    "url": url,
+                    "period": period,
+                    "time": time,
+                    "team_score": team_score,
+                    "opponent_score": opponent_score,
+                    "goalie_name": goalie_name,
+                    "shot_zone": shot_zone,
+                    "situation": situation,
+                    "goal_x": goal_x,
+                    "goal_y": goal_y,
+                }
+            }
+
     def create_static_constellation_map(self, specific_file=None):
         """Create a dense, night-sky-like constellation map optimized for static viewing"""
         try:
@@ -214,115 +315,16 @@ class StaticConstellationMapper:
             
             logger.info("Creating dense static constellation map...")
             
-            # Get unique hierarchical levels using correct column names
-            galaxies = df['level_0_cluster'].unique().tolist()
-            logger.info(f"Processing {len(galaxies)} galaxies for dense layout")
-            
-            # Create extremely tight galaxy layout
-            galaxy_positions = self.create_dense_galaxy_layout(galaxies)
-            
-            # Process each hierarchical level with tight spacing
-            geojson_features = []
-            
-            # 1. Process galaxies but skip adding galaxy markers for cleaner star map view
-            for galaxy in galaxies:
-                galaxy_data = df[df['level_0_cluster'] == galaxy]
-                galaxy_center = galaxy_positions[galaxy]
-                
-                # Skip adding galaxy feature to avoid blue dots
-                # geojson_features.append({ galaxy feature }) - REMOVED
-                
-                # 2. Create constellation features within this galaxy
-                constellations = galaxy_data['level_1_cluster'].unique()
-                constellation_positions = self.create_tight_constellation_positions(
-                    galaxy_center, constellations
-                )
-                
-                for constellation in constellations:
-                    constellation_data = galaxy_data[galaxy_data['level_1_cluster'] == constellation]
-                    constellation_center = constellation_positions[constellation]
-                    
-                    # Skip cluster markers for cleaner star map view
-                    # geojson_features.append({ cluster feature }) - REMOVED
-                    
-                    # 3. Process solar systems
-                    solar_systems = constellation_data['level_2_cluster'].unique()
-                    
-                    for solar_system in solar_systems:
-                        solar_system_data = constellation_data[constellation_data['level_2_cluster'] == solar_system]
-                        
-                        # Position solar systems very close to constellation center
-                        ss_offset_x = np.random.uniform(-self.star_radius//4, self.star_radius//4)
-                        ss_offset_y = np.random.uniform(-self.star_radius//4, self.star_radius//4)
-                        ss_center = (
-                            constellation_center[0] + ss_offset_x,
-                            constellation_center[1] + ss_offset_y
-                        )
-                        
-                        # Skip solar system markers for cleaner star map view
-                        # geojson_features.append({ solar_system feature }) - REMOVED
-                        
-                        # 4. Create individual star features (goals) - very tightly packed
-                        stars_in_system = solar_system_data.index.tolist()
-                        star_positions = self.create_compact_star_positions(ss_center, stars_in_system)
-                        
-                        for star_idx in stars_in_system:
-                            goal_data = solar_system_data.loc[star_idx]
-                            star_position = star_positions[star_idx]
-                            
-                            geojson_features.append({
-                                "type": "Feature",
-                                "geometry": {
-                                    "type": "Point",
-                                    "coordinates": [star_position[0], star_position[1]]
-                                },
-                                "properties": {
-                                    "name": f"Goal by {str(goal_data.get('player_name', 'Unknown'))}",
-                                    "type": "star",
-                                    "solar_system": str(solar_system),
-                                    "cluster": str(constellation),
-                                    "galaxy": str(galaxy),
-                                    "cluster_color": '#64c8ff',  # Default color for now
-                                    "goal_count": 1,
-                                    "player_name": str(goal_data.get('player_name', 'Unknown')),
-                                    "team_name": str(goal_data.get('team_name', 'Unknown')),
-                                    "shot_type": str(goal_data.get('shot_type', 'Unknown')),
-                                    "situation_code": str(goal_data.get('situation_code', 'Unknown')),
-                                    "game_date": str(goal_data.get('game_date', 'Unknown')),
-                                    "url": str(goal_data.get('url', '')),
-                                    "period": int(goal_data.get('period', 0)) if pd.notna(goal_data.get('period', 0)) else 0,
-                                    "time": str(goal_data.get('time', '00:00')),
-                                    "team_score": int(goal_data.get('team_score', 0)) if pd.notna(goal_data.get('team_score', 0)) else 0,
-                                    "opponent_score": int(goal_data.get('opponent_score', 0)) if pd.notna(goal_data.get('opponent_score', 0)) else 0,
-                                    "goalie_name": str(goal_data.get('goalie_name', 'Unknown')),
-                                    "shot_zone": goal_data.get('shot_zone', None),
-                                    "situation": goal_data.get('situation', None),
-                                    "goal_x": float(goal_data.get('x', 0)) if pd.notna(goal_data.get('x')) else None,
-                                    "goal_y": float(goal_data.get('y', 0)) if pd.notna(goal_data.get('y')) else None,
-                                }
-                            })
-            
-            # Create GeoJSON structure
-            geojson_data = {
-                "type": "FeatureCollection",
-                "features": geojson_features
-            }
-            
-            # Save to new static file
+            # Stream features to the new static file as they are laid out
             output_file = os.path.join(self.output_dir, "nhl_constellation_map_static.geojson")
-            with open(output_file, 'w') as f:
-                json.dump(geojson_data, f, indent=2)
+            writer = geojson_writer.write_feature_collection(output_file, self.iter_star_features(df))
+            output_file = writer.path
             
             logger.info(f"Dense static constellation map saved to: {output_file}")
-            logger.info(f"Total features: {len(geojson_features)}")
+            logger.info(f"Total features: {writer.count}")
             
             # Print statistics
-            feature_counts = {}
-            for feature in geojson_features:
-                feature_type = feature['properties']['type']
-                feature_counts[feature_type] = feature_counts.get(feature_type, 0) + 1
-            
-            for feature_type, count in feature_counts.items():
+            for feature_type, count in writer.type_counts.items():
                 logger.info(f"{feature_type.title()}s: {count}")
             
             return output_file
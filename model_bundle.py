@@ -0,0 +1,265 @@
+"""
+Persisted clustering models for nightly updates.
+
+clustering.main() saves a bundle next to the hierarchy mapping it writes, holding for each
+level the fitted LabelEncoders, fill values, StandardScaler, UMAP reducer and HDBSCAN
+clusterer (fitted with prediction data), the local -> global cluster IDs of every galaxy,
+the player-goalie combinations of every solar system and the names of every object.
+
+assign_new_goals (python clustering.py --assign) places goals that are not in the mapping
+yet into the existing hierarchy instead of re-clustering the league:
+
+    galaxy        UMAP transform + hdbscan.approximate_predict on the galaxy models
+    cluster       the same on the models of the goal's galaxy
+    solar system  the system already holding the goal's player-goalie combination, else the
+                  most similar combination in the cluster (same 0.4 threshold as
+                  clustering), else the cluster's miscellaneous system (the most similar
+                  combination's system if the cluster has none)
+
+New goals are appended as the next stars of their solar systems, so existing star IDs and
+names never change. Goals are matched to the mapping by goal_key.
+"""
+import logging
+import os
+from datetime import datetime
+
+import hdbscan
+import joblib
+import numpy as np
+import pandas as pd
+
+import goal_store
+from features import load_and_prepare_data
+from name_similarity import best_matches
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_FILE = os.path.join('sequential_clustering', 'model_bundle.joblib')
+BUNDLE_VERSION = 1
+SIMILARITY_THRESHOLD = 0.4  # Same threshold as cluster_by_player_goalie_similarity
+
+
+def goal_key(df):
+    """
+    Stable identifier for each goal: game, period, game clock and scorer.
+
+    Goals pulled before game_id was stored fall back to game date and team.
+    """
+    def as_int_string(values):
+        return pd.to_numeric(values, errors='coerce').astype('Int64').astype(str)
+
+    if 'game_id' in df.columns:
+        game = as_int_string(df['game_id'])
+        missing = df['game_id'].isna()
+    else:
+        game = pd.Series('', index=df.index)
+        missing = pd.Series(True, index=df.index)
+    legacy_game = pd.to_datetime(df['game_date']).dt.strftime('%Y-%m-%d') + '/' + as_int_string(df['team_id'])
+    game = game.where(~missing, legacy_game)
+    return game + ':' + as_int_string(df['period']) + ':' + df['time'].astype(str) + ':' + as_int_string(df['player_id'])
+
+
+def combo_names(df):
+    """Concatenated "PlayerName vs GoalieName" used to group goals into solar systems"""
+    player_names = goal_store.fill_missing(df['player_name'], 'Unknown Player').astype(str)
+    return player_names + " vs " + goal_store.fill_missing(df['goalie_name'], 'Empty Net').astype(str)
+
+
+def _names_by_label(labels, names):
+    return {int(label): name for label, name in pd.Series(np.asarray(names)).groupby(np.asarray(labels)).first().items()}
+
+
+def build_bundle(galaxy_model, cluster_models, galaxy_labels, cluster_labels, solar_system_labels,
+                 misc_systems, mapping_df, mapping_path):
+    """
+    Collect everything assign_new_goals needs from a full clustering run.
+
+    Args:
+        galaxy_model: Models dict filled by perform_galaxy_clustering
+        cluster_models: Galaxy ID -> models dict filled by perform_cluster_clustering
+        galaxy_labels, cluster_labels, solar_system_labels: Labels of every clustered goal
+        misc_systems: Cluster ID -> miscellaneous solar system ID (or None), as returned by
+            cluster_by_player_goalie_similarity
+        mapping_df: Hierarchy mapping built from those labels (same row order)
+        mapping_path: Where the mapping was written
+    """
+    systems = pd.DataFrame({
+        'cluster': np.asarray(cluster_labels),
+        'system': np.asarray(solar_system_labels),
+        'combo': combo_names(mapping_df).to_numpy(),
+    }).drop_duplicates(['cluster', 'combo'], keep='last')
+
+    solar_systems = {}
+    for cluster_id, cluster_systems in systems.groupby('cluster'):
+        solar_systems[int(cluster_id)] = {
+            'combos': dict(zip(cluster_systems['combo'], cluster_systems['system'].astype(int))),
+            'misc': misc_systems.get(int(cluster_id)),
+        }
+
+    return {
+        'version': BUNDLE_VERSION,
+        'created': datetime.now().isoformat(),
+        'mapping_path': mapping_path,
+        'galaxy': galaxy_model,
+        'clusters': {int(galaxy_id): entry for galaxy_id, entry in cluster_models.items()},
+        'solar_systems': solar_systems,
+        'names': {
+            'galaxy': _names_by_label(galaxy_labels, mapping_df['level_0_cluster']),
+            'cluster': _names_by_label(cluster_labels, mapping_df['level_1_cluster']),
+            'solar system': _names_by_label(solar_system_labels, mapping_df['level_2_cluster']),
+        },
+    }
+
+
+def save_bundle(bundle, path=BUNDLE_FILE):
+    """Write the bundle atomically; returns the path"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    joblib.dump(bundle, tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_bundle(path=BUNDLE_FILE):
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No model bundle at {path} - run clustering.py first")
+    bundle = joblib.load(path)
+    if bundle.get('version') != BUNDLE_VERSION:
+        raise ValueError(f"Model bundle {path} has version {bundle.get('version')}, "
+                         f"expected {BUNDLE_VERSION} - run clustering.py again")
+    return bundle
+
+
+def encode_with_model(df, model):
+    """Encode goals exactly like encode_categorical_features did when the model was fitted"""
+    df_encoded = df.copy()
+    for col, le in model['label_encoders'].items():
+        if col not in model['features']:
+            continue
+        values = goal_store.fill_missing(df_encoded[col], 'unknown').astype(str)
+        unseen = ~values.isin(le.classes_)
+        if unseen.any():
+            fallback = 'unknown' if 'unknown' in le.classes_ else le.classes_[0]
+            logger.warning(f"Unseen {col} values {sorted(values[unseen].unique())} encoded as '{fallback}'")
+            values = values.where(~unseen, fallback)
+        df_encoded[col] = le.transform(values)
+    for col, value in model['fill_values'].items():
+        df_encoded[col] = df_encoded[col].fillna(value)
+    return df_encoded[model['features']]
+
+
+def predict_level(model, df):
+    """Labels of new goals under one fitted level (noise goes to cluster 0, as when fitting)"""
+    features = model['scaler'].transform(encode_with_model(df, model).values)
+    embedding = model['reducer'].transform(features)
+    labels, _ = hdbscan.approximate_predict(model['clusterer'], embedding)
+    labels = np.asarray(labels).copy()
+    labels[labels == -1] = 0
+    return labels
+
+
+def assign_levels(bundle, df_subset, df_goals):
+    """
+    Galaxy, cluster and solar system IDs for new goals.
+
+    The bundle's combination lookup is updated in place with new combinations.
+
+    Args:
+        bundle: Loaded model bundle
+        df_subset: Clustering features of the new goals
+        df_goals: Prepared goal data (indexed like df_subset)
+    """
+    galaxy_labels = predict_level(bundle['galaxy'], df_subset)
+
+    cluster_labels = np.empty(len(df_subset), dtype=int)
+    for galaxy_id in np.unique(galaxy_labels):
+        rows = np.flatnonzero(galaxy_labels == galaxy_id)
+        entry = bundle['clusters'][int(galaxy_id)]
+        if entry['model'] is None:
+            local_labels = np.zeros(len(rows), dtype=int)
+        else:
+            local_labels = predict_level(entry['model'], df_subset.iloc[rows])
+        cluster_labels[rows] = [entry['cluster_ids'][int(label)] for label in local_labels]
+
+    combos = combo_names(df_goals.loc[df_subset.index]).to_numpy()
+    solar_system_labels = np.empty(len(df_subset), dtype=int)
+    for cluster_id in np.unique(cluster_labels):
+        rows = np.flatnonzero(cluster_labels == cluster_id)
+        systems = bundle['solar_systems'][int(cluster_id)]
+        known = list(systems['combos'])
+        unmatched = sorted({combo for combo in combos[rows] if combo not in systems['combos']})
+        best, similarity = best_matches(unmatched, known)
+        for combo, index, score in zip(unmatched, best, similarity):
+            if index >= 0 and (score >= SIMILARITY_THRESHOLD or systems['misc'] is None):
+                systems['combos'][combo] = systems['combos'][known[index]]
+            else:
+                systems['combos'][combo] = systems['misc']
+        solar_system_labels[rows] = [systems['combos'][combo] for combo in combos[rows]]
+
+    return galaxy_labels, cluster_labels, solar_system_labels
+
+
+def mapping_rows(mapping, bundle, df_subset, df_goals, galaxy_labels, cluster_labels, solar_system_labels):
+    """Hierarchy mapping rows for new goals, numbered after the existing stars of their solar systems"""
+    rows = df_goals.loc[df_subset.index].reset_index(drop=True)
+    names = bundle['names']
+    galaxy_name = pd.Series(galaxy_labels).map(names['galaxy'])
+    cluster_name = pd.Series(cluster_labels).map(names['cluster'])
+    solar_system_name = pd.Series(solar_system_labels).map(names['solar system'])
+
+    existing_stars = mapping.groupby('level_2_cluster', observed=True).size()
+    star_ids = solar_system_name.map(existing_stars).fillna(0).astype(int) + \
+        solar_system_name.groupby(solar_system_name).cumcount()
+    star_name = "star_" + star_ids.astype(str)
+    hierarchy_path = "root." + galaxy_name + "." + cluster_name + "." + solar_system_name + "." + star_name
+
+    rows['goal_index'] = df_subset.index.to_numpy()
+    rows['goal_key'] = goal_key(rows)
+    rows['deepest_cluster'] = hierarchy_path
+    rows['hierarchy_level'] = 3
+    rows['hierarchy_path'] = hierarchy_path
+    rows['cluster_size'] = 0  # Recomputed once the rows are appended
+    rows['level_0_cluster'] = galaxy_name
+    rows['level_1_cluster'] = cluster_name
+    rows['level_2_cluster'] = solar_system_name
+    rows['level_3_cluster'] = star_name
+    rows['goalie_name'] = goal_store.fill_missing(rows['goalie_name'], "Empty Net")
+    return rows[[col for col in mapping.columns if col in rows.columns]]
+
+
+def assign_new_goals(bundle_path=BUNDLE_FILE):
+    """
+    Place goals that are not in the latest mapping into the saved hierarchy and write the
+    extended mapping as a new file.
+
+    Returns:
+        pd.DataFrame: Updated hierarchy mapping
+    """
+    print("=== ASSIGNING NEW GOALS TO THE EXISTING HIERARCHY ===")
+    bundle = load_bundle(bundle_path)
+    mapping = goal_store.read_table(bundle['mapping_path'])
+    print(f"Existing mapping: {bundle['mapping_path']} ({len(mapping):,} goals)")
+
+    df_subset, df_goals = load_and_prepare_data()
+    is_new = ~goal_key(df_goals.loc[df_subset.index]).isin(set(mapping['goal_key'])).to_numpy()
+    if not is_new.any():
+        print("No new goals to assign")
+        return mapping
+    df_subset = df_subset[is_new]
+    print(f"Assigning {len(df_subset):,} new goals...")
+
+    galaxy_labels, cluster_labels, solar_system_labels = assign_levels(bundle, df_subset, df_goals)
+    new_rows = mapping_rows(mapping, bundle, df_subset, df_goals, galaxy_labels, cluster_labels,
+                            solar_system_labels)
+    mapping = pd.concat([mapping, new_rows], ignore_index=True)
+    mapping['cluster_size'] = mapping.groupby('level_2_cluster', observed=True)['level_2_cluster'].transform('size')
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_file = goal_store.write_table(
+        mapping, f'sequential_clustering/goal_hierarchy_mapping_multiple_rounds_{timestamp}')
+    bundle['mapping_path'] = output_file
+    save_bundle(bundle, bundle_path)
+
+    print(f"✅ Assigned {len(new_rows):,} goals to {new_rows['level_2_cluster'].nunique()} existing solar systems")
+    print(f"Output file: {output_file}")
+    return mapping
@@ -0,0 +1,258 @@
+"""
+Batched name similarity for the solar-system step of clustering.py.
+
+Similarity is 1 - DL(a, b) / max(len(a), len(b)), where DL is the (unrestricted)
+Damerau-Levenshtein distance, exactly as calculate_name_similarity computes it. Instead of
+scoring every ordered pair, similar_pairs only looks at the upper triangle and discards
+pairs whose distance provably exceeds the threshold before running the dynamic program:
+
+    every edit changes the character histogram by at most one extra and one missing
+    character (transpositions change nothing), so DL(a, b) >= max(extra, missing).
+
+That bound also covers the length filter (extra - missing = len(b) - len(a)). Surviving
+pairs are scored with a numba-compiled DP when numba is installed, otherwise in Python.
+similarity_neighbor_graph turns the matches into a sparse CSR adjacency, so memory grows
+with the number of matching pairs rather than with the square of the number of names.
+"""
+import logging
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from scipy.spatial.distance import cdist
+
+logger = logging.getLogger(__name__)
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    logger.warning("numba not available - name distances will be computed in pure Python")
+
+
+def damerau_levenshtein_distance(s1, s2):
+    """Calculate Damerau-Levenshtein distance between two strings"""
+    len1, len2 = len(s1), len(s2)
+
+    # Create a dictionary for character frequencies
+    da = {}
+    for char in s1 + s2:
+        da[char] = 0
+
+    # Create the distance matrix
+    h = [[0 for _ in range(len2 + 2)] for _ in range(len1 + 2)]
+
+    maxdist = len1 + len2
+    h[0][0] = maxdist
+
+    for i in range(0, len1 + 1):
+        h[i + 1][0] = maxdist
+        h[i + 1][1] = i
+    for j in range(0, len2 + 1):
+        h[0][j + 1] = maxdist
+        h[1][j + 1] = j
+
+    for i in range(1, len1 + 1):
+        db = 0
+        for j in range(1, len2 + 1):
+            k = da[s2[j - 1]]
+            l = db
+            if s1[i - 1] == s2[j - 1]:
+                cost = 0
+                db = j
+            else:
+                cost = 1
+            h[i + 1][j + 1] = min(
+                h[i][j] + cost,  # substitution
+                h[i + 1][j] + 1,  # insertion
+                h[i][j + 1] + 1,  # deletion
+                h[k][l] + (i - k - 1) + 1 + (j - l - 1)  # transposition
+            )
+        da[s1[i - 1]] = i
+
+    return h[len1 + 1][len2 + 1]
+
+
+def calculate_name_similarity(name1, name2):
+    """Calculate similarity between two names using Damerau-Levenshtein distance"""
+    if pd.isna(name1) or pd.isna(name2):
+        return 0.0
+
+    name1, name2 = str(name1), str(name2)
+    distance = damerau_levenshtein_distance(name1, name2)
+
+    # Convert distance to similarity (0-1 scale, where 1 is identical)
+    max_len = max(len(name1), len(name2))
+    if max_len == 0:
+        return 1.0
+
+    similarity = 1.0 - (distance / max_len)
+    return max(0.0, similarity)  # Ensure similarity is non-negative
+
+
+def _pair_distances_python(names, left, right):
+    return np.array([damerau_levenshtein_distance(names[i], names[j]) for i, j in zip(left, right)],
+                    dtype=np.int64)
+
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True)
+    def _pair_distances_numba(symbols, offsets, left, right, n_symbols, max_len):
+        """Same DP as damerau_levenshtein_distance over integer symbol arrays, one pair at a time"""
+        distances = np.empty(len(left), dtype=np.int64)
+        da = np.zeros(n_symbols, dtype=np.int64)
+        # Every cell the DP reads is written first, so the buffer can be reused across pairs
+        h = np.empty((max_len + 2, max_len + 2), dtype=np.int64)
+        for p in range(len(left)):
+            s1 = symbols[offsets[left[p]]:offsets[left[p] + 1]]
+            s2 = symbols[offsets[right[p]]:offsets[right[p] + 1]]
+            len1, len2 = len(s1), len(s2)
+            da[:] = 0
+            maxdist = len1 + len2
+            h[0, 0] = maxdist
+            for i in range(len1 + 1):
+                h[i + 1, 0] = maxdist
+                h[i + 1, 1] = i
+            for j in range(len2 + 1):
+                h[0, j + 1] = maxdist
+                h[1, j + 1] = j
+            for i in range(1, len1 + 1):
+                db = 0
+                for j in range(1, len2 + 1):
+                    k = da[s2[j - 1]]
+                    l = db
+                    if s1[i - 1] == s2[j - 1]:
+                        cost = 0
+                        db = j
+                    else:
+                        cost = 1
+                    h[i + 1, j + 1] = min(
+                        h[i, j] + cost,
+                        h[i + 1, j] + 1,
+                        h[i, j + 1] + 1,
+                        h[k, l] + (i - k - 1) + 1 + (j - l - 1)
+                    )
+                da[s1[i - 1]] = i
+            distances[p] = h[len1 + 1, len2 + 1]
+        return distances
+
+
+def _encode_names(names):
+    """Map names to dense integer symbols; returns (symbols, offsets, lengths, histograms)"""
+    alphabet = {char: index for index, char in enumerate(sorted(set(''.join(names))))}
+    lengths = np.array([len(name) for name in names], dtype=np.int64)
+    offsets = np.zeros(len(names) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    symbols = np.array([alphabet[char] for name in names for char in name], dtype=np.int64)
+    histograms = np.zeros((len(names), max(1, len(alphabet))), dtype=np.float64)
+    np.add.at(histograms, (np.repeat(np.arange(len(names)), lengths), symbols), 1)
+    return symbols, offsets, lengths, histograms, len(alphabet)
+
+
+def candidate_pairs(lengths, histograms, threshold, start, stop):
+    """
+    Pairs (i, j) with start <= i < stop and i < j whose histogram lower bound does not rule
+    out the threshold. Memory is (stop - start) x n for the block being searched.
+    """
+    l1 = cdist(histograms[start:stop], histograms[start:], 'cityblock')
+    length_gap = np.abs(lengths[start:stop, None] - lengths[None, start:])
+    # max(extra, missing) = (extra + missing + |extra - missing|) / 2
+    lower_bound = (l1 + length_gap) / 2
+    max_len = np.maximum(lengths[start:stop, None], lengths[None, start:])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        possible = (1.0 - lower_bound / max_len >= threshold) | (max_len == 0)
+    rows, cols = np.nonzero(np.triu(possible, k=1))
+    return (rows + start).astype(np.int64), (cols + start).astype(np.int64)
+
+
+def pair_similarities(names, symbols, offsets, lengths, n_symbols, left, right):
+    """Exact calculate_name_similarity for each (left[p], right[p]) pair"""
+    if len(left) == 0:
+        return np.empty(0, dtype=np.float64)
+    if NUMBA_AVAILABLE:
+        distances = _pair_distances_numba(symbols, offsets, left, right, max(1, n_symbols),
+                                          int(lengths.max()))
+    else:
+        distances = _pair_distances_python(names, left, right)
+    max_len = np.maximum(lengths[left], lengths[right])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(max_len == 0, 1.0, np.maximum(0.0, 1.0 - distances / max_len))
+
+
+def similar_pairs(names, threshold=0.4, block_size=512):
+    """
+    All pairs of names whose calculate_name_similarity is at least threshold.
+
+    Candidates are searched and scored one block of rows at a time, so only the matches
+    are kept across blocks.
+
+    Args:
+        names: Sequence of strings
+        threshold: Minimum similarity (same comparison as the dense matrix, sim >= threshold)
+        block_size: Rows compared per block in the candidate search
+
+    Returns:
+        tuple: (left, right, similarities) arrays with left < right, in row-major order
+    """
+    names = [str(name) for name in names]
+    symbols, offsets, lengths, histograms, n_symbols = _encode_names(names)
+    matches = []
+    n_candidates = 0
+    for start in range(0, len(names), block_size):
+        stop = min(start + block_size, len(names))
+        if threshold <= 0:
+            # Similarities are clipped at 0, so every pair qualifies
+            rows, cols = np.nonzero(np.triu(np.ones((stop - start, len(names) - start), dtype=bool), k=1))
+            left, right = rows + start, cols + start
+        else:
+            left, right = candidate_pairs(lengths, histograms, threshold, start, stop)
+        n_candidates += len(left)
+        similarities = pair_similarities(names, symbols, offsets, lengths, n_symbols, left, right)
+        keep = similarities >= threshold
+        matches.append((left[keep], right[keep], similarities[keep]))
+
+    if not matches:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+    left, right, similarities = (np.concatenate(parts) for parts in zip(*matches))
+    logger.info(f"Name similarity: {len(names)} names, {n_candidates} candidate pairs, {len(left)} matches")
+    return left, right, similarities
+
+
+def best_matches(queries, candidates):
+    """
+    Most similar candidate for each query name.
+
+    Returns:
+        tuple: (index into candidates, similarity) arrays, one entry per query; ties go to
+        the earliest candidate
+    """
+    queries = [str(name) for name in queries]
+    candidates = [str(name) for name in candidates]
+    if not queries or not candidates:
+        return np.full(len(queries), -1, dtype=np.int64), np.zeros(len(queries))
+    names = queries + candidates
+    symbols, offsets, lengths, _, n_symbols = _encode_names(names)
+    left = np.repeat(np.arange(len(queries), dtype=np.int64), len(candidates))
+    right = np.tile(np.arange(len(queries), len(names), dtype=np.int64), len(queries))
+    similarities = pair_similarities(names, symbols, offsets, lengths, n_symbols, left, right)
+    similarities = similarities.reshape(len(queries), len(candidates))
+    return similarities.argmax(axis=1), similarities.max(axis=1)
+
+
+def similarity_neighbor_graph(names, threshold=0.4, block_size=512):
+    """
+    Symmetric CSR adjacency of names with similarity >= threshold, including self-loops.
+
+    Row i's column indices (graph.indices[graph.indptr[i]:graph.indptr[i + 1]]) are sorted,
+    matching the order a scan over a dense similarity matrix row would visit them in.
+    """
+    n = len(names)
+    left, right, similarities = similar_pairs(names, threshold, block_size)
+    diagonal = np.arange(n, dtype=np.int64)
+    rows = np.concatenate([left, right, diagonal])
+    cols = np.concatenate([right, left, diagonal])
+    values = np.concatenate([similarities, similarities, np.ones(n)])
+    graph = csr_matrix((values, (rows, cols)), shape=(n, n))
+    graph.sort_indices()
+    return graph
@@ -0,0 +1,258 @@
+"""
+Astronomical names for galaxies, clusters and solar systems.
+
+All names for a clustering run are requested in one batch: prompts are built from each
+group's goals, answered from a persistent cache keyed on a hash of the model and prompt,
+and the misses are sent to the Anthropic API concurrently (bounded by a semaphore).
+Uniqueness against generated_names is resolved after the batch, in request order, so the
+final names do not depend on which API call finished first.
+
+FakeNamingClient answers prompts locally and deterministically for offline runs and tests.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+try:
+    import anthropic
+    ANTHROPIC_AVAILABLE = True
+except ImportError:
+    ANTHROPIC_AVAILABLE = False
+    logger.warning("Anthropic API not available - using generic names")
+
+NAME_CACHE_FILE = os.path.join('cache', 'cluster_names.json')
+NAMING_MODEL = "claude-3-7-sonnet-20250219"
+NAMING_CONCURRENCY = int(os.environ.get('NAMING_CONCURRENCY', 4))
+
+
+def build_prompt(level_name, cluster_goals, features_used):
+    """Describe a group of goals and ask for a name for it"""
+    context_info = []
+
+    # Analyze features used for clustering
+    if 'shot_zone' in features_used:
+        shot_zones = cluster_goals['shot_zone'].value_counts().head(3)
+        context_info.append(f"Common shot zones: {', '.join([f'{zone} ({count})' for zone, count in shot_zones.items()])}")
+
+    if 'situation' in features_used:
+        situations = cluster_goals['situation'].value_counts().head(3)
+        context_info.append(f"Common situations: {', '.join([f'{situation} ({count})' for situation, count in situations.items()])}")
+
+    if 'shot_type' in features_used:
+        shot_types = cluster_goals['shot_type'].value_counts().head(3)
+        context_info.append(f"Common shot types: {', '.join([f'{shot} ({count})' for shot, count in shot_types.items()])}")
+
+    if 'period' in features_used:
+        periods = cluster_goals['period'].value_counts().head(5)
+        context_info.append(f"Game periods: {', '.join([f'Period {period} ({count})' for period, count in periods.items()])}")
+
+    if 'team_score' in features_used or 'opponent_score' in features_used:
+        avg_team_score = cluster_goals['team_score'].mean()
+        avg_opp_score = cluster_goals['opponent_score'].mean()
+        context_info.append(f"Average score context: {avg_team_score:.1f} - {avg_opp_score:.1f}")
+
+    if 'player_name' in features_used:
+        top_players = cluster_goals['player_name'].value_counts().head(2)
+        context_info.append(f"Top players: {', '.join([f'{player} ({count})' for player, count in top_players.items()])}")
+
+    if 'goalie' in features_used or 'goalie_name' in features_used:
+        goalie_col = 'goalie_name' if 'goalie_name' in cluster_goals.columns else 'goalie'
+        top_goalies = cluster_goals[goalie_col].value_counts().head(2)
+        context_info.append(f"Goalies faced: {', '.join([f'{goalie} ({count})' for goalie, count in top_goalies.items()])}")
+
+    context_str = '; '.join(context_info)
+
+    return f"""You are tasked with creating a {level_name} name for a project which maps all of the goals scored in the NHL into a constellation map. The name should make sense based on the attributes of the goals contained in the cluster and should resemble names used in astronomy for our real universe.
+Please provide only the name (2-3 words maximum), no explanation. The name should be evocative of the goal characteristics and follow astronomical naming conventions. Do not use a name in goalies faced unless a goalie name appears 4 or more times based on the provided context(we are using pandas value_counts() to get the count). For situations, 5v4, 6v4, 5v3, 4v3 are powerplays and 4v5, 4v6, 3v5, 3v4 are shorthanded. 5v6 is on an empty net and 6v5 is scoring with an extra player because your net is empty.
+Some context for the goals in this grouping are: {context_str}."""
+
+
+def clean_name(text):
+    return text.strip().replace('"', '').replace("'", "")
+
+
+class AnthropicNamingClient:
+    """Async Anthropic client that answers one naming prompt per call"""
+
+    def __init__(self, model=NAMING_MODEL, max_retries=4):
+        self.model = model
+        self.client = anthropic.AsyncAnthropic(max_retries=max_retries)
+
+    async def complete(self, prompt):
+        response = await self.client.messages.create(
+            model=self.model,
+            max_tokens=50,
+            messages=[
+                {"role": "user", "content": prompt}
+            ]
+        )
+        return response.content[0].text
+
+
+class FakeNamingClient:
+    """Local stand-in for the API: deterministic names from the prompt, with call tracking"""
+
+    WORDS = ["Nebula", "Corona", "Aurora", "Pulsar", "Quasar", "Nova", "Comet", "Zenith"]
+
+    def __init__(self, model="fake", delay=0.0, fail_on=()):
+        self.model = model
+        self.delay = delay
+        self.fail_on = set(fail_on)
+        self.prompts = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def complete(self, prompt):
+        self.prompts.append(prompt)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.delay:
+                await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        digest = hashlib.sha256(prompt.encode()).digest()
+        if digest[0] % 16 in self.fail_on:
+            raise RuntimeError("fake naming failure")
+        # A small vocabulary, so duplicate names (and suffixing) happen often
+        return f'"{self.WORDS[digest[1] % len(self.WORDS)]} {self.WORDS[digest[2] % len(self.WORDS)]}"'
+
+
+def get_default_client():
+    """AnthropicNamingClient if the SDK and credentials are available, else None"""
+    if not ANTHROPIC_AVAILABLE:
+        return None
+    try:
+        return AnthropicNamingClient()
+    except Exception as e:
+        logger.warning(f"Failed to configure Anthropic API: {e} - using generic names")
+        return None
+
+
+def prompt_key(model, prompt):
+    return hashlib.sha256(json.dumps([model, prompt]).encode()).hexdigest()
+
+
+def load_name_cache(path=NAME_CACHE_FILE):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning(f"Ignoring unreadable name cache {path}: {e}")
+        return {}
+
+
+def save_name_cache(cache, path=NAME_CACHE_FILE):
+    """Write the cache atomically"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+async def fetch_names(client, prompts, concurrency=NAMING_CONCURRENCY):
+    """Ask the client for every prompt with at most `concurrency` requests in flight"""
+    slots = asyncio.Semaphore(concurrency)
+
+    async def fetch(prompt):
+        async with slots:
+            try:
+                return clean_name(await client.complete(prompt))
+            except Exception as e:
+                logger.warning(f"Failed to generate AI name: {e}")
+                return None
+
+    return await asyncio.gather(*(fetch(prompt) for prompt in prompts))
+
+
+def resolve_unique_name(level_name, name, generated_names):
+    """Make a name unique within its level (adding a numeric suffix) and record it"""
+    if not name:
+        # Fallback to generic naming
+        name = f"{level_name}_{len(generated_names[level_name])}"
+    elif name in generated_names[level_name]:
+        counter = 1
+        while f"{name} {counter}" in generated_names[level_name]:
+            counter += 1
+        name = f"{name} {counter}"
+    generated_names[level_name].add(name)
+    return name
+
+
+def name_clusters(requests, generated_names, client=None, cache_path=NAME_CACHE_FILE,
+                  concurrency=NAMING_CONCURRENCY):
+    """
+    Generate unique names for a batch of celestial objects.
+
+    Args:
+        requests: List of (level_name, cluster_goals, features_used) tuples
+        generated_names: Dict of level name -> set of names already used, updated in place
+        client: Naming client (AnthropicNamingClient, FakeNamingClient) or None for generic names
+        cache_path: JSON file of previously generated names, or None to disable caching
+        concurrency: Maximum API requests in flight
+
+    Returns:
+        list: Final names, in request order
+    """
+    raw_names = [None] * len(requests)
+    if client is not None:
+        prompts = [build_prompt(*request) for request in requests]
+        keys = [prompt_key(client.model, prompt) for prompt in prompts]
+        cache = load_name_cache(cache_path) if cache_path else {}
+
+        misses = [i for i, key in enumerate(keys) if key not in cache]
+        print(f"Naming {len(requests)} objects: {len(requests) - len(misses)} cached, {len(misses)} to generate")
+        if misses:
+            fetched = asyncio.run(fetch_names(client, [prompts[i] for i in misses], concurrency))
+            for i, name in zip(misses, fetched):
+                if name:
+                    cache[keys[i]] = name
+            if cache_path:
+                save_name_cache(cache, cache_path)
+        raw_names = [cache.get(key) for key in keys]
+
+    # Uniqueness is resolved in request order once every name is known
+    names = []
+    for (level_name, _, _), raw_name in zip(requests, raw_names):
+        name = resolve_unique_name(level_name, raw_name, generated_names)
+        if raw_name:
+            logger.info(f"Generated {level_name} name: '{name}'")
+        names.append(name)
+    return names
+
+
+if __name__ == "__main__":
+    import tempfile
+    import time
+
+    import numpy as np
+    import pandas as pd
+
+    # Offline demo: name synthetic clusters twice with the fake client; the second run is
+    # answered entirely from the cache and produces the same names
+    rng = np.random.default_rng(0)
+    goals = pd.DataFrame({
+        'shot_zone': rng.choice(['Slot', 'Point', 'Behind Net'], 2000),
+        'shot_type': rng.choice(['Wrist Shot', 'Slap Shot'], 2000),
+        'situation': rng.choice(['5v5', '5v4'], 2000),
+        'group': rng.integers(0, 40, 2000),
+    })
+    requests = [('galaxy', group_goals, ['shot_zone', 'shot_type', 'situation'])
+                for _, group_goals in goals.groupby('group')]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache_file = os.path.join(tmp_dir, 'names.json')
+        runs = []
+        for run in range(2):
+            client = FakeNamingClient(delay=0.05)
+            start = time.perf_counter()
+            runs.append(name_clusters(requests, {'galaxy': set()}, client, cache_file, concurrency=8))
+            print(f"Run {run + 1}: {len(client.prompts)} client calls in {time.perf_counter() - start:.2f}s")
+        assert runs[0] == runs[1] and len(set(runs[0])) == len(runs[0])
+        print(", ".join(runs[0][:8]), "...")
@@ -0,0 +1,89 @@
+"""
+Local stand-in for the NHL web API that replays recorded JSON responses.
+
+Responses are looked up as <fixtures>/<path>.json, the same layout AsyncNHLClient writes
+with record_dir, e.g. fixtures/schedule/2023-10-10.json and
+fixtures/gamecenter/2023020001/play-by-play.json. Unknown paths return 404. Paths in
+throttle answer 429 with the listed Retry-After values first, to exercise client backoff.
+
+Usage:
+    python nhl_api_stub.py fixtures/ 8765
+    NHL_API_BASE_URL=http://127.0.0.1:8765/v1 python pull_data.py --async
+"""
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_handler(fixtures_dir, prefix="/v1", throttle=None, requests=None):
+    """
+    Request handler class replaying fixtures_dir.
+
+    Args:
+        throttle: Optional dict of path (e.g. "schedule/2023-10-10") -> list of Retry-After
+            values; each request to the path answers 429 with the next value until the list is empty
+        requests: Optional list that every requested path is appended to
+    """
+    throttle = throttle if throttle is not None else {}
+    lock = threading.Lock()
+
+    class ReplayHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = self.path.split('?', 1)[0]
+            if path.startswith(prefix):
+                path = path[len(prefix):]
+            path = path.strip('/')
+            with lock:
+                if requests is not None:
+                    requests.append(path)
+                retry_after = throttle[path].pop(0) if throttle.get(path) else None
+            if retry_after is not None:
+                self.send_response(429)
+                self.send_header("Retry-After", str(retry_after))
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            file_path = os.path.normpath(os.path.join(fixtures_dir, path + '.json'))
+            if not file_path.startswith(os.path.abspath(fixtures_dir)) or not os.path.exists(file_path):
+                self.send_response(404)
+                self.end_headers()
+                return
+            with open(file_path, 'rb') as f:
+                body = f.read()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ReplayHandler
+
+
+def start_stub_server(fixtures_dir, port=0, throttle=None):
+    """
+    Start the replay server in a background thread and return (server, base_url).
+
+    server.requests lists the paths requested so far; call server.shutdown() to stop it.
+    """
+    requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", port),
+                                 make_handler(os.path.abspath(fixtures_dir), throttle=throttle, requests=requests))
+    server.requests = requests
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+if __name__ == "__main__":
+    fixtures = sys.argv[1] if len(sys.argv) > 1 else "fixtures"
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 8765
+    server, base_url = start_stub_server(fixtures, port)
+    print(f"Replaying {fixtures} at {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -1,10 +1,15 @@
 import requests
+import asyncio
 import concurrent.futures
 import pandas as pd
 import time
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 import os
+import sys
+
+import goal_store
+from ingest_manifest import IngestManifest
 
 @dataclass
 class Goal:
@@ -22,28 +27,39 @@ class Goal:
     team_score: int
     opponent_score: int
     game_date: str
+    game_id: int
 
 
 # curl for seasons is `curl -X GET "https://api-web.nhle.com/v1/season"`#
 #19171918,19181919,19191920,19201921,19211922,19221923,19231924,19241925,19251926,19261927,19271928,19281929,19291930,19301931,19311932,19321933,19331934,19341935,19351936,19361937,19371938,19381939,19391940,19401941,19411942,19421943,19431944,19441945,19451946,19461947,19471948,19481949,19491950,19501951,19511952,19521953,19531954,19541955,19551956,19561957,19571958,19581959,19591960,19601961,19611962,19621963,19631964,19641965,19651966,19661967,19671968,19681969,19691970,19701971,19711972,19721973,19731974,19741975,
 seasons = [19751976,19761977,19771978,19781979,19791980,19801981,19811982,19821983,19831984,19841985,19851986,19861987,19871988,19881989,19891990,19901991,19911992,19921993,19931994,19941995,19951996,19961997,19971998,19981999,19992000,20002001,20012002,20022003,20032004,20052006,20062007,20072008,20082009,20092010,20102011,20112012,20122013,20132014,20142015,20152016,20162017,20172018,20182019,20192020,20202021,20212022,20222023,20232024,20242025,20252026]
 
+# schedule gameState values for games that are over and safe to pull
+FINAL_GAME_STATES = {"OFF", "FINAL"}
+
+API_BASE_URL = os.environ.get("NHL_API_BASE_URL", "https://api-web.nhle.com/v1")
+
 def get_goals_for_game(game_id):
-    url = f"https://api-web.nhle.com/v1/gamecenter/{game_id}/play-by-play"
+    """Fetch the goals for a game, returning None if the request failed"""
+    url = f"{API_BASE_URL}/gamecenter/{game_id}/play-by-play"
     time.sleep(0.2)  # Increased delay to avoid rate limiting
     try:
         response = requests.get(url, timeout=30)  # Add timeout
         if response.status_code != 200:
             print(f"Failed to fetch game data for {game_id} with status code {response.status_code}")
-            return []
+            return None
         data = response.json()
     except requests.exceptions.Timeout:
         print(f"Timeout fetching game data for {game_id}")
-        return []
+        return None
     except requests.exceptions.RequestException as e:
         print(f"Request error for game {game_id}: {e}")
-        return []
+        return None
+
+    return parse_goals_from_play_by_play(game_id, data)
 
+def parse_goals_from_play_by_play(game_id, data):
+    """Extract Goal records from a play-by-play response"""
     # check if the game is a regular season game
     if data.get("gameType", 0) != 2:
         print(f"Game {game_id} is not a regular season game, skipping.")
@@ -81,93 +97,177 @@ def get_goals_for_game(game_id):
                 home_team_defending_side=play.get("homeTeamDefendingSide", ""),
                 team_score=details.get("homeScore", 0) if team_id == home_team else details.get("awayScore", 0),
                 opponent_score=details.get("awayScore", 0) if team_id == home_team else details.get("homeScore", 0),
-                game_date=data.get("gameDate", "")
+                game_date=data.get("gameDate", ""),
+                game_id=game_id
             )
             goals.append(goal)
 
     return goals
 
 def get_schedule_on_date(date):
-    url = f"https://api-web.nhle.com/v1/schedule/{date}"
+    """Return (games, next_start_date) for the week starting at date; games is None on failure"""
+    url = f"{API_BASE_URL}/schedule/{date}"
     try:
         response = requests.get(url, timeout=30)
         if response.status_code == 200:
-            data = response.json()
-            games = []
-            for gameDay in data.get("gameWeek", []):
-                for game in gameDay.get("games", []):
-                    if game.get("gameType", 0) == 2:
-                        games.append(game)
-            return games, data.get("nextStartDate", "")
+            return parse_schedule(response.json())
         print("Failed to fetch schedule:", response.status_code)
-        return [], ""
+        return None, ""
     except requests.exceptions.Timeout:
         print(f"Timeout fetching schedule for {date}")
-        return [], ""
+        return None, ""
     except requests.exceptions.RequestException as e:
         print(f"Request error for schedule {date}: {e}")
-        return [], ""
+        return None, ""
+
+def parse_schedule(data):
+    """Return the regular season games and the next start date from a schedule response"""
+    games = []
+    for gameDay in data.get("gameWeek", []):
+        for game in gameDay.get("games", []):
+            if game.get("gameType", 0) == 2:
+                games.append(game)
+    return games, data.get("nextStartDate", "")
 
 def load_existing_data():
-    """Load existing CSV data and return DataFrame with processed games"""
-    csv_file = "nhl_goals.csv"
-    if os.path.exists(csv_file):
+    """Load previously pulled goals (only the columns needed to detect processed games)"""
+    if goal_store.stage_exists('goals'):
         try:
-            df = pd.read_csv(csv_file)
+            df = goal_store.read_goals('goals', columns=['game_id', 'game_date', 'team_score', 'opponent_score'])
             print(f"Loaded existing data: {len(df)} goals")
             return df
         except Exception as e:
-            print(f"Error loading existing CSV: {e}")
+            print(f"Error loading existing goals: {e}")
             return pd.DataFrame()
     else:
-        print("No existing CSV found, starting fresh")
+        print("No existing goal data found, starting fresh")
         return pd.DataFrame()
 
 def get_processed_games(existing_df):
-    """Extract set of already processed game IDs from existing data"""
+    """Build legacy date/score identifiers for data pulled before game_id was stored"""
     if existing_df.empty:
         return set()
     
-    # We need to extract game IDs from the data
-    # Since we don't store game_id directly, we'll use a combination of game_date and teams
-    # This is imperfect but should catch most duplicates
-    processed = set()
-    for _, row in existing_df.iterrows():
-        # Create a unique identifier from date and score
-        identifier = f"{row['game_date']}_{row['team_score']}_{row['opponent_score']}"
-        processed.add(identifier)
-    return processed
+    # Older files have no game_id, so fall back to a combination of game_date and score
+    # This is imperfect and only used until the file has been re-pulled with game IDs
+    identifiers = (existing_df['game_date'].astype(str) + "_" +
+                   existing_df['team_score'].astype(str) + "_" +
+                   existing_df['opponent_score'].astype(str))
+    return set(identifiers.unique())
+
+def is_legacy_processed(game, legacy_processed, default_date=""):
+    """Check a scheduled game against legacy date/score identifiers"""
+    if not legacy_processed:
+        return False
+    game_date = game.get("gameDate", default_date)
+    home_score = game.get("homeTeam", {}).get("score", 0)
+    away_score = game.get("awayTeam", {}).get("score", 0)
+    # Check both possible combinations since we don't know which team scored
+    return (f"{game_date}_{home_score}_{away_score}" in legacy_processed or
+            f"{game_date}_{away_score}_{home_score}" in legacy_processed)
+
+def is_game_final(game):
+    """Whether a scheduled game has finished (games without a state are assumed final)"""
+    return game.get("gameState", "OFF") in FINAL_GAME_STATES
+
+def load_manifest():
+    """
+    Load the ingest manifest, bootstrapping it from previously pulled goals on the first run.
+
+    The legacy date/score identifiers are stored in the manifest, so every run gets them
+    back whether or not the run that built them finished.
+
+    Returns:
+        tuple: (IngestManifest, set of legacy identifiers for goals without game_id)
+    """
+    manifest = IngestManifest.load()
+    if manifest is not None and manifest.legacy is not None:
+        print(f"Loaded ingest manifest: {manifest.completed_count()} completed games")
+        return manifest, manifest.legacy
+
+    existing_df = load_existing_data()
+    if manifest is None:
+        manifest = IngestManifest.from_goals(existing_df)
+        print(f"Created ingest manifest with {manifest.completed_count()} completed games")
+    else:
+        print(f"Loaded ingest manifest: {manifest.completed_count()} completed games (adding legacy identifiers)")
+    manifest.legacy = set()
+    if not existing_df.empty:
+        if 'game_id' in existing_df.columns:
+            legacy_df = existing_df[existing_df['game_id'].isna()]
+        else:
+            legacy_df = existing_df
+        if not legacy_df.empty:
+            print(f"{len(legacy_df)} goals have no game_id, using date/score matching for them")
+            manifest.legacy = get_processed_games(legacy_df)
+    manifest.save(rewrite=True)
+    return manifest, manifest.legacy
 
 def save_goals_batch(all_goals, append=False):
-    """Save goals to CSV file"""
+    """Save goals to the goal store"""
     if not all_goals:
         return
     
-    csv_file = "nhl_goals.csv"
     goals_df = pd.DataFrame([goal.__dict__ for goal in all_goals])
     
-    if append and os.path.exists(csv_file):
-        goals_df.to_csv(csv_file, mode='a', header=False, index=False)
+    if append:
+        goal_store.append_goals(goals_df, 'goals')
     else:
-        goals_df.to_csv(csv_file, index=False)
+        goal_store.write_goals(goals_df, 'goals')
     
-    print(f"Saved {len(all_goals)} goals to {csv_file}")
+    print(f"Saved {len(all_goals)} goals")
 
-def orchestrate_season_data_pull(season, existing_df):
-    print(f"Pulling data for season {season}")
+class GoalWriter:
+    """Buffers pulled goals and records their games in the manifest once they are on disk"""
+
+    def __init__(self, manifest, batch_size=50):
+        self.manifest = manifest
+        self.batch_size = batch_size
+        self.buffer = []
+        self.pending_games = []
+        self.total = 0
+
+    def add(self, game_id, game_date, goals):
+        self.buffer.extend(goals)
+        self.pending_games.append((game_id, game_date))
+        self.total += len(goals)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
 
+    def flush(self):
+        save_goals_batch(self.buffer, append=True)
+        # Only mark games complete after their goals have been written
+        for game_id, game_date in self.pending_games:
+            self.manifest.mark_completed(game_id, game_date)
+        if self.manifest.pending:
+            self.manifest.save()
+        self.buffer = []
+        self.pending_games = []
+
+def get_season_date_range(season):
+    """Return the (start, end) schedule dates to scan for a season"""
     # assumes that we should start looking for games in a season from 08/01 to 06/01 of the next year
     # the date format is 2023-11-10 and the season is 20232024
-    start_date = f"{str(season)[:4]}-08-01"
-    end_date = f"{str(season)[4:8]}-06-01"
+    return f"{str(season)[:4]}-08-01", f"{str(season)[4:8]}-06-01"
+
+def orchestrate_season_data_pull(season, manifest, legacy_processed=frozenset()):
+    print(f"Pulling data for season {season}")
+
+    if manifest.is_season_complete(season):
+        print(f"Season {season} already complete, skipping.")
+        return 0
+
+    season_start, end_date = get_season_date_range(season)
+    start_date = manifest.resume_date(season, season_start)
     print(f"Start date: {start_date}, End date: {end_date}")
     current_date = start_date
-    goals = []
+    writer = GoalWriter(manifest)
+    outstanding_games = 0
     
-    # Get processed games to skip
-    processed_games = get_processed_games(existing_df)
     while current_date <= end_date:
         schedule, next_start_date = get_schedule_on_date(current_date)
+        if schedule is None:
+            outstanding_games += 1
         if not schedule:
             print(f"No games found for date {current_date}")
             # Use datetime for proper date increment
@@ -187,29 +287,27 @@ def orchestrate_season_data_pull(season, existing_df):
                 print(f"Game ID not found for game on {current_date}, skipping.")
                 continue
             
-            # Check if this game might already be processed
-            # Create identifier similar to how we check in get_processed_games
-            game_date = game.get("gameDate", current_date)
-            home_score = game.get("homeTeam", {}).get("score", 0)
-            away_score = game.get("awayTeam", {}).get("score", 0)
-            
-            # Check both possible combinations since we don't know which team scored
-            game_identifier1 = f"{game_date}_{home_score}_{away_score}"
-            game_identifier2 = f"{game_date}_{away_score}_{home_score}"
-            
-            if game_identifier1 in processed_games or game_identifier2 in processed_games:
-                print(f"Game {game_id} already processed, skipping.")
+            if manifest.is_completed(game_id):
+                continue
+            if is_legacy_processed(game, legacy_processed, current_date):
+                # Record it so the watermark and resume date account for it
+                manifest.mark_completed(game_id, game.get("gameDate", current_date))
+                continue
+
+            if not is_game_final(game):
+                # Picked up by a later run once the game is over
+                manifest.mark_outstanding(game_id, game.get("gameDate", current_date))
+                outstanding_games += 1
                 continue
             
             game_goals = get_goals_for_game(game_id)
+            if game_goals is None:
+                manifest.mark_outstanding(game_id, game.get("gameDate", current_date))
+                outstanding_games += 1
+                continue
             if game_goals:
                 print(f"Found {len(game_goals)} goals for game {game_id}")
-                goals.extend(game_goals)
-                
-                # Save progress every 10 games to avoid losing data
-                if len(goals) >= 50:  # Save after every 50 goals
-                    save_goals_batch(goals, append=True)
-                    goals = []  # Clear the list after saving
+            writer.add(game_id, game.get("gameDate", current_date), game_goals)
 
         # Use next_start_date if available, otherwise increment by 1 day
         if next_start_date:
@@ -224,39 +322,43 @@ def orchestrate_season_data_pull(season, existing_df):
                 break
     
     # Save any remaining goals
-    if goals:
-        save_goals_batch(goals, append=True)
+    writer.flush()
+
+    if outstanding_games == 0 and end_date < datetime.now().strftime("%Y-%m-%d"):
+        manifest.mark_season_complete(season)
+        manifest.save()
     
-    return goals
+    return writer.total
 
 def main():
-    # Load existing data to check what's already been processed
-    existing_df = load_existing_data()
+    # Load the manifest of completed games so only new games are pulled
+    manifest, legacy_processed = load_manifest()
     
-    # Process seasons sequentially to avoid overwhelming the API
-    # Recent seasons (2023+) seem to have more data and cause issues when run in parallel
     total_new_goals = 0
     
-    for season in seasons:
-        print(f"\n--- Processing season {season} ---")
-        try:
-            season_goals = orchestrate_season_data_pull(season, existing_df)
-            total_new_goals += len(season_goals)
-            print(f"Completed season {season}: {len(season_goals)} new goals")
-        except Exception as e:
-            print(f"Error processing season {season}: {e}")
-            continue
+    if '--async' in sys.argv:
+        # Concurrent ingestion: bounded worker pool sharing a token-bucket rate limiter
+        from async_ingest import run_async_ingestion
+        total_new_goals = asyncio.run(run_async_ingestion(seasons, manifest, legacy_processed))
+    else:
+        # Process seasons sequentially to avoid overwhelming the API
+        # Recent seasons (2023+) seem to have more data and cause issues when run in parallel
+        for season in seasons:
+            print(f"\n--- Processing season {season} ---")
+            try:
+                season_goals = orchestrate_season_data_pull(season, manifest, legacy_processed)
+                total_new_goals += season_goals
+                print(f"Completed season {season}: {season_goals} new goals")
+            except Exception as e:
+                print(f"Error processing season {season}: {e}")
+                continue
 
     print(f"\nProcessing complete!")
     print(f"Total new goals added: {total_new_goals}")
     
-    # Load final CSV to get total count
-    if os.path.exists("nhl_goals.csv"):
-        final_df = pd.read_csv("nhl_goals.csv")
-        print(f"Total goals in nhl_goals.csv: {len(final_df)}")
-    
-    print("File saved as nhl_goals.csv in root directory")
-    print("Remember to manually move to data/ directory when ready")
+    # Merge the per-batch part files written during the pull
+    goal_store.compact_stage('goals')
+    print(f"Total goals stored: {goal_store.count_goals('goals')}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,139 @@
+"""
+On-disk index of the NHL regular season schedule for date/team -> game lookups.
+
+One /schedule/{date} response covers a whole game week, so the index records every day of
+each response it fetches (days without regular season games are recorded as empty) and only
+requests dates it has not seen. Backfills resolve all of their (game_date, team_id) pairs
+against games_frame() with a single merge, which costs about one request per week of history.
+The index is a snapshot in cache/schedule_index.json plus a journal of the days fetched since
+(see journal.py). Only settled days are persisted: days before today, or days whose games are
+all final. Later days are used for the current run only, so games that are postponed or
+rescheduled after they were fetched are looked up again on the next run.
+"""
+import json
+import os
+import time
+from datetime import date as calendar_date
+
+import pandas as pd
+import requests
+
+from journal import Journal, atomic_write
+from pull_data import API_BASE_URL, is_game_final
+
+INDEX_FILE = os.path.join('cache', 'schedule_index.json')
+REQUEST_DELAY = 0.5  # seconds between schedule requests
+
+
+class ScheduleIndex:
+    """Regular season games per schedule day, as [game_id, home_team_id, away_team_id]"""
+
+    def __init__(self, path=INDEX_FILE, days=None):
+        self.path = path
+        self.days = days or {}
+        # Days fetched this run that are not settled yet, kept out of the snapshot and journal
+        self.unsettled = set()
+        self.journal = Journal(f"{path}.journal")
+
+    @classmethod
+    def load(cls, path=INDEX_FILE):
+        """Load the snapshot and replay the journal (an empty index if neither exists yet)"""
+        index = cls(path)
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    index.days = json.load(f).get("days", {})
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable schedule index {path}: {e}")
+        index.journal.snapshot_size = len(index.days)
+        for record in index.journal.replay():
+            index.days[record["date"]] = record["games"]
+        return index
+
+    def covers(self, date):
+        return date in self.days
+
+    def add_week(self, date, data, today=None):
+        """
+        Record every day of a schedule response fetched for date, journaling the settled ones
+        (before today, or with games that are all final)
+        """
+        today = today or calendar_date.today().isoformat()
+        week = {}
+        settled = {}
+        for game_day in data.get("gameWeek", []):
+            games = [game for game in game_day.get("games", []) if game.get("gameType", 0) == 2]  # Regular season only
+            week[game_day["date"]] = [
+                [game["id"], game.get("homeTeam", {}).get("id"), game.get("awayTeam", {}).get("id")]
+                for game in games
+            ]
+            settled[game_day["date"]] = game_day["date"] < today or (
+                bool(games) and all(is_game_final(game) for game in games))
+        # Mark the requested date as seen even if the response did not include it
+        week.setdefault(date, [])
+        settled.setdefault(date, date < today)
+        self.days.update(week)
+        self.unsettled.update(day for day in week if not settled[day])
+        self.unsettled.difference_update(day for day in week if settled[day])
+        self.journal.append(*({"date": day, "games": games} for day, games in week.items() if settled[day]))
+        if self.journal.should_compact():
+            self.save()
+
+    def fetch_week(self, date):
+        """Fetch the schedule week starting at date; returns False if the request failed"""
+        url = f"{API_BASE_URL}/schedule/{date}"
+        try:
+            time.sleep(REQUEST_DELAY)  # Rate limiting
+            response = requests.get(url, timeout=30)
+            if response.status_code != 200:
+                print(f"Failed to fetch schedule for {date}: {response.status_code}")
+                return False
+            self.add_week(date, response.json())
+            return True
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"Error fetching schedule for {date}: {e}")
+            return False
+
+    def ensure(self, dates, max_failures=20):
+        """
+        Fetch the weeks needed to cover dates (YYYY-MM-DD strings).
+
+        Dates are walked in order, so each fetched week also covers the dates after it.
+        Stops after max_failures consecutive failed requests.
+
+        Returns:
+            tuple: (weeks fetched, dates left uncovered)
+        """
+        fetched = 0
+        failures = 0
+        missing = [date for date in sorted(set(dates)) if not self.covers(date)]
+        print(f"Schedule index covers {len(self.days):,} days, {len(missing):,} game dates still to look up")
+        for date in missing:
+            if self.covers(date):
+                continue
+            if self.fetch_week(date):
+                fetched += 1
+                failures = 0
+                print(f"  📅 Fetched schedule week of {date} ({fetched} weeks)")
+            else:
+                failures += 1
+                if failures >= max_failures:
+                    print(f"Too many consecutive failures ({max_failures}), stopping to avoid issues")
+                    break
+        return fetched, sum(not self.covers(date) for date in missing)
+
+    def games_frame(self):
+        """One row per team per game: game_date, team_id, game_id, home_team"""
+        rows = []
+        for date, games in self.days.items():
+            for game_id, home_team, away_team in games:
+                rows.append((date, home_team, game_id, home_team))
+                rows.append((date, away_team, game_id, home_team))
+        games = pd.DataFrame(rows, columns=['game_date', 'team_id', 'game_id', 'home_team'])
+        # A team plays at most once a day; keep the first game like the old per-date search did
+        return games.dropna(subset=['team_id']).drop_duplicates(['game_date', 'team_id'])
+
+    def save(self):
+        """Compact the journal into a new snapshot (written atomically)"""
+        days = {day: games for day, games in sorted(self.days.items()) if day not in self.unsettled}
+        self.journal.compact(lambda: atomic_write(self.path, lambda f: json.dump({"days": days}, f)), len(days))
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Deep-zoom tile pyramid of the NHL star chart.
+
+create_4k_star_chart rasterizes the whole chart in one matplotlib figure, so its memory
+grows with the pixel count and it cannot go much past 4K. This renders the same chart
+(StarChartGenerator's layout, fisheye projection and drawing) as a pyramid of fixed-size
+tiles instead: every z/x/y tile is its own small figure looking at its slice of the chart,
+so memory per tile is constant however deep the pyramid goes. Tiles are rendered in
+parallel worker processes (TILE_WORKERS, default the CPU count).
+
+Stars are culled per tile with a quadtree index: sorted by the Morton code of the tile
+they fall in at the deepest zoom, the stars of any tile at any zoom are one contiguous
+range found with two binary searches. Tiles outside the chart circle are written from a
+single pre-rendered background tile.
+
+Stars and lines keep the 4K chart's pixel size once a zoom level is more detailed than the
+4K chart (and shrink with it below that); galaxy labels scale with the zoom like the rest
+of the map. The title and subtitle are not part of the tiles.
+
+Output is an XYZ directory (z/x/y.png, y pointing down, for Leaflet/OpenLayers) or, with
+--dzi, a Deep Zoom image for OpenSeadragon. TILE_MAX_ZOOM=7 with 256 px tiles (TILE_SIZE)
+gives a 32768 px wide chart.
+"""
+import io
+import logging
+import multiprocessing
+import os
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from matplotlib.figure import Figure
+from PIL import Image
+
+from create_4k_star_chart import StarChartGenerator
+
+logger = logging.getLogger(__name__)
+
+TILE_MAX_ZOOM = int(os.environ.get('TILE_MAX_ZOOM', 7))
+TILE_SIZE = int(os.environ.get('TILE_SIZE', 256))
+TILE_OUTPUT_DIR = os.environ.get('TILE_OUTPUT_DIR', 'star_chart_tiles')
+
+# Fraction of the 4K figure height taken by the chart axes (subplots_adjust top - bottom)
+CHART_AXES_FRACTION = 0.84
+
+# Largest star marker size (points^2) in StarChartGenerator.layout_chart
+MAX_STAR_SIZE = 4.0
+
+
+def _part1by1(values):
+    """Spread the bits of 32-bit integers apart (bit i moves to bit 2i)"""
+    values = values.astype(np.uint64) & np.uint64(0xFFFFFFFF)
+    for shift, mask in ((16, 0x0000FFFF0000FFFF), (8, 0x00FF00FF00FF00FF), (4, 0x0F0F0F0F0F0F0F0F),
+                        (2, 0x3333333333333333), (1, 0x5555555555555555)):
+        values = (values | (values << np.uint64(shift))) & np.uint64(mask)
+    return values
+
+
+def morton_codes(tile_x, tile_y):
+    """Z-order codes of tile coordinates (x in the even bits, y in the odd bits)"""
+    return _part1by1(np.asarray(tile_x)) | (_part1by1(np.asarray(tile_y)) << np.uint64(1))
+
+
+class TileIndex:
+    """Quadtree over the chart's stars: Morton-sorted star indices at max_zoom"""
+
+    def __init__(self, x, y, radius, max_zoom):
+        self.radius = radius
+        self.max_zoom = max_zoom
+        n_tiles = 2 ** max_zoom
+        tile_x = np.clip(((x + radius) / (2 * radius) * n_tiles).astype(np.int64), 0, n_tiles - 1)
+        tile_y = np.clip(((radius - y) / (2 * radius) * n_tiles).astype(np.int64), 0, n_tiles - 1)
+        codes = morton_codes(tile_x, tile_y)
+        self.order = np.argsort(codes, kind='stable')
+        self.codes = codes[self.order]
+
+    def stars_in_tile(self, z, x, y):
+        """Indices of the stars inside tile z/x/y (in Morton order)"""
+        n_tiles = 2 ** z
+        if not (0 <= x < n_tiles and 0 <= y < n_tiles):
+            return np.array([], dtype=np.int64)
+        shift = np.uint64(2 * (self.max_zoom - z))
+        prefix = morton_codes(x, y)
+        start, end = np.searchsorted(self.codes, [prefix << shift, (prefix + np.uint64(1)) << shift])
+        return self.order[start:end]
+
+
+class TileRenderer:
+    """Renders single tiles of a laid-out chart"""
+
+    def __init__(self, generator, chart, max_zoom=TILE_MAX_ZOOM, tile_size=TILE_SIZE):
+        self.generator = generator
+        self.chart = chart
+        self.max_zoom = max_zoom
+        self.tile_size = tile_size
+        self.radius = generator.radius
+        self.index = TileIndex(chart['x'], chart['y'], self.radius, max_zoom)
+        # Pixels per chart unit of the 4K chart
+        self.chart_pixels_per_unit = generator.height * CHART_AXES_FRACTION / (2 * self.radius)
+
+    def tile_bounds(self, z, x, y):
+        """(x0, x1, y0, y1) chart coordinates covered by tile z/x/y"""
+        span = 2 * self.radius / 2 ** z
+        x0 = -self.radius + x * span
+        y1 = self.radius - y * span
+        return x0, x0 + span, y1 - span, y1
+
+    def scales(self, z):
+        """(pixels per chart unit, star/line scale, label scale) at zoom z"""
+        pixels_per_unit = self.tile_size * 2 ** z / (2 * self.radius)
+        magnification = pixels_per_unit / self.chart_pixels_per_unit
+        return pixels_per_unit, min(1.0, magnification), magnification
+
+    def _label_boxes(self, z):
+        """Generous chart-coordinate boxes around the galaxy labels at zoom z"""
+        pixels_per_unit, _, label_scale = self.scales(z)
+        boxes = []
+        for galaxy, info in self.chart['galaxy_info'].items():
+            font_size = max(8, min(14, int(info['size'] * 0.3))) * label_scale
+            font_pixels = font_size * self.generator.dpi / 72
+            half_width = (len(str(galaxy)) * 0.75 * font_pixels + 4 * label_scale) / pixels_per_unit
+            half_height = font_pixels / pixels_per_unit
+            center_x, center_y = info['bounding_center']
+            boxes.append((center_x - half_width, center_x + half_width, center_y - half_height, center_y + half_height))
+        return boxes
+
+    def is_background(self, z, x, y):
+        """True if tile z/x/y has nothing on it (outside the chart circle and every label)"""
+        x0, x1, y0, y1 = self.tile_bounds(z, x, y)
+        pixels_per_unit, line_scale, _ = self.scales(z)
+        # Distance from the chart center to the nearest point of the tile
+        nearest_x = min(max(0.0, x0), x1)
+        nearest_y = min(max(0.0, y0), y1)
+        margin = 4 * line_scale * self.generator.dpi / 72 / pixels_per_unit
+        if np.hypot(nearest_x, nearest_y) <= self.radius * 0.9 + margin:
+            return False
+        return not any(bx0 < x1 and bx1 > x0 and by0 < y1 and by1 > y0
+                       for bx0, bx1, by0, by1 in self._label_boxes(z))
+
+    def visible_stars(self, z, x, y):
+        """Stars inside tile z/x/y or close enough to its edge for their marker to reach in"""
+        x0, x1, y0, y1 = self.tile_bounds(z, x, y)
+        pixels_per_unit, star_scale, _ = self.scales(z)
+        margin = np.sqrt(MAX_STAR_SIZE) * star_scale * self.generator.dpi / 72 / pixels_per_unit
+        candidates = np.concatenate([self.index.stars_in_tile(z, x + dx, y + dy)
+                                     for dx in (-1, 0, 1) for dy in (-1, 0, 1)])
+        star_x, star_y = self.chart['x'][candidates], self.chart['y'][candidates]
+        inside = ((star_x >= x0 - margin) & (star_x <= x1 + margin) &
+                  (star_y >= y0 - margin) & (star_y <= y1 + margin))
+        # Drawing order of the full chart, so overlapping stars stack the same way
+        return np.sort(candidates[inside])
+
+    def render(self, z, x, y):
+        """PNG bytes of tile z/x/y"""
+        dpi = self.generator.dpi
+        x0, x1, y0, y1 = self.tile_bounds(z, x, y)
+        _, scale, label_scale = self.scales(z)
+
+        fig = Figure(figsize=(self.tile_size / dpi, self.tile_size / dpi), dpi=dpi)
+        fig.patch.set_facecolor(self.generator.bg_color)
+        ax = fig.add_axes([0, 0, 1, 1])
+        ax.set_facecolor(self.generator.bg_color)
+        ax.set_xlim(x0, x1)
+        ax.set_ylim(y0, y1)
+        ax.axis('off')
+        self.generator.draw_chart(ax, self.chart, stars=self.visible_stars(z, x, y),
+                                  star_scale=scale, line_scale=scale, label_scale=label_scale)
+
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png', dpi=dpi, facecolor=self.generator.bg_color)
+        return buffer.getvalue()
+
+    def background(self):
+        """PNG bytes of an empty tile"""
+        buffer = io.BytesIO()
+        Image.new('RGB', (self.tile_size, self.tile_size), self.generator.bg_color).save(buffer, format='PNG')
+        return buffer.getvalue()
+
+
+_tile_renderer = None
+
+
+def init_tile_worker(renderer):
+    global _tile_renderer
+    # Fonts registered in the parent are not known to a spawned process
+    renderer.generator.register_custom_font()
+    _tile_renderer = renderer
+
+
+def render_tile_batch(tiles, renderer=None):
+    """Render (z, x, y, path) tiles, copying the background tile for empty ones"""
+    if renderer is None:
+        renderer = _tile_renderer
+    background = None
+    rendered = 0
+    for z, x, y, path in tiles:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if renderer.is_background(z, x, y):
+            if background is None:
+                background = renderer.background()
+            data = background
+        else:
+            data = renderer.render(z, x, y)
+            rendered += 1
+        with open(path, 'wb') as f:
+            f.write(data)
+    return rendered
+
+
+def _tile_path(output_dir, tile_format, tile_size, z, x, y):
+    if tile_format == 'dzi':
+        # Deep Zoom levels count from a 1 px image, so zoom 0 (one full tile) is level log2(tile_size)
+        level = int(np.log2(tile_size)) + z
+        return os.path.join(output_dir, 'star_chart_files', str(level), f'{x}_{y}.png')
+    return os.path.join(output_dir, str(z), str(x), f'{y}.png')
+
+
+def _write_dzi_descriptor(output_dir, renderer):
+    """star_chart.dzi plus the Deep Zoom levels smaller than one tile (from the zoom 0 tile)"""
+    tile_size = renderer.tile_size
+    full_size = tile_size * 2 ** renderer.max_zoom
+    with open(os.path.join(output_dir, 'star_chart.dzi'), 'w') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                f'<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" Format="png" Overlap="0" TileSize="{tile_size}">\n'
+                f'  <Size Width="{full_size}" Height="{full_size}"/>\n'
+                '</Image>\n')
+    top_level = int(np.log2(tile_size))
+    with Image.open(os.path.join(output_dir, 'star_chart_files', str(top_level), '0_0.png')) as image:
+        image = image.convert('RGB')
+        for level in range(top_level - 1, -1, -1):
+            path = os.path.join(output_dir, 'star_chart_files', str(level), '0_0.png')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            image.resize((2 ** level, 2 ** level), Image.LANCZOS).save(path)
+
+
+def create_tile_pyramid(specific_file=None, output_dir=TILE_OUTPUT_DIR, tile_format='xyz',
+                        max_zoom=TILE_MAX_ZOOM, tile_size=TILE_SIZE, n_workers=None, generator=None):
+    """
+    Render the star chart as a tile pyramid.
+
+    Args:
+        specific_file: Clustering file to chart (default: the latest)
+        output_dir: Directory for the pyramid (replaced if it exists)
+        tile_format: 'xyz' (z/x/y.png) or 'dzi' (star_chart.dzi + star_chart_files/)
+        max_zoom: Deepest zoom level; the full chart is tile_size * 2^max_zoom px wide
+        tile_size: Tile width and height in pixels (a power of two)
+        n_workers: Worker processes (default: TILE_WORKERS environment variable, else the CPU count)
+        generator: StarChartGenerator to take dpi, colors and fonts from
+
+    Returns:
+        str: Path of the pyramid (the .dzi file for Deep Zoom)
+    """
+    if tile_format not in ('xyz', 'dzi'):
+        raise ValueError(f"Unknown tile format: {tile_format} (expected xyz or dzi)")
+    if tile_size & (tile_size - 1):
+        raise ValueError(f"Tile size must be a power of two, got {tile_size}")
+    if n_workers is None:
+        n_workers = int(os.environ.get('TILE_WORKERS', os.cpu_count() or 1))
+    generator = generator or StarChartGenerator()
+
+    df = generator.load_clustering_data(specific_file)
+    chart = generator.layout_chart(df)
+    renderer = TileRenderer(generator, chart, max_zoom, tile_size)
+
+    if os.path.exists(output_dir):
+        shutil.rmtree(output_dir)
+    tiles = [(z, x, y, _tile_path(output_dir, tile_format, tile_size, z, x, y))
+             for z in range(max_zoom + 1) for x in range(2 ** z) for y in range(2 ** z)]
+    full_size = tile_size * 2 ** max_zoom
+    logger.info(f"Rendering {len(tiles)} tiles (zoom 0-{max_zoom}, {full_size}x{full_size} px) "
+                f"for {len(chart['x'])} stars...")
+
+    # Small batches keep the workers busy while amortizing the task overhead
+    batch_size = 32
+    batches = [tiles[i:i + batch_size] for i in range(0, len(tiles), batch_size)]
+    rendered = 0
+    if n_workers > 1 and len(batches) > 1:
+        logger.info(f"Using {n_workers} worker processes")
+        with ProcessPoolExecutor(max_workers=min(n_workers, len(batches)),
+                                 mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=init_tile_worker, initargs=(renderer,)) as executor:
+            for done, count in enumerate(executor.map(render_tile_batch, batches), 1):
+                rendered += count
+                if done % 50 == 0 or done == len(batches):
+                    logger.info(f"Progress: {min(done * batch_size, len(tiles))}/{len(tiles)} tiles")
+    else:
+        for done, batch in enumerate(batches, 1):
+            rendered += render_tile_batch(batch, renderer)
+            if done % 50 == 0 or done == len(batches):
+                logger.info(f"Progress: {min(done * batch_size, len(tiles))}/{len(tiles)} tiles")
+    logger.info(f"Rendered {rendered} tiles, {len(tiles) - rendered} background tiles")
+
+    if tile_format == 'dzi':
+        _write_dzi_descriptor(output_dir, renderer)
+        return os.path.join(output_dir, 'star_chart.dzi')
+    return output_dir
+
+
+def main():
+    """Render the star chart tile pyramid"""
+    high_quality = '--high-quality' in sys.argv or '--hq' in sys.argv
+    tile_format = 'dzi' if '--dzi' in sys.argv else 'xyz'
+    generator = StarChartGenerator(dpi=300 if high_quality else 200)
+
+    try:
+        output_path = create_tile_pyramid(tile_format=tile_format, generator=generator)
+    except Exception as e:
+        print(f"❌ Error creating star chart tiles: {e}")
+        return 1
+
+    full_size = TILE_SIZE * 2 ** TILE_MAX_ZOOM
+    print(f"✅ Star chart tile pyramid created ({full_size}x{full_size} px, zoom 0-{TILE_MAX_ZOOM})")
+    if tile_format == 'dzi':
+        print(f"🔭 Deep Zoom image: {output_path} (open with OpenSeadragon)")
+    else:
+        print(f"🗺️  XYZ tiles: {output_path}/{{z}}/{{x}}/{{y}}.png")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,239 @@
+"""
+Vectorized star layout for the static constellation map and the 4K star chart.
+
+Both lay goals out the same way: galaxies in rings, constellations (clusters) around their
+galaxy's center, solar systems jittered around their constellation and stars in a small
+pattern around their solar system. The original implementation walked the hierarchy with
+nested DataFrame filters and positioned each star in Python; layout_stars does one groupby
+over the hierarchy and computes every position with array operations.
+
+Random draws come from the global numpy RNG in exactly the order the nested loops made
+them (per solar system: its x/y offset, then an x/y jitter for each star of a system with
+more than one star), so seeded layouts are unchanged. Run this file to check parity with
+the per-star helpers of StaticConstellationMapper and StarChartGenerator.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+HIERARCHY_LEVELS = ['level_0_cluster', 'level_1_cluster', 'level_2_cluster']
+
+
+@dataclass
+class LayoutParams:
+    """Pattern sizes for one map style"""
+    constellation_radius: int  # Outer radius of the constellation spiral
+    constellation_inner_radius: int  # Inner radius of the constellation spiral
+    solar_system_offset: tuple  # (low, high) of the uniform offset of a solar system from its constellation
+    star_step: int  # Offset of the 2nd/3rd star of a 2-3 star system
+    star_ring_radius: int  # Ring radius for 4-8 star systems
+    star_spiral_radius: int  # Outer radius of the spiral for larger systems
+    star_jitter: tuple  # (low, high) of the uniform jitter of each star
+
+
+@dataclass
+class StarLayout:
+    """Star positions in hierarchy traversal order"""
+    order: np.ndarray  # Row positions in the input frame
+    galaxy: np.ndarray  # Galaxy number (0.. in traversal order) of each star
+    constellation: np.ndarray  # Constellation number of each star
+    solar_system: np.ndarray  # Solar system number of each star
+    x: np.ndarray
+    y: np.ndarray
+
+
+def _group_numbers(keys):
+    """Consecutive group numbers for sorted keys"""
+    numbers = np.zeros(len(keys), dtype=np.int64)
+    if len(keys):
+        numbers[1:] = np.cumsum(keys[1:] != keys[:-1])
+    return numbers
+
+
+def hierarchy_order(df, levels=HIERARCHY_LEVELS):
+    """
+    Traverse the hierarchy like nested loops over unique() values at each level would.
+
+    Returns:
+        tuple: (row positions in traversal order, list of group numbers per level for those rows)
+    """
+    # ngroup(sort=False) numbers groups by first appearance, which is what unique() returns
+    keys = [df.groupby(levels[:depth + 1], sort=False, dropna=False, observed=True).ngroup().to_numpy()
+            for depth in range(len(levels))]
+    order = np.lexsort([np.arange(len(df))] + keys[::-1])
+    return order, [_group_numbers(key[order]) for key in keys]
+
+
+def _member_index(parents):
+    """Index of each group within its parent and the parent's group count (parents sorted)"""
+    starts = np.flatnonzero(np.r_[True, parents[1:] != parents[:-1]]) if len(parents) else np.array([], dtype=int)
+    sizes = np.diff(np.r_[starts, len(parents)])
+    index = np.arange(len(parents)) - np.repeat(starts, sizes)
+    return index, np.repeat(sizes, sizes)
+
+
+def constellation_offsets(index, count, params):
+    """Offset of constellation index of count within its galaxy"""
+    radius = params.constellation_radius
+    dx = np.zeros(len(index))
+    dy = np.zeros(len(index))
+    for n in np.unique(count):
+        rows = count == n
+        if n == 1:
+            continue
+        if n <= 4:
+            table_x = np.array([0, radius // 2, 0, -radius // 2])
+            table_y = np.array([0, 0, radius // 2, 0])
+        else:
+            angles = np.linspace(0, 2 * np.pi, n, endpoint=False)
+            radii = np.linspace(params.constellation_inner_radius, radius, n)
+            table_x = radii * np.cos(angles)
+            table_y = radii * np.sin(angles)
+        dx[rows] = table_x[index[rows]]
+        dy[rows] = table_y[index[rows]]
+    return dx, dy
+
+
+def star_offsets(index, count, params):
+    """Offset of star index of count within its solar system"""
+    dx = np.zeros(len(index))
+    dy = np.zeros(len(index))
+    for n in np.unique(count):
+        rows = count == n
+        if n == 1:
+            continue
+        if n <= 3:
+            table_x = np.array([0, params.star_step, 0])
+            table_y = np.array([0, 0, params.star_step])
+        elif n <= 8:
+            angles = np.linspace(0, 2 * np.pi, n, endpoint=False)
+            table_x = params.star_ring_radius * np.cos(angles)
+            table_y = params.star_ring_radius * np.sin(angles)
+        else:
+            angles = np.linspace(0, 4 * np.pi, n)  # Multiple spiral turns
+            radii = np.linspace(1, params.star_spiral_radius, n)
+            table_x = radii * np.cos(angles)
+            table_y = radii * np.sin(angles)
+        dx[rows] = table_x[index[rows]]
+        dy[rows] = table_y[index[rows]]
+    return dx, dy
+
+
+def layout_stars(df, galaxy_positions, params, levels=HIERARCHY_LEVELS):
+    """
+    Position every goal of a hierarchy mapping.
+
+    Args:
+        df: Hierarchy mapping (level_0_cluster .. level_2_cluster columns)
+        galaxy_positions: Galaxy name -> (x, y) center, already laid out
+        params: LayoutParams of the map style
+        levels: Galaxy, constellation and solar system columns
+
+    Returns:
+        StarLayout: Positions in traversal order (galaxies, then constellations, then
+        solar systems in order of first appearance; stars in row order)
+    """
+    order, (galaxy, constellation, solar_system) = hierarchy_order(df, levels)
+
+    # One entry per constellation / solar system, in traversal order
+    constellation_starts = np.flatnonzero(np.r_[True, constellation[1:] != constellation[:-1]])
+    system_starts = np.flatnonzero(np.r_[True, solar_system[1:] != solar_system[:-1]])
+    system_sizes = np.diff(np.r_[system_starts, len(order)])
+
+    galaxy_names = df[levels[0]].to_numpy()[order[constellation_starts]]
+    centers = np.array([galaxy_positions[name] for name in galaxy_names], dtype=float).reshape(-1, 2)
+    index, count = _member_index(galaxy[constellation_starts])
+    dx, dy = constellation_offsets(index, count, params)
+    constellation_x = np.where(count == 1, centers[:, 0], centers[:, 0] + dx)
+    constellation_y = np.where(count == 1, centers[:, 1], centers[:, 1] + dy)
+
+    # Draw all random numbers at once, in the order the per-system loop drew them
+    draws_per_system = 2 + np.where(system_sizes > 1, 2 * system_sizes, 0)
+    draw_starts = np.cumsum(draws_per_system) - draws_per_system
+    uniform = np.random.random_sample(int(draws_per_system.sum()))
+    low, high = params.solar_system_offset
+    system_constellation = constellation[system_starts]
+    # Same arithmetic as np.random.uniform(low, high)
+    system_x = constellation_x[system_constellation] + (low + (high - low) * uniform[draw_starts])
+    system_y = constellation_y[system_constellation] + (low + (high - low) * uniform[draw_starts + 1])
+
+    index, count = _member_index(solar_system)
+    dx, dy = star_offsets(index, count, params)
+    single = count == 1
+    # Singleton systems draw no jitter (their index is a placeholder)
+    jitter_draws = np.where(single, 0, np.repeat(draw_starts + 2, system_sizes) + 2 * index)
+    low, high = params.star_jitter
+    jitter_x = low + (high - low) * uniform[jitter_draws]
+    jitter_y = low + (high - low) * uniform[jitter_draws + 1]
+    star_x = system_x[solar_system]
+    star_y = system_y[solar_system]
+    x = np.where(single, star_x, star_x + dx + jitter_x)
+    y = np.where(single, star_y, star_y + dy + jitter_y)
+
+    return StarLayout(order=order, galaxy=galaxy, constellation=constellation, solar_system=solar_system, x=x, y=y)
+
+
+def reference_layout(df, galaxy_positions, constellation_positions, star_positions, solar_system_offset):
+    """Per-star positions from the original nested loops (for the parity check)"""
+    positions = []
+    for galaxy in df['level_0_cluster'].unique().tolist():
+        galaxy_data = df[df['level_0_cluster'] == galaxy]
+        constellations = galaxy_data['level_1_cluster'].unique()
+        centers = constellation_positions(galaxy_positions[galaxy], constellations)
+        for constellation in constellations:
+            constellation_data = galaxy_data[galaxy_data['level_1_cluster'] == constellation]
+            for solar_system in constellation_data['level_2_cluster'].unique():
+                solar_system_data = constellation_data[constellation_data['level_2_cluster'] == solar_system]
+                ss_center = (centers[constellation][0] + np.random.uniform(*solar_system_offset),
+                             centers[constellation][1] + np.random.uniform(*solar_system_offset))
+                stars = solar_system_data.index.tolist()
+                star_map = star_positions(ss_center, stars)
+                positions.extend((star, *star_map[star]) for star in stars)
+    return positions
+
+
+if __name__ == "__main__":
+    import time
+
+    from create_4k_star_chart import StarChartGenerator
+    from mapping_static import StaticConstellationMapper
+
+    # Synthetic hierarchy with a realistic spread of system sizes (including 1-3 star systems)
+    rng = np.random.default_rng(0)
+    n = 20000
+    galaxy_ids = rng.integers(0, 12, n)
+    cluster_ids = galaxy_ids * 10 + rng.integers(0, rng.integers(1, 9), n)
+    system_ids = cluster_ids * 100 + np.minimum(rng.geometric(0.08, n), 60)
+    df = pd.DataFrame({
+        'level_0_cluster': [f"galaxy {g}" for g in galaxy_ids],
+        'level_1_cluster': [f"cluster {c}" for c in cluster_ids],
+        'level_2_cluster': [f"system {s}" for s in system_ids],
+    })
+
+    mapper = StaticConstellationMapper(output_dir='/tmp')
+    chart = StarChartGenerator()
+    styles = [
+        ('static map', mapper.create_dense_galaxy_layout, mapper.create_tight_constellation_positions,
+         mapper.create_compact_star_positions, mapper.layout_params()),
+        ('4K chart', chart.create_galaxy_layout, chart.create_constellation_positions,
+         chart.create_star_positions, chart.layout_params()),
+    ]
+    for name, galaxy_layout, constellation_positions, star_positions, params in styles:
+        np.random.seed(42)
+        galaxy_positions = galaxy_layout(df['level_0_cluster'].unique().tolist())
+        start = time.perf_counter()
+        expected = reference_layout(df, galaxy_positions, constellation_positions, star_positions,
+                                    params.solar_system_offset)
+        reference_time = time.perf_counter() - start
+
+        np.random.seed(42)
+        galaxy_positions = galaxy_layout(df['level_0_cluster'].unique().tolist())
+        start = time.perf_counter()
+        layout = layout_stars(df, galaxy_positions, params)
+        vectorized_time = time.perf_counter() - start
+
+        assert [star for star, _, _ in expected] == df.index[layout.order].tolist()
+        assert np.array_equal(np.array([x for _, x, _ in expected]), layout.x)
+        assert np.array_equal(np.array([y for _, _, y in expected]), layout.y)
+        print(f"{name}, {n} stars: reference {reference_time:.2f}s, vectorized {vectorized_time:.3f}s - positions identical")
@@ -0,0 +1,434 @@
+"""
+Compact binary data file for the interactive star map pages.
+
+create_star_map_html.py and create_free_roam_html.py used to inline the whole GeoJSON as
+a JavaScript literal, which the browser has to parse before the first paint. Instead they
+now write the features to a binary sidecar next to the page and load it with a small
+loader that fetches and decodes it in a Web Worker:
+
+    NHLMAP01 magic, uint32 header length, uint32 reserved, JSON header (8-byte padded),
+    then 8-byte aligned little-endian buffers the header refers to by offset (from the end
+    of the header) and length:
+
+    strings   one dictionary of every distinct string, as UTF-16 offsets into one UTF-8 text
+    order     uint8 layer of every feature, in the original feature order
+    layers    one per properties.type: float64 x / y coordinates and one column per
+              property, at the feature's row in the layer. Strings (and anything that is
+              not a number, stored as JSON) are int32 indices into the dictionary,
+              integers int32 and other numbers float64. -1 / INT32_NULL / NaN mean null;
+              a property only some features of the layer have gets a uint8 presence mask.
+
+The worker transfers the decoded typed arrays back without copying them, and the page wraps
+them in a FeatureCollection whose features build their geometry and properties from the
+columns on first access, so the map code sees the same features as before (NaN values come
+back as null) without the main thread materializing every object up front.
+featuresOfType(type) returns one layer's features without touching their properties.
+Pages are served from a web server in the default sidecar mode; set
+STAR_MAP_DATA=inline to embed the same bytes base64-encoded in the page, which also
+works when the HTML file is opened directly from disk.
+"""
+import array
+import base64
+import json
+import math
+import os
+import struct
+import sys
+
+STAR_MAP_DATA_MODE = os.environ.get('STAR_MAP_DATA', 'sidecar')
+
+MAGIC = b'NHLMAP01'
+FORMAT_VERSION = 1
+INT32_NULL = -2 ** 31
+DTYPES = {'uint8': 'B', 'int32': 'i', 'uint32': 'I', 'float64': 'd'}
+
+
+class _Buffers:
+    """Collects the binary sections of the file and their header references"""
+
+    def __init__(self):
+        self.parts = []
+        self.size = 0
+
+    def add(self, dtype, values):
+        values = array.array(DTYPES[dtype], values)
+        if sys.byteorder != 'little':
+            values.byteswap()
+        data = values.tobytes()
+        ref = {'dtype': dtype, 'offset': self.size, 'length': len(values)}
+        padding = -len(data) % 8
+        self.parts.append(data + b'\0' * padding)
+        self.size += len(data) + padding
+        return ref
+
+
+def _is_int32(value):
+    return isinstance(value, int) and not isinstance(value, bool) and INT32_NULL < value < 2 ** 31
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _encode_column(values, buffers, intern):
+    present = [value for value in values if value is not None]
+    if present and all(_is_int32(value) for value in present):
+        data = [INT32_NULL if value is None else value for value in values]
+        return 'int32', buffers.add('int32', data)
+    if present and all(_is_number(value) for value in present):
+        data = [math.nan if value is None else float(value) for value in values]
+        return 'float64', buffers.add('float64', data)
+    if all(isinstance(value, str) for value in present):
+        return 'string', buffers.add('int32', [-1 if value is None else intern(value) for value in values])
+    data = [-1 if value is None else intern(json.dumps(value, separators=(',', ':'))) for value in values]
+    return 'json', buffers.add('int32', data)
+
+
+def encode_feature_collection(geojson):
+    """
+    Encode a FeatureCollection of Point features in the star map binary format.
+
+    Returns:
+        bytes: File contents
+    """
+    features = geojson['features']
+    layer_rows = {}
+    layer_index = {}
+    order = []
+    for feature in features:
+        geometry = feature.get('geometry') or {}
+        if geometry.get('type') != 'Point':
+            raise ValueError(f"Only Point features can be encoded, got {geometry.get('type')}")
+        layer = feature.get('properties', {}).get('type')
+        if layer not in layer_index:
+            layer_index[layer] = len(layer_index)
+            layer_rows[layer] = []
+        order.append(layer_index[layer])
+        layer_rows[layer].append(feature)
+    if len(layer_index) > 255:
+        raise ValueError("Too many feature types for the star map format")
+
+    strings = {}
+
+    def intern(value):
+        return strings.setdefault(value, len(strings))
+
+    buffers = _Buffers()
+    header = {'version': FORMAT_VERSION, 'count': len(features), 'order': buffers.add('uint8', order), 'layers': []}
+    for layer, rows in layer_rows.items():
+        names = list(dict.fromkeys(name for feature in rows for name in feature.get('properties', {})))
+        columns = []
+        for name in names:
+            kind, ref = _encode_column([feature['properties'].get(name) for feature in rows], buffers, intern)
+            column = {'name': name, 'kind': kind, 'data': ref}
+            present = [name in feature['properties'] for feature in rows]
+            if not all(present):
+                column['present'] = buffers.add('uint8', present)
+            columns.append(column)
+        header['layers'].append({
+            'type': layer,
+            'count': len(rows),
+            'x': buffers.add('float64', [float(feature['geometry']['coordinates'][0]) for feature in rows]),
+            'y': buffers.add('float64', [float(feature['geometry']['coordinates'][1]) for feature in rows]),
+            'columns': columns,
+        })
+
+    # Offsets count UTF-16 code units, so the page can slice one decoded string
+    offsets = [0]
+    for value in strings:
+        offsets.append(offsets[-1] + len(value.encode('utf-16-le')) // 2)
+    text = ''.join(strings).encode('utf-8')
+    header['strings'] = {
+        'offsets': buffers.add('uint32', offsets),
+        'text': buffers.add('uint8', text),
+    }
+
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    header_bytes += b' ' * (-len(header_bytes) % 8)
+    return MAGIC + struct.pack('<II', len(header_bytes), 0) + header_bytes + b''.join(buffers.parts)
+
+
+def decode_feature_collection(data):
+    """Decode star map binary data back into a FeatureCollection (what the page rebuilds)"""
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not a star map data file")
+    header_length, _ = struct.unpack_from('<II', data, len(MAGIC))
+    data_start = len(MAGIC) + 8
+    header = json.loads(data[data_start:data_start + header_length])
+    data_start += header_length
+
+    def read(ref):
+        values = array.array(DTYPES[ref['dtype']])
+        start = data_start + ref['offset']
+        values.frombytes(data[start:start + ref['length'] * values.itemsize])
+        if sys.byteorder != 'little':
+            values.byteswap()
+        return values
+
+    offsets = read(header['strings']['offsets'])
+    text = read(header['strings']['text']).tobytes().decode('utf-8').encode('utf-16-le')
+    strings = [text[2 * start:2 * stop].decode('utf-16-le') for start, stop in zip(offsets[:-1], offsets[1:])]
+    decoders = {
+        'string': lambda value: None if value < 0 else strings[value],
+        'json': lambda value: None if value < 0 else json.loads(strings[value]),
+        'int32': lambda value: None if value == INT32_NULL else value,
+        'float64': lambda value: None if math.isnan(value) else value,
+    }
+
+    layers = []
+    for layer in header['layers']:
+        columns = [(column['name'], decoders[column['kind']], read(column['data']),
+                    read(column['present']) if 'present' in column else None)
+                   for column in layer['columns']]
+        layers.append(iter([
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [x, y]},
+                "properties": {name: decode(values[row]) for name, decode, values, present in columns
+                               if present is None or present[row]},
+            }
+            for row, (x, y) in enumerate(zip(read(layer['x']), read(layer['y'])))
+        ]))
+    return {"type": "FeatureCollection", "features": [next(layers[layer]) for layer in read(header['order'])]}
+
+
+def write_sidecar(geojson, path):
+    """Write the binary data file atomically; returns its size in bytes"""
+    data = encode_feature_collection(geojson)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return len(data)
+
+
+# Loader included in the generated pages. decodeStarMapData runs in a Web Worker (built from
+# its own source, so the page stays a single file) and falls back to the main thread where
+# workers are unavailable.
+LOADER_JS = r"""
+        const STAR_MAP_INT32_NULL = -2147483648;
+
+        function decodeStarMapData(buffer) {
+            const bytes = new Uint8Array(buffer);
+            if (new TextDecoder().decode(bytes.subarray(0, 8)) !== 'NHLMAP01') {
+                throw new Error('Not a star map data file');
+            }
+            const headerLength = new DataView(buffer).getUint32(8, true);
+            const header = JSON.parse(new TextDecoder().decode(bytes.subarray(16, 16 + headerLength)));
+            const dataStart = 16 + headerLength;
+            const arrayTypes = { uint8: Uint8Array, int32: Int32Array, uint32: Uint32Array, float64: Float64Array };
+            const view = ref => new arrayTypes[ref.dtype](buffer, dataStart + ref.offset, ref.length);
+
+            const offsets = view(header.strings.offsets);
+            const text = new TextDecoder().decode(view(header.strings.text));
+            const strings = new Array(offsets.length - 1);
+            for (let i = 0; i < strings.length; i++) {
+                strings[i] = text.slice(offsets[i], offsets[i + 1]);
+            }
+            return {
+                buffer,
+                strings,
+                order: view(header.order),
+                layers: header.layers.map(layer => ({
+                    type: layer.type,
+                    count: layer.count,
+                    x: view(layer.x),
+                    y: view(layer.y),
+                    columns: layer.columns.map(column => ({
+                        name: column.name,
+                        kind: column.kind,
+                        data: view(column.data),
+                        present: column.present ? view(column.present) : null
+                    }))
+                }))
+            };
+        }
+
+        function buildStarMapFeatures(decoded) {
+            const { strings, order, layers } = decoded;
+            const parsedJson = new Map();
+            const readers = {
+                string: value => value < 0 ? null : strings[value],
+                json: value => {
+                    if (value < 0) return null;
+                    if (!parsedJson.has(value)) parsedJson.set(value, JSON.parse(strings[value]));
+                    return parsedJson.get(value);
+                },
+                int32: value => value === STAR_MAP_INT32_NULL ? null : value,
+                float64: value => Number.isNaN(value) ? null : value
+            };
+            // Cache a built value as an own property, so later reads skip the getter
+            const own = (feature, name, value) => {
+                Object.defineProperty(feature, name, { value, writable: true, enumerable: true, configurable: true });
+                return value;
+            };
+            const layerFeatures = layers.map(layer => {
+                const columns = layer.columns.map(column => [column.name, readers[column.kind], column.data, column.present]);
+                // Features of a layer share a prototype that builds geometry and properties on first access
+                const prototype = {
+                    type: 'Feature',
+                    get geometry() {
+                        return own(this, 'geometry', { type: 'Point', coordinates: [layer.x[this.row], layer.y[this.row]] });
+                    },
+                    set geometry(value) {
+                        own(this, 'geometry', value);
+                    },
+                    get properties() {
+                        const properties = {};
+                        for (const [name, read, data, present] of columns) {
+                            if (present === null || present[this.row]) {
+                                properties[name] = read(data[this.row]);
+                            }
+                        }
+                        return own(this, 'properties', properties);
+                    },
+                    set properties(value) {
+                        own(this, 'properties', value);
+                    },
+                    toJSON() {
+                        return { type: 'Feature', geometry: this.geometry, properties: this.properties };
+                    }
+                };
+                function StarMapFeature(row) {
+                    this.row = row;
+                }
+                StarMapFeature.prototype = prototype;
+                const features = new Array(layer.count);
+                for (let row = 0; row < layer.count; row++) {
+                    features[row] = new StarMapFeature(row);
+                }
+                return features;
+            });
+            const next = new Array(layers.length).fill(0);
+            const features = new Array(order.length);
+            for (let i = 0; i < order.length; i++) {
+                features[i] = layerFeatures[order[i]][next[order[i]]++];
+            }
+            const collection = { type: 'FeatureCollection', features };
+            // Same as features.filter(f => f.properties.type === type), without building properties
+            Object.defineProperty(collection, 'featuresOfType', {
+                value: type => {
+                    const index = layers.findIndex(layer => layer.type === type);
+                    return index < 0 ? [] : layerFeatures[index].slice();
+                }
+            });
+            return collection;
+        }
+
+        async function readStarMapSource(source) {
+            if (source.url) {
+                const response = await fetch(source.url);
+                if (!response.ok) {
+                    throw new Error(`${response.status} ${response.statusText} loading ${source.url}`);
+                }
+                return response.arrayBuffer();
+            }
+            const binary = atob(source.base64);
+            const bytes = new Uint8Array(binary.length);
+            for (let i = 0; i < binary.length; i++) {
+                bytes[i] = binary.charCodeAt(i);
+            }
+            return bytes.buffer;
+        }
+
+        function loadStarMapData(source) {
+            const decodeHere = () => readStarMapSource(source).then(decodeStarMapData).then(buildStarMapFeatures);
+            if (typeof Worker === 'undefined') {
+                return decodeHere();
+            }
+            // The typed arrays are views of one buffer, which is transferred instead of copied
+            const workerSource = `${decodeStarMapData.toString()}
+                ${readStarMapSource.toString()}
+                self.onmessage = async event => {
+                    try {
+                        const decoded = decodeStarMapData(await readStarMapSource(event.data));
+                        self.postMessage({ decoded }, [decoded.buffer]);
+                    } catch (error) {
+                        self.postMessage({ error: String(error && error.message || error) });
+                    }
+                };`;
+            return new Promise((resolve, reject) => {
+                let worker;
+                try {
+                    worker = new Worker(URL.createObjectURL(new Blob([workerSource], { type: 'text/javascript' })));
+                } catch (error) {
+                    decodeHere().then(resolve, reject);
+                    return;
+                }
+                worker.onmessage = event => {
+                    worker.terminate();
+                    if (event.data.error) {
+                        reject(new Error(event.data.error));
+                    } else {
+                        resolve(buildStarMapFeatures(event.data.decoded));
+                    }
+                };
+                worker.onerror = event => {
+                    worker.terminate();
+                    reject(new Error(event.message || 'Star map data worker failed'));
+                };
+                worker.postMessage(source.url ? { url: new URL(source.url, document.baseURI).href } : source);
+            });
+        }
+
+        // Run a deferred page script (kept as inert text until the data is ready) at global scope
+        function runPageScript(id) {
+            const script = document.createElement('script');
+            script.textContent = document.getElementById(id).textContent + `\n//# sourceURL=${id}.js`;
+            document.body.appendChild(script);
+        }
+
+        // DOMContentLoaded may already have fired by the time the page script runs
+        function onDomReady(callback) {
+            if (document.readyState === 'loading') {
+                document.addEventListener('DOMContentLoaded', callback);
+            } else {
+                callback();
+            }
+        }
+"""
+
+
+def page_data_script(geojson, html_path, main_script_id, mode=STAR_MAP_DATA_MODE):
+    """
+    Write the page's data and return the <script> elements that load it.
+
+    The loader stores the FeatureCollection in window.starMapData and then runs the page
+    script with id main_script_id (a <script type="text/plain"> block).
+
+    Args:
+        geojson: FeatureCollection shown by the page
+        html_path: Path of the generated page; the sidecar is written next to it
+        main_script_id: Element id of the deferred page script
+        mode: 'sidecar' (binary file next to the page) or 'inline' (base64 in the page)
+
+    Returns:
+        tuple: (HTML for the loader, sidecar path or None)
+    """
+    if mode == 'sidecar':
+        sidecar_path = os.path.splitext(html_path)[0] + '_data.bin'
+        write_sidecar(geojson, sidecar_path)
+        source = json.dumps({'url': os.path.basename(sidecar_path)})
+        embedded = ''
+    elif mode == 'inline':
+        sidecar_path = None
+        source = "{ base64: document.getElementById('star-map-binary').textContent.trim() }"
+        encoded = base64.b64encode(encode_feature_collection(geojson)).decode('ascii')
+        embedded = f'<script type="application/octet-stream" id="star-map-binary">{encoded}</script>\n    '
+    else:
+        raise ValueError(f"Unknown STAR_MAP_DATA mode: {mode} (expected sidecar or inline)")
+
+    script = f"""{embedded}<script>{LOADER_JS}
+        loadStarMapData({source}).then(data => {{
+            window.starMapData = data;
+            runPageScript('{main_script_id}');
+        }}).catch(error => {{
+            console.error('Failed to load star map data:', error);
+            const loading = document.getElementById('loading');
+            if (loading) {{
+                loading.textContent = `Could not load the star map data (${{error.message}}). ` +
+                    'Serve this page over HTTP, or rebuild it with STAR_MAP_DATA=inline to open it from disk.';
+            }}
+        }});
+    </script>"""
+    return script, sidecar_path
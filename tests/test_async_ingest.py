@@ -0,0 +1,177 @@
+"""Async ingestion against nhl_api_stub.py replaying a small recorded season."""
+import asyncio
+import json
+import os
+import time
+
+import pytest
+
+import goal_store
+from async_ingest import AsyncNHLClient, TokenBucket, retry_after_seconds, run_async_ingestion
+from ingest_manifest import IngestManifest
+from nhl_api_stub import start_stub_server
+
+SEASON = 20232024
+
+
+def scheduled(game_id, state="OFF", date="2023-10-10"):
+    return {"id": game_id, "gameType": 2, "gameState": state, "gameDate": date,
+            "homeTeam": {"id": 1, "score": 0}, "awayTeam": {"id": 2, "score": 0}}
+
+
+def goal_play(period, time_in_period, home_score, away_score, owner=1):
+    return {"typeDescKey": "goal", "situationCode": "1551", "periodDescriptor": {"number": period},
+            "timeInPeriod": time_in_period, "homeTeamDefendingSide": "left",
+            "details": {"eventOwnerTeamId": owner, "scoringPlayerId": 8470000 + period,
+                        "goalieInNetId": 8480000, "xCoord": 70, "yCoord": 5, "shotType": "wrist",
+                        "homeScore": home_score, "awayScore": away_score}}
+
+
+def play_by_play(goal_plays, date="2023-10-10"):
+    return {"gameType": 2, "gameDate": date, "homeTeam": {"id": 1}, "awayTeam": {"id": 2},
+            "plays": [{"typeDescKey": "faceoff"}, *goal_plays]}
+
+
+def write_fixture(fixtures, path, data):
+    file_path = fixtures / f"{path}.json"
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    file_path.write_text(json.dumps(data))
+
+
+@pytest.fixture
+def fixtures(tmp_path, monkeypatch):
+    """An empty preseason week, then one week ending the season walk with a final, a goalless, a future and a missing game"""
+    monkeypatch.chdir(tmp_path)
+    fixtures = tmp_path / "fixtures"
+    write_fixture(fixtures, "schedule/2023-08-01", {"nextStartDate": "2023-10-10", "gameWeek": []})
+    write_fixture(fixtures, "schedule/2023-10-10", {
+        "nextStartDate": "2024-06-08",
+        "gameWeek": [{"date": "2023-10-10", "games": [
+            scheduled(2023020001), scheduled(2023020002), scheduled(2023020003, "FUT", "2023-10-11"),
+            scheduled(2023020004), {"id": 2023010001, "gameType": 1, "gameState": "OFF"},
+        ]}],
+    })
+    write_fixture(fixtures, "gamecenter/2023020001/play-by-play",
+                  play_by_play([goal_play(1, "05:00", 1, 0), goal_play(3, "19:10", 1, 1, owner=2)]))
+    write_fixture(fixtures, "gamecenter/2023020002/play-by-play", play_by_play([]))
+    return fixtures
+
+
+def run(fixtures, manifest, throttle=None, **kwargs):
+    server, base_url = start_stub_server(fixtures, throttle=throttle)
+    try:
+        total = asyncio.run(run_async_ingestion([SEASON], manifest, rate=1000, base_url=base_url, **kwargs))
+    finally:
+        server.shutdown()
+    return total, server.requests
+
+
+def test_ingests_goals_and_updates_the_manifest(fixtures, tmp_path):
+    manifest = IngestManifest(str(tmp_path / "manifest.json"), legacy=set())
+    total, requests = run(fixtures, manifest)
+
+    assert total == 2
+    goals = goal_store.read_goals('goals')
+    assert goals['game_id'].tolist() == [2023020001, 2023020001]
+    assert goals['team_id'].tolist() == [1, 2]
+    assert sorted(goals['time'].tolist()) == ["05:00", "19:10"]
+
+    # The future game is not requested; the game without a play-by-play fixture fails once (404)
+    assert "gamecenter/2023020003/play-by-play" not in requests
+    assert requests.count("gamecenter/2023020004/play-by-play") == 1
+
+    reloaded = IngestManifest.load(manifest.path)
+    assert reloaded.is_completed(2023020001) and reloaded.is_completed(2023020002)
+    assert not reloaded.is_completed(2023020003) and not reloaded.is_completed(2023020004)
+    assert reloaded.seasons[str(SEASON)]["outstanding"] == {3: "2023-10-11", 4: "2023-10-10"}
+    assert not reloaded.is_season_complete(SEASON)
+
+
+def test_rerun_retries_outstanding_games_and_completes_the_season(fixtures, tmp_path):
+    manifest = IngestManifest(str(tmp_path / "manifest.json"), legacy=set())
+    run(fixtures, manifest)
+
+    # The missing games have been played and recorded since
+    schedule_path = fixtures / "schedule/2023-10-10.json"
+    schedule = json.loads(schedule_path.read_text())
+    schedule["gameWeek"][0]["games"][2]["gameState"] = "OFF"
+    schedule_path.write_text(json.dumps(schedule))
+    write_fixture(fixtures, "gamecenter/2023020003/play-by-play",
+                  play_by_play([goal_play(2, "10:00", 0, 1, owner=2)], "2023-10-11"))
+    write_fixture(fixtures, "gamecenter/2023020004/play-by-play", play_by_play([goal_play(1, "01:00", 1, 0)]))
+
+    manifest = IngestManifest.load(manifest.path)
+    total, requests = run(fixtures, manifest)
+    assert total == 2
+    # The walk resumes at the earliest outstanding game and completed games are not fetched again
+    assert "schedule/2023-08-01" not in requests
+    assert "gamecenter/2023020001/play-by-play" not in requests
+    assert sorted(goal_store.read_goals('goals')['game_id'].tolist()) == [2023020001, 2023020001,
+                                                                          2023020003, 2023020004]
+    reloaded = IngestManifest.load(manifest.path)
+    assert reloaded.seasons[str(SEASON)]["watermark"] == 4
+    assert reloaded.seasons[str(SEASON)]["outstanding"] == {}
+    assert reloaded.is_season_complete(SEASON)
+
+    # A complete season is not walked at all
+    total, requests = run(fixtures, reloaded)
+    assert (total, requests) == (0, [])
+
+
+def test_429_responses_are_retried_after_retry_after(fixtures, tmp_path, capsys):
+    manifest = IngestManifest(str(tmp_path / "manifest.json"), legacy=set())
+    throttle = {"gamecenter/2023020001/play-by-play": ["0.2", "0"], "schedule/2023-08-01": ["1.5"]}
+    start = time.monotonic()
+    total, requests = run(fixtures, manifest, throttle=throttle)
+
+    assert total == 2
+    assert requests.count("gamecenter/2023020001/play-by-play") == 3
+    assert requests.count("schedule/2023-08-01") == 2
+    output = capsys.readouterr().out
+    assert "Status 429" in output and "retrying in 0.2s" in output and "retrying in 1.5s" in output
+    assert time.monotonic() - start >= 1.7
+
+
+def test_gives_up_after_the_retry_limit(fixtures, tmp_path):
+    server, base_url = start_stub_server(fixtures, throttle={"schedule/2023-08-01": ["0"] * 10})
+
+    async def fetch():
+        async with AsyncNHLClient(base_url, rate=1000, retries=3) as client:
+            return await client.get_schedule("2023-08-01")
+
+    try:
+        assert asyncio.run(fetch()) == (None, "")
+    finally:
+        server.shutdown()
+    assert server.requests == ["schedule/2023-08-01"] * 3
+
+
+def test_recorded_responses_replay_through_the_stub(fixtures, tmp_path):
+    manifest = IngestManifest(str(tmp_path / "manifest.json"), legacy=set())
+    run(fixtures, manifest, record_dir=str(tmp_path / "recorded"))
+    recorded = tmp_path / "recorded"
+    assert json.loads((recorded / "gamecenter/2023020001/play-by-play.json").read_text()) == \
+        json.loads((fixtures / "gamecenter/2023020001/play-by-play.json").read_text())
+
+    os.remove(manifest.path)
+    goal_store.write_goals(goal_store.read_goals('goals').iloc[:0], 'goals')
+    total, _ = run(recorded, IngestManifest(str(tmp_path / "manifest.json"), legacy=set()))
+    assert total == 2
+
+
+@pytest.mark.parametrize("value, expected", [("2", 2.0), ("1.5", 1.5), ("0", 0.0), (None, 4),
+                                             ("Wed, 21 Oct 2015 07:28:00 GMT", 4), ("-1", 4),
+                                             ("inf", 4), ("nan", 4)])
+def test_retry_after_values(value, expected):
+    assert retry_after_seconds(value, 4) == expected
+
+
+def test_token_bucket_limits_the_request_rate():
+    async def acquire_all():
+        bucket = TokenBucket(rate=20, capacity=1)
+        start = time.monotonic()
+        await asyncio.gather(*(bucket.acquire() for _ in range(5)))
+        return time.monotonic() - start
+
+    # The first token is available immediately, the other four take 1/20 s each
+    assert 0.19 <= asyncio.run(acquire_all()) < 1.0
@@ -0,0 +1,60 @@
+"""Feature cache eviction when several worker processes share the cache directory."""
+import os
+
+import numpy as np
+import pytest
+
+import feature_cache
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(feature_cache, 'CACHE_DIR', str(tmp_path))
+    return tmp_path
+
+
+def fill_cache(cache_dir, n=4):
+    for i in range(n):
+        path = cache_dir / f"entry-{i}.npy"
+        np.save(path, np.zeros(100))
+        os.utime(path, (i, i))
+    return os.path.getsize(cache_dir / "entry-0.npy")
+
+
+def test_evicts_least_recently_used_first(cache_dir):
+    size = fill_cache(cache_dir)
+    feature_cache.evict(2 * size)
+    assert sorted(os.listdir(cache_dir)) == ["entry-2.npy", "entry-3.npy"]
+
+
+def test_entries_removed_by_another_process_are_skipped(cache_dir, monkeypatch):
+    size = fill_cache(cache_dir)
+    real_stat, real_remove = os.stat, os.remove
+
+    # entry-0 disappears between listdir and stat, entry-1 between stat and remove
+    def stat(path, *args, **kwargs):
+        if str(path).endswith("entry-0.npy"):
+            real_remove(path)
+        return real_stat(path, *args, **kwargs)
+
+    def remove(path):
+        if str(path).endswith("entry-1.npy"):
+            real_remove(path)
+        real_remove(path)
+
+    monkeypatch.setattr(feature_cache.os, 'stat', stat)
+    monkeypatch.setattr(feature_cache.os, 'remove', remove)
+    feature_cache.evict(size)
+    assert os.listdir(cache_dir) == ["entry-3.npy"]
+
+
+def test_load_survives_eviction_after_open(cache_dir, monkeypatch):
+    feature_cache.save_array("key", np.arange(5))
+    real_utime = os.utime
+
+    def utime(path, *args, **kwargs):
+        os.remove(path)
+        return real_utime(path, *args, **kwargs)
+
+    monkeypatch.setattr(feature_cache.os, 'utime', utime)
+    assert feature_cache.load_array("key").tolist() == [0, 1, 2, 3, 4]
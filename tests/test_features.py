@@ -0,0 +1,105 @@
+"""Vectorized feature columns must match the per-goal reference helpers in features.py."""
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import features
+
+# Just inside, on and just outside every zone edge, plus coordinates that get mirrored
+X_VALUES = [0, 25, 25.01, 54, 54.01, 88.99, 89, 95, -30, -89, np.nan]
+Y_VALUES = [-42.5, -42.49, -22, -21.99, -7, -6.99, 0, 7, 7.01, 22, 22.01, 42.5, np.nan]
+
+TIMES = ['05:30', '5:3', '00:00', '20:00', '19:59', '', 'abc', None, '12:34:56', '-1:30', ':', '7',
+         '07:xx']
+
+# Every code the map knows, including the empty-net ones (a 0 goalie digit, e.g. 1560, 651, 101)
+SITUATION_CODES = list(features.SITUATION_CODE_MAP)
+
+GAME_DATES = ['2023-10-01', '2023-09-30', '2023-10-09', '2023-12-31', '2024-01-01', '2024-02-29',
+              '2024-06-15', '2024-10-01']
+
+
+def synthetic_goals():
+    coordinates = list(itertools.product(X_VALUES, Y_VALUES))
+    n = len(coordinates)
+    return pd.DataFrame({
+        'x': [x for x, _ in coordinates],
+        'y': [y for _, y in coordinates],
+        'time': np.resize(np.array(TIMES, dtype=object), n),
+        'situation_code': np.resize(SITUATION_CODES, n),
+        'team_id': np.resize([1, 2, 3], n).astype(float),
+        'home_team': np.resize([1, 2, np.nan, 1], n),
+        'game_date': np.resize(GAME_DATES, n),
+        'shot_type': 'wrist',
+    })
+
+
+def test_check_parity_on_edge_cases():
+    timings = features.check_parity(synthetic_goals())
+    assert set(timings) == {'shot_zone', 'period_time', 'season_day', 'situation'}
+
+
+def test_check_parity_on_categorical_columns():
+    # goal_store loads dictionary-encoded columns as categoricals
+    goals = synthetic_goals()
+    goals['time'] = goals['time'].astype('category')
+    features.check_parity(goals)
+
+
+def test_check_parity_reports_mismatches(monkeypatch):
+    monkeypatch.setattr(features, 'compute_shot_zones', lambda x, y: np.full(len(x), 'Slot', dtype=object))
+    with pytest.raises(AssertionError, match='shot_zone differs'):
+        features.check_parity(synthetic_goals())
+
+
+@pytest.mark.parametrize('x, y', list(itertools.product(X_VALUES, Y_VALUES)))
+def test_shot_zone_boundaries(x, y):
+    assert features.compute_shot_zones([x], [y])[0] == features.get_zones(x, y)
+
+
+@pytest.mark.parametrize('time_str', TIMES + [np.nan])
+def test_malformed_times(time_str):
+    assert features.parse_times_to_minutes([time_str])[0] == features.parse_time_to_minutes(time_str)
+
+
+@pytest.mark.parametrize('code', SITUATION_CODES)
+def test_situations_for_both_teams(code):
+    actual = features.compute_situations([code, code], [1, 2], [1, 1])
+    assert list(actual) == [features.determine_situation_code(code, 1, 1),
+                            features.determine_situation_code(code, 2, 1)]
+
+
+def test_empty_net_situations():
+    # 1560: home goalie pulled with six skaters; the away side sees 5v6
+    assert list(features.compute_situations([1560, 1560], [1, 2], [1, 1])) == ['6v5', '5v6']
+    # 1011 (mapped from 101 and 1010) reads 0v1 for the away side, which is reported as 1v0
+    assert list(features.compute_situations([1011, 1011], [1, 2], [1, 1])) == ['1v0', '1v0']
+
+
+def test_prepare_features_matches_reference():
+    goals = synthetic_goals()
+    goals['game_date'] = np.resize(['2023-10-09', '2023-12-31', '2024-02-29', '2024-10-01'], len(goals))
+    goals['period'] = np.resize([1, 2, 3, 4], len(goals))
+    goals['team_score'] = np.resize([1, 2, 3], len(goals))
+    goals['opponent_score'] = np.resize([0, 4], len(goals))
+    goals['goalie'] = np.resize([1.0, np.nan], len(goals))
+
+    df_subset, df = features.prepare_features(goals)
+
+    reference = goals.dropna(subset=['shot_type']).reset_index(drop=True)
+    x = pd.to_numeric(reference['x'])
+    y = pd.to_numeric(reference['y'])
+    expected_zones = [features.get_zones(abs(a) if a < 0 else a, -b if a < 0 else b) for a, b in zip(x, y)]
+    period_time = reference['time'].apply(features.parse_time_to_minutes)
+    dates = pd.to_datetime(reference['game_date'])
+    codes = reference['situation_code'].map(features.SITUATION_CODE_MAP)
+
+    assert df['shot_zone'].tolist() == expected_zones
+    assert df['period_time'].tolist() == period_time.tolist()
+    assert df['game_time'].tolist() == ((period_time + reference['period'] * 20) // 60).tolist()
+    assert df['season_day'].tolist() == dates.apply(features.calculate_season_day).tolist()
+    assert df['situation'].tolist() == [features.determine_situation_code(c, t, h) for c, t, h in
+                                        zip(codes, reference['team_id'], reference['home_team'])]
+    assert list(df_subset.columns) == features.FEATURE_COLUMNS
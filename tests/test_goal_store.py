@@ -0,0 +1,97 @@
+"""Appends and compaction of the season-partitioned goal store."""
+import os
+
+import pandas as pd
+import pytest
+
+import goal_store
+
+
+@pytest.fixture(autouse=True)
+def store_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(goal_store, 'STORE_DIR', str(tmp_path / 'store'))
+    monkeypatch.setattr(goal_store, 'STAGES', {'goals': [str(tmp_path / 'nhl_goals.csv')]})
+    return tmp_path
+
+
+def goals(first_game, n):
+    return pd.DataFrame({
+        'game_id': range(first_game, first_game + n),
+        'game_date': ['2023-10-12'] * n,
+        'player_name': ['A. Player'] * n,
+    })
+
+
+def append_batches(batches=3, size=2):
+    for batch in range(batches):
+        goal_store.append_goals(goals(2023020001 + batch * size, size), 'goals')
+
+
+def game_ids():
+    return sorted(goal_store.read_goals('goals')['game_id'].tolist())
+
+
+def partition_files():
+    partition = os.path.join(goal_store.stage_dir('goals'), 'season=20232024')
+    return sorted(os.listdir(partition))
+
+
+def test_compaction_merges_parts():
+    append_batches()
+    assert len(goal_store._partition_files('goals')) == 3
+    goal_store.compact_stage('goals')
+    assert partition_files() == ['_parts.json', 'part-00003.parquet']
+    assert game_ids() == list(range(2023020001, 2023020007))
+
+
+def test_crash_before_the_switch_keeps_the_old_parts(monkeypatch):
+    append_batches()
+
+    def crash(partition, parts):
+        raise KeyboardInterrupt
+
+    with monkeypatch.context() as m:
+        m.setattr(goal_store, '_set_live_parts', crash)
+        with pytest.raises(KeyboardInterrupt):
+            goal_store.compact_stage('goals')
+    # The merged part was written but is not live yet
+    assert 'part-00003.parquet' in partition_files()
+    assert game_ids() == list(range(2023020001, 2023020007))
+
+    goal_store.compact_stage('goals')
+    assert partition_files() == ['_parts.json', 'part-00004.parquet']
+    assert game_ids() == list(range(2023020001, 2023020007))
+
+
+def test_crash_while_removing_replaced_parts(monkeypatch):
+    append_batches()
+    real_remove = os.remove
+    removed = []
+
+    def crash_after_one(path):
+        if removed:
+            raise KeyboardInterrupt
+        removed.append(path)
+        real_remove(path)
+
+    with monkeypatch.context() as m:
+        m.setattr(goal_store.os, 'remove', crash_after_one)
+        with pytest.raises(KeyboardInterrupt):
+            goal_store.compact_stage('goals')
+    assert game_ids() == list(range(2023020001, 2023020007))
+
+    goal_store.append_goals(goals(2023020007, 1), 'goals')
+    assert game_ids() == list(range(2023020001, 2023020008))
+    goal_store.compact_stage('goals')
+    assert game_ids() == list(range(2023020001, 2023020008))
+
+
+def test_parts_without_a_list_are_all_live():
+    # Stores written before partitions listed their parts
+    append_batches()
+    partition = os.path.join(goal_store.stage_dir('goals'), 'season=20232024')
+    os.remove(os.path.join(partition, goal_store.PARTS_FILE))
+    assert game_ids() == list(range(2023020001, 2023020007))
+    goal_store.append_goals(goals(2023020007, 1), 'goals')
+    goal_store.compact_stage('goals')
+    assert game_ids() == list(range(2023020001, 2023020008))
@@ -0,0 +1,43 @@
+"""Journal replay and periodic compaction of the backfill checkpoints."""
+import json
+from datetime import date, timedelta
+
+from journal import Journal
+from schedule_index import ScheduleIndex
+
+
+def schedule_week(first_game, days):
+    return {"gameWeek": [{"date": day, "games": [{"id": first_game + i, "gameType": 2,
+                                                   "homeTeam": {"id": 1}, "awayTeam": {"id": 2}}]}
+                         for i, day in enumerate(days)]}
+
+
+def test_replay_drops_a_torn_tail(tmp_path):
+    journal = Journal(str(tmp_path / "j.journal"))
+    journal.append({"n": 1}, {"n": 2})
+    with open(journal.path, "a") as f:
+        f.write('{"n": 3')
+    assert Journal(journal.path).replay() == [{"n": 1}, {"n": 2}]
+    journal.append({"n": 4})
+    assert Journal(journal.path).replay() == [{"n": 1}, {"n": 2}, {"n": 4}]
+
+
+def test_schedule_index_keeps_compacting_as_it_grows(tmp_path):
+    path = str(tmp_path / "index.json")
+    index = ScheduleIndex.load(path)
+    index.journal.min_records = 10
+    compactions = 0
+    for week in range(60):
+        days = [(date(2009, 10, 1) + timedelta(days=week * 7 + i)).isoformat() for i in range(7)]
+        count = index.journal.count
+        index.add_week(days[0], schedule_week(2009020000 + week * 7, days))
+        compactions += index.journal.count < count + 7
+        # The journal never grows past the snapshot it will be folded into
+        assert index.journal.count < max(index.journal.min_records, index.journal.snapshot_size) + 7
+        if week % 20 == 19:
+            index = ScheduleIndex.load(path)
+            index.journal.min_records = 10
+    assert compactions >= 3
+    with open(path) as f:
+        assert len(json.load(f)["days"]) + index.journal.count >= len(index.days)
+    assert len(ScheduleIndex.load(path).days) == 60 * 7
@@ -0,0 +1,119 @@
+"""Batch naming with FakeNamingClient: caching, bounded concurrency and uniqueness."""
+import asyncio
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import naming_service
+from naming_service import FakeNamingClient, name_clusters
+
+FEATURES = ['shot_zone', 'shot_type', 'situation']
+
+
+def naming_requests(n_groups=12, seed=0):
+    rng = np.random.default_rng(seed)
+    goals = pd.DataFrame({
+        'shot_zone': rng.choice(['Slot', 'Point', 'Behind Net', 'Left Point'], 600),
+        'shot_type': rng.choice(['Wrist Shot', 'Slap Shot', 'Snap Shot'], 600),
+        'situation': rng.choice(['5v5', '5v4', '4v5'], 600),
+        'group': rng.integers(0, n_groups, 600),
+    })
+    return [('galaxy', group_goals, FEATURES) for _, group_goals in goals.groupby('group')]
+
+
+class ConstantNamingClient(FakeNamingClient):
+    """Gives every prompt the same name, finishing later requests first"""
+
+    def __init__(self, name, delays):
+        super().__init__()
+        self.name = name
+        self.delays = list(delays)
+        self.finished = []
+
+    async def complete(self, prompt):
+        index = len(self.prompts)
+        self.prompts.append(prompt)
+        await asyncio.sleep(self.delays[index])
+        self.finished.append(index)
+        return self.name
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / 'names.json')
+
+
+def test_unchanged_prompts_are_answered_from_the_cache(cache_path):
+    requests = naming_requests()
+    first = FakeNamingClient()
+    names = name_clusters(requests, {'galaxy': set()}, first, cache_path)
+    assert len(first.prompts) == len(requests)
+
+    second = FakeNamingClient()
+    assert name_clusters(requests, {'galaxy': set()}, second, cache_path) == names
+    assert second.prompts == []
+
+
+def test_only_changed_prompts_are_requested(cache_path):
+    requests = naming_requests()
+    name_clusters(requests, {'galaxy': set()}, FakeNamingClient(), cache_path)
+
+    changed = list(requests)
+    level_name, goals, features_used = changed[3]
+    changed[3] = (level_name, goals.assign(situation='6v5'), features_used)
+    client = FakeNamingClient()
+    name_clusters(changed, {'galaxy': set()}, client, cache_path)
+    assert client.prompts == [naming_service.build_prompt(*changed[3])]
+
+
+def test_cache_is_keyed_on_the_model(cache_path):
+    requests = naming_requests(n_groups=3)
+    name_clusters(requests, {'galaxy': set()}, FakeNamingClient(model='a'), cache_path)
+    client = FakeNamingClient(model='b')
+    name_clusters(requests, {'galaxy': set()}, client, cache_path)
+    assert len(client.prompts) == len(requests)
+
+
+def test_failed_names_fall_back_and_are_not_cached(cache_path):
+    requests = naming_requests()
+    client = FakeNamingClient(fail_on=range(16))
+    names = name_clusters(requests, {'galaxy': set()}, client, cache_path)
+    assert names == [f"galaxy_{i}" for i in range(len(requests))]
+    with open(cache_path) as f:
+        assert json.load(f) == {}
+
+
+@pytest.mark.parametrize('concurrency', [1, 3, 8])
+def test_requests_in_flight_are_bounded(concurrency):
+    requests = naming_requests(n_groups=20)
+    client = FakeNamingClient(delay=0.01)
+    name_clusters(requests, {'galaxy': set()}, client, cache_path=None, concurrency=concurrency)
+    assert len(client.prompts) == len(requests)
+    assert client.max_in_flight == concurrency
+
+
+def test_uniqueness_follows_request_order_not_completion_order():
+    requests = naming_requests(n_groups=4)
+    client = ConstantNamingClient("Slot Nebula", delays=[0.04, 0.03, 0.02, 0.01])
+    names = name_clusters(requests, {'galaxy': set()}, client, cache_path=None)
+    assert client.finished == [3, 2, 1, 0]
+    assert names == ["Slot Nebula", "Slot Nebula 1", "Slot Nebula 2", "Slot Nebula 3"]
+
+
+def test_uniqueness_includes_names_already_generated():
+    requests = naming_requests(n_groups=2)
+    generated_names = {'galaxy': {"Slot Nebula", "Slot Nebula 1"}}
+    client = ConstantNamingClient("Slot Nebula", delays=[0, 0])
+    names = name_clusters(requests, generated_names, client, cache_path=None)
+    assert names == ["Slot Nebula 2", "Slot Nebula 3"]
+    assert generated_names['galaxy'] == {"Slot Nebula", "Slot Nebula 1", "Slot Nebula 2", "Slot Nebula 3"}
+
+
+def test_fake_client_names_are_unique_and_stable():
+    # The fake's small vocabulary repeats names, so this exercises suffixing end to end
+    requests = naming_requests(n_groups=40)
+    names = name_clusters(requests, {'galaxy': set()}, FakeNamingClient(), cache_path=None)
+    assert len(set(names)) == len(names)
+    assert name_clusters(requests, {'galaxy': set()}, FakeNamingClient(), cache_path=None) == names
@@ -0,0 +1,41 @@
+"""Which schedule days the index persists."""
+from schedule_index import ScheduleIndex
+
+
+def game(game_id, state, home=1, away=2):
+    return {"id": game_id, "gameType": 2, "gameState": state, "homeTeam": {"id": home}, "awayTeam": {"id": away}}
+
+
+WEEK = {"gameWeek": [
+    {"date": "2025-01-06", "games": [game(2024020600, "OFF")]},
+    {"date": "2025-01-07", "games": [game(2024020601, "OFF"), game(2024020602, "LIVE", 3, 4)]},
+    {"date": "2025-01-08", "games": [game(2024020603, "FINAL")]},
+    {"date": "2025-01-09", "games": [game(2024020604, "FUT")]},
+    {"date": "2025-01-10", "games": []},
+]}
+
+
+def test_only_settled_days_are_persisted(tmp_path):
+    path = str(tmp_path / "index.json")
+    index = ScheduleIndex.load(path)
+    index.add_week("2025-01-06", WEEK, today="2025-01-07")
+
+    # Every day is usable for the current run
+    assert all(index.covers(day) for day in ["2025-01-06", "2025-01-07", "2025-01-09", "2025-01-10"])
+    assert set(index.games_frame()['game_id']) == {2024020600 + i for i in range(5)}
+
+    # Past days and days whose games are all final survive a restart, the rest are fetched again
+    reloaded = ScheduleIndex.load(path)
+    assert sorted(reloaded.days) == ["2025-01-06", "2025-01-08"]
+    index.save()
+    assert sorted(ScheduleIndex.load(path).days) == ["2025-01-06", "2025-01-08"]
+
+
+def test_days_are_persisted_once_they_settle(tmp_path):
+    path = str(tmp_path / "index.json")
+    index = ScheduleIndex.load(path)
+    index.add_week("2025-01-06", WEEK, today="2025-01-07")
+    index.add_week("2025-01-06", WEEK, today="2025-01-11")
+    index.save()
+    assert sorted(ScheduleIndex.load(path).days) == ["2025-01-06", "2025-01-07", "2025-01-08", "2025-01-09",
+                                                      "2025-01-10"]
@@ -2,7 +2,7 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
-from sklearn.preprocessing import StandardScaler, LabelEncoder
+from sklearn.preprocessing import LabelEncoder
 import hdbscan
 import umap
 from datetime import datetime
@@ -11,177 +11,22 @@ import time
 import logging
 import warnings
 import itertools
+import json
+import sys
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import feature_cache
+import goal_store
+from clustering_metrics import evaluate_clustering_quality
+from features import load_and_prepare_data
+
 warnings.filterwarnings('ignore')
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def get_zones(x, y):
-    x = float(x)
-    y = float(y)
-
-    if 25 < x <= 54 and  -42.5 < y < -22:
-        return "Right Point"
-    elif 25 < x <= 54 and 22 < y < 42.5:
-        return "Left Point"
-    elif 25 < x <= 54 and -22 <= y <= 22:
-        return "Point"
-    elif 54 < x < 89 and 7 < y < 42.5:
-        return 'Left Faceoff Circle'
-    elif 54 < x < 89 and -42.5 < y < -7:
-        return 'Right Faceoff Circle'
-    elif 54 < x < 89 and -7 <= y <= 7:
-        return 'Slot'
-    elif x >= 89:
-        return 'Behind Net'
-    return "Not In OZ"
-
-def determine_situation_code(code, player_team, home_team):
-    is_home = player_team == home_team
-
-    # grab middle 2 characters
-    code_string = str(code)
-    if len(code_string) == 4:
-        code_string = code_string[1:3]
-    else:
-        code_string = code_string[0:2]
-
-    situation = ""
-    if is_home:
-        situation = f"{code_string[1]}v{code_string[0]}"
-    else:
-        situation = f"{code_string[0]}v{code_string[1]}"
-
-    # small check for 0v1
-    if situation == "0v1":
-        return "1v0"
-    
-    return situation
-
-def load_and_prepare_data():
-    """Load the NHL goals dataset and prepare features for clustering"""
-    print("Loading NHL goals dataset...")
-    df = pd.read_csv('data/nhl_goals_with_full_data.csv', low_memory=False)
-
-    df.dropna(subset=["shot_type"], inplace=True)
-    shot_type_cleanup = {
-        "backhand": "Backhand",
-        "tip-in": "Tip-In",
-        "slap": "Slap Shot",
-        "wrist": "Wrist Shot",
-        "snap": "Snap Shot",
-        "wrap-around": "Wrap Around",
-        "deflected": "Deflected",
-        "bat": "Bat",
-        "poke": "Poke",
-        "between-legs": "Between Legs",
-        "cradle": "Cradle",
-    }
-    
-    df['shot_type'] = df['shot_type'].apply(lambda x: shot_type_cleanup[x])
-    df['game_date'] = pd.to_datetime(df['game_date'])
-    df = df[df['game_date'] >= '2023-10-09'].copy()
-
-    df['month'] = df['game_date'].dt.month
-    df['day'] = df['game_date'].dt.day
-    
-    # Calculate season day (days since October 1st start of season)
-    def calculate_season_day(game_date):
-        """Calculate days into the NHL season from October 1st start date"""
-        if pd.isna(game_date):
-            return None
-            
-        # Determine which season this game belongs to
-        if game_date.month >= 10:  # October or later = current season year
-            season_start = pd.Timestamp(year=game_date.year, month=10, day=1)
-        else:  # Before October = previous season year
-            season_start = pd.Timestamp(year=game_date.year - 1, month=10, day=1)
-        
-        # Calculate days into season
-        days_into_season = (game_date - season_start).days + 1  # +1 to make it 1-based
-        return max(1, days_into_season)  # Ensure minimum of 1
-    
-    df['season_day'] = df['game_date'].apply(calculate_season_day)
-
-    print(f"Goals from 2023 onwards: {len(df):,}")
-
-    # Filter out empty nets
-    #df = df[~df['goalie'].isna()].copy()
-        
-    # Normalize coordinates to same side of ice
-    df['x'] = pd.to_numeric(df['x'], errors='coerce')
-    df['y'] = pd.to_numeric(df['y'], errors='coerce')
-    df['y'] = np.where(df['x'] < 0, df['y'] * -1, df['y'])
-    df['x'] = np.where(df['x'] < 0, df['x'] * -1, df['x'])
-
-    df['shot_zone'] = df.apply(lambda x: get_zones(x['x'], x['y']), axis=1)
-
-    print(f"Dataset shape: {df.shape}")
-    
-    # Parse time to get period_time in minutes
-    df['period_time'] = df['time'].apply(parse_time_to_minutes)
-    df['game_time'] = (df['period_time'] + (df['period'] * 20)) // 60
-
-    df['score_diff'] = (df['team_score']-1) - df['opponent_score']
-
-    # subtract 1 from team score since the nhl api counts the goal in the event
-    df['team_score'] = df['team_score']-1
-    df['situation_code'] = pd.to_numeric(df['situation_code'], errors='coerce')
-
-    df['goalie'] = df['goalie'].fillna("Empty")
-    # flatten situation code
-    situation_code_map = {
-        1551: 1551,
-        1451: 1451,
-        1541: 1541,
-        1441: 1441,
-        431: 1431,
-        651: 1651,
-        1560: 1561,
-        1331: 1331,
-        1351: 1351,
-        1531: 1531,
-        1431: 1431,
-        1341: 1341,
-        641: 1641,
-        1460: 1461,
-        1010: 1011,
-
-        551: 1551,
-        1450: 1451,
-        101: 1011,
-        431: 1431,
-        541: 1541,
-        1550: 1551,
-        1340: 1341,
-        1350: 1351
-    }
-    df['situation_code'] = df['situation_code'].apply(lambda x: situation_code_map[x])
-    df['situation'] = df.apply(lambda row: determine_situation_code(row['situation_code'], row['team_id'], row['home_team']), axis=1)
-    
-    # Select the specified features (excluding player_id and goalie integer IDs)
-    feature_columns = ['shot_zone', 'shot_type', 'game_time', 'team_score', 'opponent_score',
-                      'score_diff', 'situation', 'month', 'day', 'season_day']
-    
-    # Create subset with only complete data for key features
-    df_subset = df[feature_columns].copy()
-
-    print(f"Shape after removing missing critical values: {df_subset.shape}")
-    print(f"subset columns: {df_subset.columns}")
-    
-    return df_subset, df
-
-def parse_time_to_minutes(time_str):
-    """Parse time string (MM:SS) to minutes as float"""
-    try:
-        if pd.isna(time_str):
-            return 0.0
-        minutes, seconds = map(int, str(time_str).split(':'))
-        return minutes + seconds / 60.0
-    except (ValueError, AttributeError):
-        return 0.0
-
 def damerau_levenshtein_distance(s1, s2):
     """Calculate Damerau-Levenshtein distance between two strings"""
     len1, len2 = len(s1), len(s2)
@@ -259,7 +104,7 @@ def encode_categorical_features(df, feature_subset):
         if col in df.columns:
             le = LabelEncoder()
             # Handle missing values by filling with 'unknown'
-            df_encoded[col] = df_encoded[col].fillna('unknown')
+            df_encoded[col] = goal_store.fill_missing(df_encoded[col], 'unknown')
             df_encoded[col] = le.fit_transform(df_encoded[col].astype(str))
             label_encoders[col] = le
     
@@ -276,23 +121,19 @@ def perform_umap_hdbscan_clustering(df_encoded, step_name, umap_params, hdbscan_
     """Perform UMAP + HDBSCAN clustering with specified parameters"""
     print(f"{step_name}: Performing UMAP + HDBSCAN clustering...")
     print(f"  UMAP params: {umap_params}")
-    print(f"  HDBSCAN params: {hdbscan_params}")
-    
-    # Scale features
-    scaler = StandardScaler()
-    features_scaled = scaler.fit_transform(df_encoded.values)
     
-    print(f"Clustering {len(features_scaled)} goals with {features_scaled.shape[1]} features")
-    
-    # Apply UMAP for dimensionality reduction
-    print("Applying UMAP dimensionality reduction...")
-    umap_reducer = umap.UMAP(
-        random_state=42,
-        **umap_params
-    )
-    umap_features = umap_reducer.fit_transform(features_scaled)
+    # Scale features and apply UMAP for dimensionality reduction (cached on disk, so
+    # HDBSCAN variants of the same UMAP configuration reuse one embedding)
+    umap_features = feature_cache.umap_embedding(df_encoded, umap_params, random_state=42)
     print(f"UMAP reduced to {umap_features.shape[1]} dimensions")
     
+    cluster_labels, clusterer = perform_hdbscan_clustering(umap_features, step_name, hdbscan_params)
+    return cluster_labels, umap_features, clusterer
+
+def perform_hdbscan_clustering(umap_features, step_name, hdbscan_params):
+    """Run HDBSCAN on an existing UMAP embedding; returns (labels, clusterer)"""
+    print(f"  HDBSCAN params: {hdbscan_params}")
+    
     # Apply HDBSCAN clustering
     print("Applying HDBSCAN clustering...")
     clusterer = hdbscan.HDBSCAN(**hdbscan_params)
@@ -314,156 +155,254 @@ def perform_umap_hdbscan_clustering(df_encoded, step_name, umap_params, hdbscan_
         count = np.sum(cluster_labels == cluster_id)
         print(f"    Cluster {cluster_id}: {count} goals")
     
-    return cluster_labels, umap_features, clusterer
+    return cluster_labels, clusterer
 
-def evaluate_clustering_quality(cluster_labels, features):
-    """Evaluate clustering quality using various metrics"""
-    from sklearn.metrics import silhouette_score, calinski_harabasz_score, davies_bouldin_score
-    
-    unique_labels = np.unique(cluster_labels)
-    n_clusters = len(unique_labels)
-    
-    # Skip evaluation if we have only one cluster or too few samples
-    if n_clusters < 2 or len(features) < 10:
-        return {
-            'n_clusters': n_clusters,
-            'silhouette_score': -1,
-            'calinski_harabasz_score': -1,
-            'davies_bouldin_score': float('inf')
-        }
-    
+# Hyperparameter grids for the sweep
+UMAP_PARAM_GRID = {
+    'n_components': [10, 15, 20],
+    'n_neighbors': [10, 15, 20],
+    'min_dist': [0.05, 0.1, 0.15]
+}
+
+HDBSCAN_PARAM_GRID = {
+    'min_cluster_size': [50, 100, 150],
+    'min_samples': [None]  # Use default (min_cluster_size)
+}
+
+SWEEP_CHECKPOINT_FILE = 'hyperparameter_sweep_checkpoint.jsonl'
+
+GALAXY_FEATURES = ['shot_zone', 'shot_type', 'situation']
+CLUSTER_FEATURES = ['game_time', 'team_score', 'opponent_score']
+
+# Prepared goals, set once per sweep worker process by init_sweep_worker
+_sweep_df_subset = None
+
+def init_sweep_worker(df_subset):
+    global _sweep_df_subset
+    _sweep_df_subset = df_subset
+
+def fit_galaxy_embedding(umap_combo_idx, umap_params, df_subset=None):
+    """Galaxy-level UMAP embedding of one configuration, shared by all of its HDBSCAN variants"""
+    if df_subset is None:
+        df_subset = _sweep_df_subset
+    print(f"UMAP configuration {umap_combo_idx}: {umap_params}")
+    df_encoded_galaxy, _ = encode_categorical_features(df_subset, GALAXY_FEATURES)
+    return np.asarray(feature_cache.umap_embedding(df_encoded_galaxy, umap_params, random_state=42))
+
+def evaluate_combination(combo_idx, umap_params, hdbscan_params, galaxy_umap, df_subset=None):
+    """
+    Evaluate one HDBSCAN variant on the galaxy embedding of its UMAP configuration.
+
+    Args:
+        combo_idx: Index of the (UMAP, HDBSCAN) combination in the grid
+        umap_params: UMAP keyword arguments
+        hdbscan_params: HDBSCAN keyword arguments
+        galaxy_umap: Embedding from fit_galaxy_embedding for umap_params
+        df_subset: Prepared goals (defaults to the worker's copy)
+
+    Returns:
+        dict: Result row, or None if the combination failed
+    """
+    if df_subset is None:
+        df_subset = _sweep_df_subset
+    print(f"Testing combination {combo_idx}")
     try:
-        silhouette = silhouette_score(features, cluster_labels)
-        calinski_harabasz = calinski_harabasz_score(features, cluster_labels)
-        davies_bouldin = davies_bouldin_score(features, cluster_labels)
+        galaxy_labels, galaxy_clusterer = perform_hdbscan_clustering(
+            galaxy_umap,
+            f"Galaxy clustering {combo_idx}",
+            hdbscan_params
+        )
+        
+        # Evaluate galaxy clustering
+        galaxy_metrics = evaluate_clustering_quality(galaxy_labels, galaxy_umap)
+        
+        # Step 2: Cluster clustering within galaxies (sample approach - test on largest galaxy)
+        galaxy_ids, galaxy_sizes = np.unique(galaxy_labels, return_counts=True)
+        largest_galaxy_id = galaxy_ids[np.argmax(galaxy_sizes)] if len(galaxy_ids) else None
+        largest_galaxy_size = int(galaxy_sizes.max()) if len(galaxy_ids) else 0
+        
+        cluster_metrics = {'n_clusters': 0, 'silhouette_score': -1, 'silhouette_ci_low': -1, 'silhouette_ci_high': -1,
+                           'calinski_harabasz_score': -1, 'davies_bouldin_score': float('inf')}
+        
+        if largest_galaxy_id is not None and largest_galaxy_size >= 100:
+            # Test cluster clustering on largest galaxy
+            galaxy_indices = np.where(galaxy_labels == largest_galaxy_id)[0]
+            
+            if largest_galaxy_size >= hdbscan_params.get('min_cluster_size', 50):
+                # Variants often share the same largest galaxy, whose embedding then comes from the feature cache
+                df_encoded_cluster, _ = encode_categorical_features(df_subset.iloc[galaxy_indices], CLUSTER_FEATURES)
+                cluster_umap = feature_cache.umap_embedding(df_encoded_cluster, umap_params, random_state=42)
+                cluster_labels, cluster_clusterer = perform_hdbscan_clustering(
+                    cluster_umap,
+                    f"Cluster clustering {combo_idx}",
+                    hdbscan_params
+                )
+                cluster_metrics = evaluate_clustering_quality(cluster_labels, cluster_umap)
         
-        return {
-            'n_clusters': n_clusters,
-            'silhouette_score': silhouette,
-            'calinski_harabasz_score': calinski_harabasz,
-            'davies_bouldin_score': davies_bouldin
+        # Store results
+        result = {
+            'combo_idx': combo_idx,
+            'umap_params': umap_params.copy(),
+            'hdbscan_params': hdbscan_params.copy(),
+            'galaxy_n_clusters': int(galaxy_metrics['n_clusters']),
+            'galaxy_silhouette': float(galaxy_metrics['silhouette_score']),
+            'galaxy_silhouette_ci_low': float(galaxy_metrics['silhouette_ci_low']),
+            'galaxy_silhouette_ci_high': float(galaxy_metrics['silhouette_ci_high']),
+            'galaxy_calinski_harabasz': float(galaxy_metrics['calinski_harabasz_score']),
+            'galaxy_davies_bouldin': float(galaxy_metrics['davies_bouldin_score']),
+            'cluster_n_clusters': int(cluster_metrics['n_clusters']),
+            'cluster_silhouette': float(cluster_metrics['silhouette_score']),
+            'cluster_silhouette_ci_low': float(cluster_metrics['silhouette_ci_low']),
+            'cluster_silhouette_ci_high': float(cluster_metrics['silhouette_ci_high']),
+            'cluster_calinski_harabasz': float(cluster_metrics['calinski_harabasz_score']),
+            'cluster_davies_bouldin': float(cluster_metrics['davies_bouldin_score']),
+            'largest_galaxy_size': largest_galaxy_size
         }
+        
+        print(f"  Galaxy clusters: {galaxy_metrics['n_clusters']}, Silhouette: {galaxy_metrics['silhouette_score']:.3f}")
+        print(f"  Largest galaxy size: {largest_galaxy_size}, Cluster sub-clusters: {cluster_metrics['n_clusters']}")
+        print()
+        return result
+        
     except Exception as e:
-        logger.warning(f"Error calculating clustering metrics: {e}")
-        return {
-            'n_clusters': n_clusters,
-            'silhouette_score': -1,
-            'calinski_harabasz_score': -1,
-            'davies_bouldin_score': float('inf')
-        }
+        logger.error(f"Error in combination {combo_idx}: {e}")
+        return None
+
+def sweep_key(df_subset):
+    """Identifies the data a checkpoint row belongs to"""
+    return feature_cache.cache_key('sweep', feature_cache.frame_digest(df_subset))
+
+def sweep_pair(umap_params, hdbscan_params):
+    """Identifies one (UMAP, HDBSCAN) combination, independent of its position in the grid"""
+    return json.dumps([umap_params, hdbscan_params], sort_keys=True)
+
+def load_sweep_checkpoint(checkpoint_file, key):
+    """Completed result rows for this data, by sweep_pair"""
+    completed = {}
+    if not os.path.exists(checkpoint_file):
+        return completed
+    with open(checkpoint_file, 'r') as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                # A partially written last line from an interrupted run
+                continue
+            if row.pop('sweep_key', None) == key:
+                completed[sweep_pair(row['umap_params'], row['hdbscan_params'])] = row
+    return completed
 
-def explore_hyperparameters():
-    """Explore different hyperparameter combinations for the multiple rounds clustering"""
+def append_sweep_checkpoint(checkpoint_file, key, rows):
+    # Start on a fresh line if an interrupted run left a partial row behind
+    needs_newline = False
+    if os.path.exists(checkpoint_file) and os.path.getsize(checkpoint_file) > 0:
+        with open(checkpoint_file, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b"\n"
+    with open(checkpoint_file, 'a') as f:
+        if needs_newline:
+            f.write("\n")
+        for row in rows:
+            f.write(json.dumps({'sweep_key': key, **row}) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+def explore_hyperparameters(n_workers=None, checkpoint_file=SWEEP_CHECKPOINT_FILE):
+    """
+    Explore different hyperparameter combinations for the multiple rounds clustering
+
+    Each distinct UMAP configuration is fitted once and all HDBSCAN variants are evaluated
+    on its embedding. Work runs in a process pool of n_workers (default: SWEEP_WORKERS or
+    the CPU count): one task per UMAP fit, then one per (UMAP, HDBSCAN) combination. Every
+    row is appended to checkpoint_file as soon as its combination finishes, so an
+    interrupted sweep resumes with the combinations it has not finished yet.
+    """
     print("🔍 HYPERPARAMETER EXPLORATION FOR MULTIPLE ROUNDS CLUSTERING")
     print("=" * 80)
     
+    if n_workers is None:
+        n_workers = int(os.environ.get('SWEEP_WORKERS', os.cpu_count() or 1))
+    
     # Load and prepare data
     df_subset, df_original = load_and_prepare_data()
     
-    # Define hyperparameter grids
-    umap_param_grid = {
-        'n_components': [10, 15, 20],
-        'n_neighbors': [10, 15, 20],
-        'min_dist': [0.05, 0.1, 0.15]
-    }
-    
-    hdbscan_param_grid = {
-        'min_cluster_size': [50, 100, 150],
-        'min_samples': [None]  # Use default (min_cluster_size)
-    }
-    
     # Create all combinations
-    umap_combinations = list(itertools.product(*umap_param_grid.values()))
-    hdbscan_combinations = list(itertools.product(*hdbscan_param_grid.values()))
+    umap_combinations = list(itertools.product(*UMAP_PARAM_GRID.values()))
+    hdbscan_combinations = list(itertools.product(*HDBSCAN_PARAM_GRID.values()))
+    total_combinations = len(umap_combinations) * len(hdbscan_combinations)
     
-    print(f"Testing {len(umap_combinations)} UMAP × {len(hdbscan_combinations)} HDBSCAN = {len(umap_combinations) * len(hdbscan_combinations)} combinations")
-    print()
+    print(f"Testing {len(umap_combinations)} UMAP × {len(hdbscan_combinations)} HDBSCAN = {total_combinations} combinations")
     
-    results = []
-    total_combinations = len(umap_combinations) * len(hdbscan_combinations)
+    key = sweep_key(df_subset)
+    completed = load_sweep_checkpoint(checkpoint_file, key)
     
-    for combo_idx, (umap_combo, hdbscan_combo) in enumerate(itertools.product(umap_combinations, hdbscan_combinations), 1):
-        print(f"Testing combination {combo_idx}/{total_combinations}")
-        
-        # Create parameter dictionaries
-        umap_params = dict(zip(umap_param_grid.keys(), umap_combo))
-        hdbscan_params = dict(zip(hdbscan_param_grid.keys(), hdbscan_combo))
-        # Remove None values
-        hdbscan_params = {k: v for k, v in hdbscan_params.items() if v is not None}
-        
-        try:
-            # Step 1: Galaxy clustering (spatial/shot features)
-            galaxy_features = ['shot_zone', 'shot_type', 'situation']
-            df_encoded_galaxy, _ = encode_categorical_features(df_subset, galaxy_features)
-            
-            galaxy_labels, galaxy_umap, galaxy_clusterer = perform_umap_hdbscan_clustering(
-                df_encoded_galaxy, 
-                f"Galaxy clustering {combo_idx}",
-                umap_params,
-                hdbscan_params
-            )
-            
-            # Evaluate galaxy clustering
-            galaxy_metrics = evaluate_clustering_quality(galaxy_labels, galaxy_umap)
-            
-            # Step 2: Cluster clustering within galaxies (sample approach - test on largest galaxy)
-            unique_galaxies = np.unique(galaxy_labels)
-            largest_galaxy_id = None
-            largest_galaxy_size = 0
-            
-            for galaxy_id in unique_galaxies:
-                galaxy_mask = galaxy_labels == galaxy_id
-                galaxy_size = galaxy_mask.sum()
-                if galaxy_size > largest_galaxy_size:
-                    largest_galaxy_size = galaxy_size
-                    largest_galaxy_id = galaxy_id
-            
-            cluster_metrics = {'n_clusters': 0, 'silhouette_score': -1, 'calinski_harabasz_score': -1, 'davies_bouldin_score': float('inf')}
-            
-            if largest_galaxy_id is not None and largest_galaxy_size >= 100:
-                # Test cluster clustering on largest galaxy
-                galaxy_mask = galaxy_labels == largest_galaxy_id
-                galaxy_indices = np.where(galaxy_mask)[0]
-                galaxy_data = df_subset.iloc[galaxy_indices]
-                
-                cluster_features = ['game_time', 'team_score', 'opponent_score']
-                df_encoded_cluster, _ = encode_categorical_features(galaxy_data, cluster_features)
-                
-                if len(df_encoded_cluster) >= hdbscan_params.get('min_cluster_size', 50):
-                    cluster_labels, cluster_umap, cluster_clusterer = perform_umap_hdbscan_clustering(
-                        df_encoded_cluster,
-                        f"Cluster clustering {combo_idx}",
-                        umap_params,
-                        hdbscan_params
-                    )
-                    cluster_metrics = evaluate_clustering_quality(cluster_labels, cluster_umap)
-            
-            # Store results
-            result = {
-                'combo_idx': combo_idx,
-                'umap_params': umap_params.copy(),
-                'hdbscan_params': hdbscan_params.copy(),
-                'galaxy_n_clusters': galaxy_metrics['n_clusters'],
-                'galaxy_silhouette': galaxy_metrics['silhouette_score'],
-                'galaxy_calinski_harabasz': galaxy_metrics['calinski_harabasz_score'],
-                'galaxy_davies_bouldin': galaxy_metrics['davies_bouldin_score'],
-                'cluster_n_clusters': cluster_metrics['n_clusters'],
-                'cluster_silhouette': cluster_metrics['silhouette_score'],
-                'cluster_calinski_harabasz': cluster_metrics['calinski_harabasz_score'],
-                'cluster_davies_bouldin': cluster_metrics['davies_bouldin_score'],
-                'largest_galaxy_size': largest_galaxy_size
-            }
-            results.append(result)
-            
-            print(f"  Galaxy clusters: {galaxy_metrics['n_clusters']}, Silhouette: {galaxy_metrics['silhouette_score']:.3f}")
-            print(f"  Largest galaxy size: {largest_galaxy_size}, Cluster sub-clusters: {cluster_metrics['n_clusters']}")
-            print()
-            
-        except Exception as e:
-            logger.error(f"Error in combination {combo_idx}: {e}")
-            continue
+    # One task per UMAP configuration with the HDBSCAN variants it still needs
+    results = []
+    tasks = []
+    for umap_idx, umap_combo in enumerate(umap_combinations):
+        umap_params = dict(zip(UMAP_PARAM_GRID.keys(), umap_combo))
+        variants = []
+        for hdbscan_idx, hdbscan_combo in enumerate(hdbscan_combinations):
+            combo_idx = umap_idx * len(hdbscan_combinations) + hdbscan_idx + 1
+            hdbscan_params = dict(zip(HDBSCAN_PARAM_GRID.keys(), hdbscan_combo))
+            # Remove None values
+            hdbscan_params = {k: v for k, v in hdbscan_params.items() if v is not None}
+            row = completed.get(sweep_pair(umap_params, hdbscan_params))
+            if row is not None:
+                results.append({**row, 'combo_idx': combo_idx})
+            else:
+                variants.append((combo_idx, hdbscan_params))
+        if variants:
+            tasks.append((umap_idx + 1, umap_params, variants))
+    if results:
+        print(f"Resuming from {checkpoint_file}: {len(results)} combinations already done")
+    print()
     
-    return results
+    def record(row):
+        append_sweep_checkpoint(checkpoint_file, key, [row])
+        results.append(row)
+        print(f"Progress: {len(results)}/{total_combinations} combinations")
+    
+    if n_workers > 1 and sum(len(variants) for _, _, variants in tasks) > 1:
+        print(f"Running {len(tasks)} UMAP configurations on {n_workers} worker processes...")
+        with ProcessPoolExecutor(max_workers=n_workers,
+                                 mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=init_sweep_worker, initargs=(df_subset,)) as executor:
+            fits = {executor.submit(fit_galaxy_embedding, umap_idx, umap_params): (umap_params, variants)
+                    for umap_idx, umap_params, variants in tasks}
+            running = set(fits)
+            while running:
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in fits:
+                        # A fitted UMAP configuration fans out into one task per HDBSCAN variant
+                        umap_params, variants = fits.pop(future)
+                        try:
+                            galaxy_umap = future.result()
+                        except Exception as e:
+                            logger.error(f"UMAP configuration {umap_params} failed: {e}")
+                            continue
+                        running.update(executor.submit(evaluate_combination, combo_idx, umap_params,
+                                                       hdbscan_params, galaxy_umap)
+                                       for combo_idx, hdbscan_params in variants)
+                        continue
+                    try:
+                        row = future.result()
+                    except Exception as e:
+                        logger.error(f"Combination failed: {e}")
+                        continue
+                    if row is not None:
+                        record(row)
+    else:
+        for umap_idx, umap_params, variants in tasks:
+            galaxy_umap = fit_galaxy_embedding(umap_idx, umap_params, df_subset=df_subset)
+            for combo_idx, hdbscan_params in variants:
+                row = evaluate_combination(combo_idx, umap_params, hdbscan_params, galaxy_umap,
+                                           df_subset=df_subset)
+                if row is not None:
+                    record(row)
+    
+    return sorted(results, key=lambda row: row['combo_idx'])
 
 def analyze_hyperparameter_results(results):
     """Analyze and visualize hyperparameter exploration results"""
@@ -498,7 +437,7 @@ def analyze_hyperparameter_results(results):
             print(f"  UMAP params: {row['umap_params']}")
             print(f"  HDBSCAN params: {row['hdbscan_params']}")
             print(f"  Galaxy clusters: {row['galaxy_n_clusters']}")
-            print(f"  Galaxy silhouette: {row['galaxy_silhouette']:.4f}")
+            print(f"  Galaxy silhouette: {row['galaxy_silhouette']:.4f} [{row['galaxy_silhouette_ci_low']:.4f}, {row['galaxy_silhouette_ci_high']:.4f}]")
             print(f"  Galaxy Calinski-Harabasz: {row['galaxy_calinski_harabasz']:.2f}")
             print(f"  Galaxy Davies-Bouldin: {row['galaxy_davies_bouldin']:.4f}")
             print()
@@ -515,7 +454,7 @@ def analyze_hyperparameter_results(results):
             print(f"  UMAP params: {row['umap_params']}")
             print(f"  HDBSCAN params: {row['hdbscan_params']}")
             print(f"  Cluster sub-clusters: {row['cluster_n_clusters']}")
-            print(f"  Cluster silhouette: {row['cluster_silhouette']:.4f}")
+            print(f"  Cluster silhouette: {row['cluster_silhouette']:.4f} [{row['cluster_silhouette_ci_low']:.4f}, {row['cluster_silhouette_ci_high']:.4f}]")
             print(f"  Cluster Calinski-Harabasz: {row['cluster_calinski_harabasz']:.2f}")
             print(f"  Cluster Davies-Bouldin: {row['cluster_davies_bouldin']:.4f}")
             print(f"  Largest galaxy size: {row['largest_galaxy_size']}")
@@ -629,6 +568,10 @@ def main():
     print("Exploring optimal UMAP + HDBSCAN parameters for multiple rounds clustering")
     print("=" * 80)
     
+    # Start over instead of resuming from the checkpoint
+    if '--fresh' in sys.argv and os.path.exists(SWEEP_CHECKPOINT_FILE):
+        os.remove(SWEEP_CHECKPOINT_FILE)
+    
     # Run hyperparameter exploration
     results = explore_hyperparameters()
     